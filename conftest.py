@@ -0,0 +1,15 @@
+"""
+Os testes importam os módulos de scripts/ (e do dashboard/) como a ingestão
+e o Streamlit fazem. A taxa e as tentativas do cliente do CVCRM são lidas na
+importação de cvcrm_fetcher, então ficam definidas aqui, antes de qualquer
+módulo de teste importá-lo: contra o mock não há por que esperar.
+"""
+import os
+import sys
+
+RAIZ = os.path.dirname(os.path.abspath(__file__))
+for diretorio in ('scripts', 'dashboard'):
+    sys.path.insert(0, os.path.join(RAIZ, diretorio))
+
+os.environ['CVCRM_REQ_POR_SEGUNDO'] = '1000'
+os.environ['CVCRM_MAX_TENTATIVAS'] = '1'
@@ -18,11 +18,15 @@ st.session_state['current_page'] = __file__
 
 import pandas as pd
 from datetime import datetime
-import re
 import locale
-import duckdb
 from dotenv import load_dotenv
 
+import config  # coloca scripts/ no sys.path, de onde vem o sla abaixo
+from data import (
+    RESERVAS_COM_SLA, TABELA_RESERVAS, carregar, etapas_funil, intervalo_datas, opcoes, resumo_cubo, situacoes_sla
+)
+from sla import COLUNAS_SLA, DIAS, FORA_DO_PRAZO, LIMITE
+
 # Carregar variáveis de ambiente
 load_dotenv()
 
@@ -86,138 +90,31 @@ def format_currency(value):
 # Título do aplicativo
 st.title("📊 Relatório De Reservas")
 
-def extract_days(situacao):
-    # Extrai o número entre parênteses da situação
-    match = re.search(r'\((\d+)\)', situacao)
-    if match:
-        return int(match.group(1))
-    return 0
-
-def check_time_limit(row):
-    # Extrai o número entre parênteses da situação
-    dias_limite = extract_days(row['situacao'])
-    
-    if dias_limite == 0:
-        return False
-        
-    # Pega a data da última alteração diretamente da tabela de reservas
-    data_ultima_alteracao = pd.to_datetime(row['data_ultima_alteracao_situacao'])
-    
-    # Calcula a diferença entre agora e a última alteração em dias
-    dias_decorridos = (datetime.now() - data_ultima_alteracao).days
-    
-    # Verifica se o tempo desde a última alteração excede o limite
-    return dias_decorridos >= dias_limite
-
-def normalize_situacao(situacao_val):
-    """Normalize raw situação values to canonical funnel stages used in ordem_situacoes."""
-    s = str(situacao_val or '')
-    if 'Análise' in s and ('Diretoria' in s or 'proposta' in s):
-        return 'Análise Diretoria'
-    if 'Assinatura' in s or 'Assinado' in s:
-        return 'Contrato - Assinatura'
-    if 'Elaboração' in s:
-        return 'Contrato - Elaboração'
-    if 'Crédito' in s or 'CEF' in s:
-        return 'Crédito (CEF) (3)'
-    if 'Reserva' in s:
-        return 'Reserva (7)'
-    if 'Negociação' in s:
-        return 'Negociação (5)'
-    if 'Mútuo' in s or 'Mutuo' in s:
-        return 'Mútuo'
-    return s
-
-# MotherDuck connection
-@st.cache_resource
-def get_motherduck_connection():
-    """Create a cached connection to MotherDuck"""
-    try:        
-        token = os.getenv('MOTHERDUCK_TOKEN')
-        # Tenta buscar do secrets se não estiver no ambiente
-        if not token:
-            try:
-                token = st.secrets["MOTHERDUCK_TOKEN"]
-            except Exception:
-                token = None
-        
-        if not token:
-            load_dotenv(override=True)
-            token = os.getenv('MOTHERDUCK_TOKEN')
-            
-            if not token:
-                raise ValueError("MOTHERDUCK_TOKEN não encontrado nas variáveis de ambiente")
-
-        # Sanitize
-        token = token.strip().strip('"').strip("'")
-        os.environ["MOTHERDUCK_TOKEN"] = token  
-        
-        conn = duckdb.connect("md:reservas")
-        return conn
-
-    except Exception as e:
-        st.error(f"Erro ao configurar conexão: {str(e)}")
-        raise
+# Colunas da lista de reservas e das métricas; as tabelas-resumo vêm do cubo
+# (dias na situação e fora do prazo calculados na consulta, ver scripts/sla.py)
+COLUNAS_RESERVAS = ['idreserva', 'cliente', 'empreendimento', 'situacao', 'imobiliaria',
+                    'valor_contrato', *COLUNAS_SLA]
 
-# Carregando os dados
-@st.cache_data
-def load_data():
+# Reservas do período e dos filtros, sem canceladas e vendidas (filtradas no banco)
+def load_data(data_inicio, data_fim, empreendimento, situacao):
     try:
-        conn = get_motherduck_connection()
-        
-        # Usando as tabelas do MotherDuck com o esquema correto
-        reservas_df = conn.sql("""
-            SELECT *
-            FROM reservas.main.reservas_abril
-        """).df()
-        
-        workflow_df = conn.sql("""
-            SELECT *
-            FROM reservas.main.workflow_abril
-        """).df()
-        
-        # Converter colunas de data com tratamento de erros
-        for df in [reservas_df, workflow_df]:
-            for col in df.select_dtypes(include=['object']).columns:
-                try:
-                    if 'data' in col.lower():
-                        df[col] = pd.to_datetime(df[col], errors='coerce')
-                except Exception as e:
-                    st.warning(f"Erro ao converter coluna {col}: {str(e)}")
-        
-        # Remover linhas com datas inválidas apenas das colunas necessárias
-        reservas_df = reservas_df.dropna(subset=['data_cad'])
-        
-        # Se não houver dados válidos, criar DataFrame com dados padrão
-        if len(reservas_df) == 0:
-            current_date = pd.Timestamp.now()
-            reservas_df = pd.DataFrame({
-                'data_cad': [current_date],
-                'data_ultima_alteracao_situacao': [current_date],
-                'empreendimento': ['Sem dados'],
-                'situacao': ['Sem dados'],
-                'valor_contrato': [0]
-            })
-            
-        return reservas_df, workflow_df
-        
+        return carregar(RESERVAS_COM_SLA, COLUNAS_RESERVAS, inicio=data_inicio, fim=data_fim,
+                        iguais={'empreendimento': empreendimento, 'situacao': situacao},
+                        excluir={'situacao': ['Cancelada', 'Vendida']})
     except Exception as e:
         st.error(f"Erro ao carregar dados: {str(e)}")
-        current_date = pd.Timestamp.now()
-        
-        # Criar DataFrame com dados padrão em caso de erro
-        reservas_df = pd.DataFrame({
-            'data_cad': [current_date],
-            'data_ultima_alteracao_situacao': [current_date],
-            'empreendimento': ['Erro ao carregar dados'],
-            'situacao': ['Erro'],
-            'valor_contrato': [0]
-        })
-        workflow_df = pd.DataFrame()
-        
-        return reservas_df, workflow_df
-
-reservas_df, workflow_df = load_data()
+        return pd.DataFrame(columns=['idreserva', 'cliente', 'empreendimento', 'situacao', 'imobiliaria',
+                                     'valor_contrato', LIMITE, DIAS, FORA_DO_PRAZO])
+
+def tabela_resumo(resumo_df, dimensao, rotulo):
+    """Renomeia as colunas do resumo do cubo para os títulos das tabelas"""
+    tabela = resumo_df.rename(columns={
+        dimensao: rotulo, 'quantidade': 'Quantidade', 'fora_do_prazo': 'Fora do Prazo'
+    })
+    tabela['Tempo Médio'] = tabela['tempo_medio'].round(0).fillna(0).astype(int)
+    tabela['Quantidade'] = tabela['Quantidade'].astype(int)
+    tabela['Fora do Prazo'] = tabela['Fora do Prazo'].astype(int)
+    return tabela
 
 # Sidebar para filtros
 st.sidebar.header("Filtros")
@@ -227,12 +124,9 @@ default_start_date = pd.Timestamp('2025-01-01').date()
 default_end_date = datetime.now().date()
 
 try:
-    # Converter datas para datetime.date
-    valid_dates = reservas_df['data_cad'].dropna().dt.date
-    if len(valid_dates) > 0:
-        min_date = min(valid_dates)
-        max_date = max(valid_dates)
-    else:
+    # Primeira e última data de cadastro, calculadas no banco
+    min_date, max_date = intervalo_datas(TABELA_RESERVAS)
+    if min_date is None:
         min_date = default_start_date
         max_date = default_end_date
 except Exception as e:
@@ -269,21 +163,15 @@ except Exception as e:
     data_fim = max_date
 
 # Filtro de empreendimento
-empreendimentos = sorted(reservas_df['empreendimento'].unique())
+empreendimentos = opcoes(TABELA_RESERVAS, 'empreendimento')
 empreendimento_selecionado = st.sidebar.selectbox("Empreendimento", ["Todos"] + list(empreendimentos))
 
 # Filtro de situação
-situacoes = sorted(reservas_df[~reservas_df['situacao'].isin(['Vendida', 'Distrato', 'Cancelada'])]['situacao'].unique())
+situacoes = opcoes(TABELA_RESERVAS, 'situacao', excluir={'situacao': ['Vendida', 'Distrato', 'Cancelada']})
 situacao_selecionada = st.sidebar.selectbox("Situação", ["Todas"] + list(situacoes))
 
-# Aplicar filtros
-mask = (reservas_df['data_cad'].dt.date >= data_inicio) & (reservas_df['data_cad'].dt.date <= data_fim)
-if empreendimento_selecionado != "Todos":
-    mask = mask & (reservas_df['empreendimento'] == empreendimento_selecionado)
-if situacao_selecionada != "Todas":
-    mask = mask & (reservas_df['situacao'] == situacao_selecionada)
-
-df_filtrado = reservas_df[mask]
+# Aplicar filtros (no banco)
+df_filtrado = load_data(data_inicio, data_fim, empreendimento_selecionado, situacao_selecionada)
 
 # Métricas principais
 df_sem_canceladas_vendidas = df_filtrado[~df_filtrado['situacao'].isin(['Cancelada', 'Vendida', 'Distrato'])]
@@ -299,46 +187,25 @@ with col2:
 # Reservas por Situação
 st.subheader("Reservas Por Situação")
 
-# Definir ordem do funil de vendas
-ordem_situacoes = [
-    'Reserva (7)',
-    'Crédito (CEF) (3)',
-    'Negociação (5)',
-    'Mútuo',
-    'Análise Diretoria',
-    'Contrato - Elaboração',
-    'Contrato - Assinatura',
-    #'Vendida',
-    # 'Distrato'
-]
+# Ordem do funil de vendas (tabela situacao_sla), sem as etapas finais
+ordem_situacoes = etapas_funil(excluir=('Vendida', 'Distrato'))
+
+# Filtros da página aplicados ao cubo
+filtro_empreendimento = None if empreendimento_selecionado == "Todos" else empreendimento_selecionado
+filtro_situacao = None if situacao_selecionada == "Todas" else situacao_selecionada
 
-# Contar reservas por situação do df_filtrado
-quantidade_por_situacao = df_filtrado[~df_filtrado['situacao'].isin(['Cancelada', 'Distrato', 'Vendida'])]['situacao'].value_counts().reset_index()
-quantidade_por_situacao.columns = ['Situação', 'Quantidade']
+# Quantidade, fora do prazo e tempo médio por situação
+resumo_situacao = resumo_cubo('situacao', data_inicio, data_fim, filtro_empreendimento, filtro_situacao,
+                              ('Cancelada', 'Distrato', 'Vendida'))
+reservas_por_situacao = tabela_resumo(resumo_situacao, 'situacao', 'Situação')
 
 # Criar mapeamento para ordem
 ordem_mapping = {situacao: idx for idx, situacao in enumerate(ordem_situacoes)}
-quantidade_por_situacao['ordem'] = quantidade_por_situacao['Situação'].map(ordem_mapping)
-quantidade_por_situacao = quantidade_por_situacao.sort_values('ordem').drop('ordem', axis=1)
-
-# Verificar fora do prazo diretamente na tabela de reservas
-df_sem_canceladas_vendidas = df_filtrado[~df_filtrado['situacao'].isin(['Cancelada', 'Vendida'])]
-df_sem_canceladas_vendidas['tempo_excedido'] = df_sem_canceladas_vendidas.apply(check_time_limit, axis=1)
-df_sem_canceladas_vendidas['dias_na_situacao'] = (datetime.now() - df_sem_canceladas_vendidas['data_ultima_alteracao_situacao']).dt.days
+reservas_por_situacao['ordem'] = reservas_por_situacao['Situação'].map(ordem_mapping)
+reservas_por_situacao = reservas_por_situacao.sort_values('ordem').drop('ordem', axis=1)
 
-# Calcular tempo médio por situação
-tempo_medio = df_sem_canceladas_vendidas.groupby('situacao')['dias_na_situacao'].mean().round(0).astype(int).reset_index()
-tempo_medio.columns = ['Situação', 'Tempo Médio']
-
-# Contar fora do prazo por situação
-fora_prazo_por_situacao = df_sem_canceladas_vendidas[df_sem_canceladas_vendidas['tempo_excedido']].groupby('situacao')['tempo_excedido'].count().reset_index()
-fora_prazo_por_situacao.columns = ['Situação', 'Fora do Prazo']
-
-# Juntar as informações
-reservas_por_situacao = pd.merge(quantidade_por_situacao, fora_prazo_por_situacao, on='Situação', how='left')
-reservas_por_situacao = pd.merge(reservas_por_situacao, tempo_medio, on='Situação', how='left')
-reservas_por_situacao['Fora do Prazo'] = reservas_por_situacao['Fora do Prazo'].fillna(0).astype(int)
-reservas_por_situacao['Tempo Médio'] = reservas_por_situacao['Tempo Médio'].fillna(0).astype(int)
+# Reservas listadas no fim da página (canceladas e vendidas já ficaram de fora na consulta)
+df_sem_canceladas_vendidas = df_filtrado.copy()
 
 # Garantir que "Fora do Prazo" não seja maior que "Quantidade"
 reservas_por_situacao['Fora do Prazo'] = reservas_por_situacao.apply(
@@ -369,23 +236,21 @@ st.table(reservas_por_situacao)
 # Funil de Reservas (quantidade, % fora do prazo, valor parado)
 st.subheader("Funil De Reservas")
 
-# Base para o funil: mesmas regras da matriz
-df_funnel_base = df_filtrado[~df_filtrado['situacao'].isin(['Cancelada', 'Distrato', 'Vendida'])].copy()
-df_funnel_base['situacao_norm'] = df_funnel_base['situacao'].apply(normalize_situacao)
-df_funnel_base['tempo_excedido'] = df_funnel_base.apply(check_time_limit, axis=1)
-
-# Agregações
-funnel_qtd = df_funnel_base.groupby('situacao_norm').size().reset_index(name='Quantidade').rename(columns={'situacao_norm': 'situacao'})
-funnel_valor = df_funnel_base.groupby('situacao_norm')['valor_contrato'].sum().reset_index().rename(columns={'situacao_norm': 'situacao', 'valor_contrato': 'Valor Parado'})
-funnel_fora = df_funnel_base[df_funnel_base['tempo_excedido']].groupby('situacao_norm')['tempo_excedido'].count().reset_index().rename(columns={'situacao_norm': 'situacao', 'tempo_excedido': 'Fora do Prazo'})
+# Base para o funil: mesmas regras da matriz (resumo por situação do cubo)
+# (cada situação entra na sua etapa canônica do funil, pela tabela situacao_sla)
+etapa_da_situacao = situacoes_sla().set_index('situacao')['etapa']
+funnel_base = resumo_situacao.assign(
+    situacao=resumo_situacao['situacao'].map(etapa_da_situacao).fillna(resumo_situacao['situacao'])
+)
+funnel_agregado = funnel_base.groupby('situacao').agg(
+    **{'Quantidade': ('quantidade', 'sum'), 'Fora do Prazo': ('fora_do_prazo', 'sum'), 'Valor Parado': ('valor_total', 'sum')}
+).reset_index()
 
 # Tabela base com todas as etapas do funil
 etapas_df = pd.DataFrame({'situacao': ordem_situacoes})
 
 # Merge e cálculos garantindo todas as etapas
-funnel_df = etapas_df.merge(funnel_qtd, on='situacao', how='left') \
-                     .merge(funnel_fora, on='situacao', how='left') \
-                     .merge(funnel_valor, on='situacao', how='left')
+funnel_df = etapas_df.merge(funnel_agregado, on='situacao', how='left')
 funnel_df['Quantidade'] = funnel_df['Quantidade'].fillna(0).astype(int)
 funnel_df['Fora do Prazo'] = funnel_df['Fora do Prazo'].fillna(0).astype(int)
 funnel_df['Valor Parado'] = funnel_df['Valor Parado'].fillna(0)
@@ -428,23 +293,10 @@ st.divider()
 # Reservas por Empreendimento
 st.subheader("Reservas Por Empreendimento")
 
-# Contar reservas por empreendimento
-quantidade_por_empreendimento = df_filtrado[~df_filtrado['situacao'].isin(['Cancelada', 'Vendida'])]['empreendimento'].value_counts().reset_index()
-quantidade_por_empreendimento.columns = ['Empreendimento', 'Quantidade']
-
-# Contar fora do prazo por empreendimento
-fora_prazo_por_empreendimento = df_sem_canceladas_vendidas[df_sem_canceladas_vendidas['tempo_excedido']].groupby('empreendimento')['tempo_excedido'].count().reset_index()
-fora_prazo_por_empreendimento.columns = ['Empreendimento', 'Fora do Prazo']
-
-# Calcular tempo médio por empreendimento
-tempo_medio_empreendimento = df_sem_canceladas_vendidas.groupby('empreendimento')['dias_na_situacao'].mean().round(0).astype(int).reset_index()
-tempo_medio_empreendimento.columns = ['Empreendimento', 'Tempo Médio']
-
-# Juntar as informações
-reservas_por_empreendimento = pd.merge(quantidade_por_empreendimento, fora_prazo_por_empreendimento, on='Empreendimento', how='left')
-reservas_por_empreendimento = pd.merge(reservas_por_empreendimento, tempo_medio_empreendimento, on='Empreendimento', how='left')
-reservas_por_empreendimento['Fora do Prazo'] = reservas_por_empreendimento['Fora do Prazo'].fillna(0).astype(int)
-reservas_por_empreendimento['Tempo Médio'] = reservas_por_empreendimento['Tempo Médio'].fillna(0).astype(int)
+# Quantidade, fora do prazo e tempo médio por empreendimento
+resumo_empreendimento = resumo_cubo('empreendimento', data_inicio, data_fim, filtro_empreendimento, filtro_situacao,
+                                    ('Cancelada', 'Vendida'))
+reservas_por_empreendimento = tabela_resumo(resumo_empreendimento, 'empreendimento', 'Empreendimento')
 
 # Garantir que "Fora do Prazo" não seja maior que "Quantidade"
 reservas_por_empreendimento['Fora do Prazo'] = reservas_por_empreendimento.apply(
@@ -476,19 +328,13 @@ st.divider()
 # Tabela detalhada
 st.subheader("Lista De Reservas")
 
-# Calcular o tempo na situação atual
-df_sem_canceladas_vendidas['tempo_na_situacao'] = (datetime.now() - pd.to_datetime(df_sem_canceladas_vendidas['data_ultima_alteracao_situacao'])).dt.days
-
-# Verificar quais reservas estão fora do prazo
-df_sem_canceladas_vendidas['fora_do_prazo'] = df_sem_canceladas_vendidas.apply(check_time_limit, axis=1)
-
 # Função para estilizar o DataFrame
 def highlight_fora_prazo(s):
     return ['color: red' if df_sem_canceladas_vendidas['fora_do_prazo'].iloc[i] else '' for i in range(len(s))]
 
 # Preparar e exibir o DataFrame com estilo
 colunas_exibir = ['idreserva', 'cliente', 'empreendimento', 'situacao', 
-                'tempo_na_situacao', 'valor_contrato', 'imobiliaria']
+                'dias_na_situacao', 'valor_contrato', 'imobiliaria']
 
 # Selecionar apenas as colunas disponíveis para evitar KeyError
 colunas_disponiveis = [c for c in colunas_exibir if c in df_sem_canceladas_vendidas.columns]
@@ -504,7 +350,7 @@ rename_map = {
     'cliente': 'Cliente',
     'empreendimento': 'Empreendimento',
     'situacao': 'Situação',
-    'tempo_na_situacao': 'Tempo Na Situação',
+    'dias_na_situacao': 'Tempo Na Situação',
     'valor_contrato': 'Valor Contrato',
     'imobiliaria': 'Imobiliária'
 }
@@ -520,19 +366,6 @@ st.divider()
 # Análise de workflow
 st.subheader("Análise De Workflow")
 
-# Definir ordem do funil de vendas
-ordem_situacoes = [
-    'Reserva (7)',
-    'Crédito (CEF) (3)',
-    'Negociação (5)',
-    'Mútuo',
-    'Análise Diretoria',
-    'Contrato - Elaboração',
-    'Contrato - Assinatura',
-   # 'Vendida',
-    # 'Distrato'
-]
-
 # Criar DataFrame com a ordem correta
 workflow_agregado = df_filtrado.groupby('situacao')['idreserva'].count().reset_index()
 workflow_agregado.columns = ['situacao', 'quantidade']
@@ -2,19 +2,33 @@
 Configurações centralizadas e seguras para o dashboard
 """
 import os
+import sys
 import streamlit as st
 from dotenv import load_dotenv
 
 # Carregar variáveis de ambiente
 load_dotenv()
 
+# Módulos compartilhados com a ingestão (cliente CVCRM etc.) ficam em scripts/
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts')
+if SCRIPTS_DIR not in sys.path:
+    sys.path.append(SCRIPTS_DIR)
+
+def _segredo(nome):
+    """Valor dos secrets do Streamlit ou, sem ele (ou sem secrets.toml), do ambiente"""
+    try:
+        valor = st.secrets.get(nome)
+    except Exception:
+        valor = None
+    return valor or os.getenv(nome, "")
+
 class SecureConfig:
     """Classe para gerenciar configurações de forma segura"""
     
     @staticmethod
     def get_motherduck_token():
         """Obtém token do MotherDuck de forma segura"""
-        token = st.secrets.get("MOTHERDUCK_TOKEN", os.getenv("MOTHERDUCK_TOKEN", ""))
+        token = _segredo("MOTHERDUCK_TOKEN")
         if not token:
             st.error("Token do MotherDuck não configurado. Verifique as configurações de secrets.")
             st.stop()
@@ -23,8 +37,8 @@ class SecureConfig:
     @staticmethod
     def get_cvcrm_credentials():
         """Obtém credenciais do CVCRM de forma segura"""
-        email = st.secrets.get("CVCRM_EMAIL", os.getenv("CVCRM_EMAIL", ""))
-        token = st.secrets.get("CVCRM_TOKEN", os.getenv("CVCRM_TOKEN", ""))
+        email = _segredo("CVCRM_EMAIL")
+        token = _segredo("CVCRM_TOKEN")
         
         if not email or not token:
             st.error("Credenciais CVCRM não configuradas. Verifique as configurações de secrets.")
@@ -38,15 +52,29 @@ class SecureConfig:
         token = SecureConfig.get_motherduck_token()
         return f"md:reservas?token={token}"
     
+    @staticmethod
+    def get_backend():
+        """Backend das tabelas (motherduck, duckdb ou parquet) e caminho local, ver scripts/backend.py"""
+        from backend import configuracao
+
+        return configuracao(_segredo("RESERVAS_BACKEND") or None, _segredo("RESERVAS_CAMINHO") or None)
+    
+    @staticmethod
+    def get_connection():
+        """Conexão somente leitura com as tabelas `reservas` no backend configurado"""
+        from backend import conectar
+
+        backend, caminho = SecureConfig.get_backend()
+        token = SecureConfig.get_motherduck_token().strip('"').strip("'") if backend == 'motherduck' else None
+        return conectar(backend, caminho, token=token, somente_leitura=True)
+    
     @staticmethod
     def get_cvcrm_headers():
         """Retorna headers seguros para API CVCRM"""
+        from cvcrm_client import cabecalhos
+
         email, token = SecureConfig.get_cvcrm_credentials()
         if not email or not token:
             return None
             
-        return {
-            "accept": "application/json",
-            "email": email,
-            "token": token,
-        }
+        return cabecalhos(email, token)
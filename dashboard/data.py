@@ -0,0 +1,424 @@
+"""
+Acesso aos dados do dashboard.
+
+Todas as páginas leem as tabelas `reservas` por aqui. A conexão com o
+backend (MotherDuck ou local, ver config.SecureConfig) é aberta uma vez por
+processo e guardada com st.cache_resource, então trocar de página não
+refaz o handshake. Cada consulta usa um cursor do pool (cursores do DuckDB
+dividem a mesma sessão, mas não podem ser usados por duas threads ao mesmo
+tempo). Um cursor parado há algum tempo é testado antes de ser entregue e,
+se a conexão caiu, ela é reaberta. No backend duckdb a conexão trava o
+arquivo, então a ingestão só roda com o dashboard parado (ver
+scripts/backend.py).
+
+As páginas não trazem tabelas inteiras: carregar() monta a consulta com
+os filtros da barra lateral (período, empreendimento, imobiliária,
+situação) e só as colunas que a página mostra, e o DuckDB/MotherDuck
+devolve apenas essas linhas. O prazo e a etapa de cada situação vêm da
+tabela situacao_sla, junta no SQL (RESERVAS_COM_SLA). As listas das caixas de seleção e os limites
+de data vêm de consultas agregadas (opcoes, intervalo_datas). Tudo fica
+em st.cache_data aqui mesmo, compartilhado entre as páginas, com a versão
+dos dados publicada pela ingestão na chave: o cache vale até a próxima
+atualização das tabelas, e só até ela.
+"""
+import json
+import os
+import queue
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+import duckdb
+import pandas as pd
+import streamlit as st
+
+from config import SecureConfig  # também coloca scripts/ no sys.path
+from cubo import resumo
+from estado_ingestao import CHAVE_VERSAO, TABELA_ESTADO
+from sla import TABELA_SLA, com_sla
+
+# Cursores abertos ao mesmo tempo (uma consulta por sessão do Streamlit)
+TAMANHO_POOL = int(os.getenv('DASHBOARD_POOL', '4'))
+# Cursor parado há mais que isso é testado (SELECT 1) antes de ser usado
+VERIFICAR_APOS = float(os.getenv('DASHBOARD_VERIFICAR_APOS', '60'))
+# Espera máxima por um cursor livre
+ESPERA_CURSOR = 30
+# Intervalo entre as consultas à versão dos dados (uma linha de estado_ingestao)
+VERIFICAR_VERSAO_A_CADA = float(os.getenv('DASHBOARD_VERSAO_TTL', '60'))
+
+TABELA_RESERVAS = 'reservas.main.reservas_abril'
+TABELA_LEADS = 'reservas.main.cv_leads'
+# Reservas com o prazo, a etapa e a ordem no funil da situação (ver scripts/sla.py)
+RESERVAS_COM_SLA = com_sla(TABELA_RESERVAS)
+
+# Opções das caixas de seleção que significam "sem filtro"
+TODOS = ('Todos', 'Todas')
+
+# Erros que indicam conexão perdida (vale reconectar e repetir a consulta)
+ERROS_CONEXAO = (duckdb.ConnectionException, duckdb.IOException, duckdb.HTTPException)
+
+
+class PoolConexoes:
+    """Uma conexão com o backend e até `tamanho` cursores dela, compartilhados entre threads"""
+
+    def __init__(self, conectar, tamanho=TAMANHO_POOL, verificar_apos=VERIFICAR_APOS):
+        self._conectar = conectar
+        self.tamanho = tamanho
+        self.verificar_apos = verificar_apos
+        self._livres = queue.LifoQueue()
+        self._criados = 0
+        self._geracao = 0
+        self._conexao = None
+        self._lock = threading.Lock()
+
+    def _base(self):
+        if self._conexao is None:
+            self._conexao = self._conectar()
+        return self._conexao
+
+    def _novo_cursor(self):
+        """Cursor da conexão atual, ou None se o pool já está cheio"""
+        with self._lock:
+            if self._criados >= self.tamanho:
+                return None
+            cursor = self._base().cursor()
+            self._criados += 1
+            return cursor, self._geracao, time.monotonic()
+
+    def _obter(self):
+        try:
+            return self._livres.get_nowait()
+        except queue.Empty:
+            pass
+        item = self._novo_cursor()
+        if item is None:
+            try:
+                item = self._livres.get(timeout=ESPERA_CURSOR)
+            except queue.Empty:
+                raise TimeoutError("Nenhuma conexão livre com o banco de dados") from None
+        return item
+
+    def _descartar(self, cursor):
+        with self._lock:
+            self._criados -= 1
+        try:
+            cursor.close()
+        except Exception:
+            pass
+
+    def _saudavel(self, cursor, usado_em):
+        if time.monotonic() - usado_em < self.verificar_apos:
+            return True
+        try:
+            cursor.execute("SELECT 1").fetchall()
+            return True
+        except Exception:
+            return False
+
+    def reconectar(self, geracao=None):
+        """
+        Fecha a conexão e os cursores livres; a próxima consulta abre outra.
+        Com `geracao`, só reconecta se ninguém reconectou depois dela.
+        """
+        with self._lock:
+            if geracao is not None and geracao != self._geracao:
+                return
+            self._geracao += 1
+            antiga, self._conexao = self._conexao, None
+        while True:
+            try:
+                cursor, _, _ = self._livres.get_nowait()
+            except queue.Empty:
+                break
+            self._descartar(cursor)
+        if antiga is not None:
+            try:
+                antiga.close()
+            except Exception:
+                pass
+
+    @contextmanager
+    def cursor(self):
+        """Empresta um cursor saudável da conexão atual"""
+        while True:
+            cursor, geracao, usado_em = self._obter()
+            if geracao == self._geracao and self._saudavel(cursor, usado_em):
+                break
+            self._descartar(cursor)
+            if geracao == self._geracao:
+                print("Conexão com o banco de dados perdida, reconectando...")
+                self.reconectar(geracao)
+        try:
+            yield cursor
+        except ERROS_CONEXAO:
+            self._descartar(cursor)
+            self.reconectar(geracao)
+            raise
+        except BaseException:
+            self._devolver(cursor, geracao)
+            raise
+        else:
+            self._devolver(cursor, geracao)
+
+    def _devolver(self, cursor, geracao):
+        if geracao == self._geracao:
+            self._livres.put((cursor, geracao, time.monotonic()))
+        else:
+            self._descartar(cursor)
+
+    def consultar(self, sql, parametros=None):
+        """DataFrame com o resultado; repete uma vez, reconectado, se a conexão caiu"""
+        for tentativa in (1, 2):
+            try:
+                with self.cursor() as cursor:
+                    return cursor.execute(sql, parametros).df()
+            except ERROS_CONEXAO:
+                if tentativa == 2:
+                    raise
+
+
+@st.cache_resource
+def pool():
+    """Pool único do processo, compartilhado por todas as páginas e sessões"""
+    return PoolConexoes(SecureConfig.get_connection)
+
+
+@contextmanager
+def conexao():
+    """Cursor do pool para consultas que precisam da conexão (p.ex. cubo.resumo)"""
+    try:
+        with pool().cursor() as cursor:
+            yield cursor
+    except ERROS_CONEXAO as e:
+        st.error(f"Erro na conexão com o banco de dados: {str(e)}")
+        raise
+
+
+def consultar(sql, parametros=None):
+    """Executa `sql` no backend e devolve um DataFrame"""
+    try:
+        return pool().consultar(sql, parametros)
+    except ERROS_CONEXAO as e:
+        st.error(f"Erro na conexão com o banco de dados: {str(e)}")
+        raise
+
+
+@st.cache_data
+def _colunas(versao, tabela):
+    return set(consultar("""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_catalog = 'reservas' AND table_schema = 'main' AND table_name = ?
+    """, [tabela])['column_name'])
+
+
+def colunas_da_tabela(tabela):
+    """Colunas da tabela (em junções como RESERVAS_COM_SLA, da primeira do FROM)"""
+    return _colunas(versao_dados(), tabela.split()[0].split('.')[-1])
+
+
+def coluna_sql(nome):
+    """Nome de coluna entre aspas; qualquer outra coisa (uma expressão SQL) é recusada"""
+    if not re.fullmatch(r'[A-Za-z_][A-Za-z0-9_]*', str(nome)):
+        raise ValueError(f"Coluna inválida: {nome!r}")
+    return f'"{nome}"'
+
+
+def fora_de(expressao, valores):
+    """
+    Predicado (sql, parâmetros) para `condicoes`: `expressao` fora de
+    `valores`. NULL fica, como no ~isin() do pandas.
+    """
+    marcadores = ', '.join('?' for _ in valores)
+    return f"({expressao} IS NULL OR {expressao} NOT IN ({marcadores}))", list(valores)
+
+
+def montar_filtros(tabela, inicio=None, fim=None, coluna_data='data_cad', iguais=None, excluir=None,
+                   condicoes=None):
+    """
+    Cláusula WHERE (e parâmetros) para `tabela` com os filtros da barra
+    lateral: período em `coluna_data` (datas inclusivas), `iguais`
+    {coluna: valor} e `excluir` {coluna: [valores]}, só com nomes de
+    coluna. Valores None, "Todos" ou "Todas" não filtram. `condicoes` são
+    predicados SQL escritos no código (texto ou (texto, parâmetros), p.ex.
+    fora_de), nunca montados com o que vem da tela. Linhas excluídas na
+    origem (_excluido_em, nas tabelas que têm a coluna) nunca entram.
+    """
+    clausulas = []
+    if '_excluido_em' in colunas_da_tabela(tabela):
+        clausulas.append('_excluido_em IS NULL')
+    parametros = []
+    # Comparação com o timestamp (e não com CAST AS DATE) para o DuckDB podar por min/max
+    if inicio is not None:
+        clausulas.append(f"{coluna_sql(coluna_data)} >= CAST(? AS DATE)")
+        parametros.append(inicio)
+    if fim is not None:
+        clausulas.append(f"{coluna_sql(coluna_data)} < CAST(? AS DATE) + INTERVAL 1 DAY")
+        parametros.append(fim)
+    for coluna, valor in (iguais or {}).items():
+        if valor is None or valor in TODOS:
+            continue
+        clausulas.append(f"{coluna_sql(coluna)} = ?")
+        parametros.append(valor)
+    for coluna, valores in (excluir or {}).items():
+        if valores:
+            sql, valores = fora_de(coluna_sql(coluna), valores)
+            clausulas.append(sql)
+            parametros.extend(valores)
+    for condicao in condicoes or ():
+        sql, valores = (condicao, []) if isinstance(condicao, str) else condicao
+        clausulas.append(f"({sql})")
+        parametros.extend(valores)
+    return ' AND '.join(clausulas) or 'true', parametros
+
+
+def montar_consulta(tabela, colunas=None, ordem=None, **filtros):
+    """SELECT só das `colunas` (expressões SQL) e linhas que passam nos filtros (ver montar_filtros)"""
+    where, parametros = montar_filtros(tabela, **filtros)
+    if colunas:
+        selecao = ', '.join(colunas)
+    else:
+        internas = sorted({'_hash', '_excluido_em'} & colunas_da_tabela(tabela))
+        selecao = f"* EXCLUDE ({', '.join(internas)})" if internas else '*'
+    sql = f"SELECT {selecao} FROM {tabela} WHERE {where}"
+    if ordem:
+        sql += f" ORDER BY {ordem}"
+    return sql, parametros
+
+
+# A versão publicada pela ingestão é relida no máximo uma vez por minuto; os
+# DataFrames não têm TTL, só mudam quando a versão muda
+@st.cache_data(ttl=VERIFICAR_VERSAO_A_CADA, show_spinner=False)
+def _ler_versao():
+    try:
+        linha = consultar(f"SELECT valor FROM {TABELA_ESTADO} WHERE chave = ?", [CHAVE_VERSAO])
+    except duckdb.CatalogException:
+        # Banco ainda sem estado_ingestao
+        return None
+    if linha.empty or linha['valor'].iloc[0] is None:
+        return None
+    return json.loads(linha['valor'].iloc[0])['versao']
+
+
+def versao_dados():
+    """
+    Versão dos dados publicada pela última ingestão. Entra na chave de todos
+    os caches abaixo; quando muda, os caches da versão anterior são limpos
+    (uma vez por processo).
+    """
+    global _versao_vista
+    versao = _ler_versao()
+    with _lock_versao:
+        if versao != _versao_vista:
+            if _versao_vista is not _NAO_LIDA:
+                print(f"Nova versão dos dados ({versao}), limpando o cache da versão {_versao_vista}")
+                for cache in (_colunas, _carregar, _opcoes, _intervalo_datas, _ranking_imobiliarias, _resumo_cubo,
+                              _situacoes_sla):
+                    cache.clear()
+            _versao_vista = versao
+    return versao
+
+
+_NAO_LIDA = object()
+_versao_vista = _NAO_LIDA
+_lock_versao = threading.Lock()
+
+
+@st.cache_data
+def _carregar(versao, tabela, colunas, ordem, filtros):
+    sql, parametros = montar_consulta(tabela, colunas, ordem, **filtros)
+    return consultar(sql, parametros)
+
+
+def carregar(tabela, colunas=None, ordem=None, **filtros):
+    """DataFrame com as colunas e linhas pedidas, filtrado no banco (cache por filtro)"""
+    return _carregar(versao_dados(), tabela, colunas, ordem, filtros)
+
+
+@st.cache_data
+def _opcoes(versao, tabela, coluna, filtros):
+    where, parametros = montar_filtros(tabela, **filtros)
+    return consultar(
+        f"SELECT DISTINCT {coluna} AS valor FROM {tabela} WHERE {where} AND {coluna} IS NOT NULL ORDER BY 1",
+        parametros
+    )['valor'].tolist()
+
+
+def opcoes(tabela, coluna, **filtros):
+    """Valores distintos e não nulos de `coluna`, em ordem, para as caixas de seleção"""
+    return _opcoes(versao_dados(), tabela, coluna, filtros)
+
+
+@st.cache_data
+def _intervalo_datas(versao, tabela, coluna, filtros):
+    where, parametros = montar_filtros(tabela, **filtros)
+    linha = consultar(
+        f"SELECT CAST(min({coluna}) AS DATE) AS inicio, CAST(max({coluna}) AS DATE) AS fim FROM {tabela} WHERE {where}",
+        parametros
+    ).iloc[0]
+    if pd.isna(linha['inicio']):
+        return None, None
+    return pd.Timestamp(linha['inicio']).date(), pd.Timestamp(linha['fim']).date()
+
+
+def intervalo_datas(tabela, coluna='data_cad', **filtros):
+    """(primeira, última) data de `coluna`, ou (None, None) sem registros"""
+    return _intervalo_datas(versao_dados(), tabela, coluna, filtros)
+
+
+@st.cache_data
+def _ranking_imobiliarias(versao):
+    where, parametros = montar_filtros(TABELA_RESERVAS)
+    return consultar(f"""
+        SELECT imobiliaria, count(*) FILTER (WHERE situacao = 'Vendida') AS total_vendas
+        FROM {TABELA_RESERVAS}
+        WHERE {where} AND imobiliaria IS NOT NULL
+        GROUP BY imobiliaria
+        ORDER BY total_vendas DESC, imobiliaria
+    """, parametros)
+
+
+def ranking_imobiliarias():
+    """Imobiliárias com o total de reservas vendidas, das que mais vendem para as que menos"""
+    return _ranking_imobiliarias(versao_dados())
+
+
+@st.cache_data
+def _resumo_cubo(versao, dimensao, inicio, fim, empreendimento, situacao, excluir_situacoes, imobiliaria):
+    with conexao() as conn:
+        return resumo(conn, dimensao, inicio, fim, empreendimento, situacao, excluir_situacoes, imobiliaria)
+
+
+def resumo_cubo(dimensao, inicio, fim, empreendimento=None, situacao=None, excluir_situacoes=(),
+                imobiliaria=None):
+    """
+    Resumo do cubo materializado pela ingestão (ver scripts/cubo.py), por uma
+    dimensão ou uma lista delas. "Todos"/"Todas" nos filtros não filtram.
+    """
+    if not isinstance(dimensao, str):
+        dimensao = tuple(dimensao)
+    empreendimento, situacao, imobiliaria = (
+        None if valor in TODOS else valor for valor in (empreendimento, situacao, imobiliaria)
+    )
+    return _resumo_cubo(versao_dados(), dimensao, inicio, fim, empreendimento, situacao,
+                        tuple(excluir_situacoes), imobiliaria)
+
+
+@st.cache_data
+def _situacoes_sla(versao):
+    return consultar(f"""
+        SELECT situacao, etapa, limite_dias, ordem_funil
+        FROM {TABELA_SLA}
+        ORDER BY ordem_funil NULLS LAST, situacao
+    """)
+
+
+def situacoes_sla():
+    """Tabela situacao_sla: etapa do funil, prazo e ordem de cada situação"""
+    return _situacoes_sla(versao_dados())
+
+
+def etapas_funil(excluir=()):
+    """Etapas do funil de vendas, na ordem (sem as de `excluir`)"""
+    etapas = situacoes_sla().dropna(subset=['ordem_funil']).drop_duplicates('etapa')
+    return [etapa for etapa in etapas['etapa'] if etapa not in excluir]
@@ -7,6 +7,7 @@ import sys
 from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent))
 from utils import display_navigation
+from data import TABELA_RESERVAS, intervalo_datas, opcoes, ranking_imobiliarias, resumo_cubo, situacoes_sla
 
 # Display navigation bar (includes logo)
 display_navigation()
@@ -15,13 +16,8 @@ display_navigation()
 st.session_state['current_page'] = __file__
 
 import pandas as pd
-from datetime import datetime
-import re
-import requests
 import locale
-import duckdb
 from dotenv import load_dotenv
-import os
 import plotly.express as px
 
 # Carregar variáveis de ambiente
@@ -46,51 +42,11 @@ def format_currency(value):
     except:
         return f"R$ {value}"
 
-# MotherDuck connection
-@st.cache_resource
-def get_motherduck_connection():
-    """Create a cached connection to MotherDuck"""
-    try:
-        token = os.getenv('MOTHERDUCK_TOKEN')
-        if not token:
-            raise ValueError("MOTHERDUCK_TOKEN não encontrado nas variáveis de ambiente")
-        
-        # Sanitize o token
-        token = token.strip().strip('"').strip("'")
-        
-        # Conectar diretamente ao MotherDuck com o token na URL (formato para conta free)
-        connection_string = f'motherduck:reservas?motherduck_token={token}'
-        
-        try:
-            conn = duckdb.connect(connection_string)
-            return conn
-        except Exception as e:
-            st.error(f"Erro na conexão com MotherDuck: {str(e)}")
-            raise
-    except Exception as e:
-        st.error(f"Erro ao configurar conexão: {str(e)}")
-        raise
-
-# Carregando os dados
-@st.cache_data
-def load_data():
-    conn = get_motherduck_connection()
-    reservas_df = conn.sql("""
-        SELECT *
-        FROM reservas.main.reservas_abril
-    """).df()
-    
-    # Converter colunas de data
-    reservas_df['data_cad'] = pd.to_datetime(reservas_df['data_cad'])
-    reservas_df['data_ultima_alteracao_situacao'] = pd.to_datetime(reservas_df['data_ultima_alteracao_situacao'])
-    
-    return reservas_df
-
 # Título do aplicativo
 st.title("🏢 Imobiliária")
 
-# Carregar e processar dados
-reservas_df = load_data()
+# Período com dados (calculado no banco)
+min_data, max_data = intervalo_datas(TABELA_RESERVAS)
 
 # Sidebar para filtros
 st.sidebar.header("Filtros")
@@ -99,30 +55,25 @@ st.sidebar.header("Filtros")
 data_inicio = st.sidebar.date_input(
     "Data Inicial",
     value=pd.Timestamp('2025-04-01'),
-    min_value=min(reservas_df['data_cad'].dt.date),
-    max_value=max(reservas_df['data_cad'].dt.date),
+    min_value=min_data,
+    max_value=max_data,
     key="data_inicio_filter"
 )
 data_fim = st.sidebar.date_input(
     "Data Final",
-    value=max(reservas_df['data_cad'].dt.date),
-    min_value=min(reservas_df['data_cad'].dt.date),
-    max_value=max(reservas_df['data_cad'].dt.date),
+    value=max_data,
+    min_value=min_data,
+    max_value=max_data,
     key="data_fim_filter"
 )
 
 # Filtro de imobiliária ordenado por vendas totais
-vendas_por_imobiliaria = reservas_df[reservas_df['situacao'] == 'Vendida'].groupby('imobiliaria')['idreserva'].count().reset_index()
-vendas_por_imobiliaria.columns = ['imobiliaria', 'total_vendas']
-vendas_por_imobiliaria = vendas_por_imobiliaria.sort_values('total_vendas', ascending=False)
+# (contagem no banco; imobiliárias sem vendas vêm no fim da lista)
+vendas_por_imobiliaria = ranking_imobiliarias()
 
 # Obter lista ordenada de imobiliárias por vendas
 imobiliarias = vendas_por_imobiliaria['imobiliaria'].tolist()
 
-# Adicionar imobiliárias sem vendas no período ao final da lista
-todas_imobiliarias = set(reservas_df['imobiliaria'].unique())
-imobiliarias.extend([i for i in todas_imobiliarias if i not in imobiliarias])
-
 # Preparar lista de opções com destaque para Prati e mostrar contagem de vendas
 options = ["Todas"] + imobiliarias
 formatted_options = [
@@ -142,73 +93,45 @@ imobiliaria_selecionada = st.sidebar.selectbox(
 )
 
 # Filtro de empreendimento
-empreendimentos = sorted(reservas_df['empreendimento'].unique())
+empreendimentos = opcoes(TABELA_RESERVAS, 'empreendimento')
 empreendimento_selecionado = st.sidebar.selectbox("Empreendimento", ["Todos"] + list(empreendimentos), key="empreendimento_filter")
 
-# Aplicar todos os filtros
-mask = (reservas_df['data_cad'].dt.date >= data_inicio) & (reservas_df['data_cad'].dt.date <= data_fim)
-df_filtrado = reservas_df[mask].copy()
-
-if empreendimento_selecionado != "Todos":
-    df_filtrado = df_filtrado[df_filtrado['empreendimento'] == empreendimento_selecionado]
-if imobiliaria_selecionada != "Todas":
-    df_filtrado = df_filtrado[df_filtrado['imobiliaria'] == imobiliaria_selecionada]
+# Resumos do cubo materializado pela ingestão (ver scripts/cubo.py), já sem
+# reservas canceladas, vendidas e distratos e com os filtros da barra lateral
+filtros_cubo = {
+    'empreendimento': empreendimento_selecionado,
+    'imobiliaria': imobiliaria_selecionada,
+    'excluir_situacoes': ('Cancelada', 'Vendida', 'Distrato'),
+}
+resumo_imobiliaria = resumo_cubo('imobiliaria', data_inicio, data_fim, **filtros_cubo)
+resumo_situacao_imobiliaria = resumo_cubo(('situacao', 'imobiliaria'), data_inicio, data_fim, **filtros_cubo)
 
-# Remover reservas canceladas e vendidas
-df_sem_canceladas_vendidas = df_filtrado[~df_filtrado['situacao'].isin(['Cancelada', 'Vendida', 'Distrato'])]
+def eh_prati(imobiliaria):
+    """Máscara das linhas da Prati"""
+    return imobiliaria.str.strip().str.upper() == 'PRATI EMPREENDIMENTOS'
 
 # Métricas principais
 col1, col2 = st.columns(2)
 
 # Coluna da esquerda - Métricas totais
 with col1:
-    total_reservas = len(df_sem_canceladas_vendidas)
-    valor_total = df_sem_canceladas_vendidas['valor_contrato'].sum()
+    total_reservas = resumo_imobiliaria['quantidade'].sum()
+    valor_total = resumo_imobiliaria['valor_total'].sum()
     st.metric(label="Total de Reservas", value=int(total_reservas), help="Total de reservas ativas")
     st.metric(label="Valor Total", value=format_currency(valor_total))
 
 # Coluna da direita - Métricas Prati
 with col2:
-    reservas_prati = df_sem_canceladas_vendidas[df_sem_canceladas_vendidas['imobiliaria'].str.strip().str.upper() == 'PRATI EMPREENDIMENTOS']
-    total_prati = len(reservas_prati)
-    valor_prati = reservas_prati['valor_contrato'].sum()
+    reservas_prati = resumo_imobiliaria[eh_prati(resumo_imobiliaria['imobiliaria'])]
+    total_prati = reservas_prati['quantidade'].sum()
+    valor_prati = reservas_prati['valor_total'].sum()
     st.metric(label="Reservas Prati", value=int(total_prati), help="Total de reservas da Prati")
     st.metric(label="Valor Prati", value=format_currency(valor_prati))
 
-def extract_days(situacao):
-    # Extrai o número entre parênteses da situação
-    match = re.search(r'\((\d+)\)', situacao)
-    if match:
-        return int(match.group(1))
-    return 0
-
-def check_time_limit(row):
-    # Extrai o número entre parênteses da situação
-    dias_limite = extract_days(row['situacao'])
-    
-    if dias_limite == 0:
-        return False
-        
-    # Pega a data da última alteração
-    data_ultima_alteracao = pd.to_datetime(row['data_ultima_alteracao_situacao'])
-    
-    # Calcula a diferença entre agora e a última alteração em dias
-    dias_decorridos = (datetime.now() - data_ultima_alteracao).days
-    
-    # Verifica se o tempo desde a última alteração excede o limite
-    return dias_decorridos >= dias_limite
-
-# Verificar reservas fora do prazo
-df_sem_canceladas_vendidas['fora_do_prazo'] = df_sem_canceladas_vendidas.apply(check_time_limit, axis=1)
-df_sem_canceladas_vendidas['dias_na_situacao'] = (datetime.now() - df_sem_canceladas_vendidas['data_ultima_alteracao_situacao']).dt.days
-
-analise_imobiliaria = df_sem_canceladas_vendidas.groupby('imobiliaria').agg({
-    'idreserva': 'count',
-    'fora_do_prazo': 'sum',
-    'valor_contrato': 'sum',
-    'dias_na_situacao': 'mean'
-}).reset_index()
+# Uma linha por imobiliária (reservas sem imobiliária só entram nos totais)
+por_imobiliaria = resumo_imobiliaria.dropna(subset=['imobiliaria']).sort_values('imobiliaria', ignore_index=True)
 
+analise_imobiliaria = por_imobiliaria[['imobiliaria', 'quantidade', 'fora_do_prazo', 'valor_total', 'tempo_medio']].copy()
 analise_imobiliaria.columns = ['Imobiliária', 'Total Reservas', 'Fora do Prazo', 'Valor Total', 'Média de Dias']
 analise_imobiliaria['Média de Dias'] = analise_imobiliaria['Média de Dias'].round(1)
 analise_imobiliaria['Valor Total'] = analise_imobiliaria['Valor Total'].apply(format_currency)
@@ -216,37 +139,19 @@ analise_imobiliaria['Valor Total'] = analise_imobiliaria['Valor Total'].apply(fo
 # Análise comparativa Prati vs Outras Imobiliárias
 st.subheader("Comparativo Prati vs Outras Imobiliárias")
 
-# Definir ordem do funil de vendas
-ordem_situacoes = [
-    'Reserva (7)',
-    'Crédito (CEF) (3)',
-    'Negociação (5)',
-    'Mútuo',
-    'Análise Diretoria',
-    'Contrato - Elaboração',
-    'Contrato - Assinatura',
-    'Vendida',
-    'Distrato'
-]
-
-# Separar dados Prati e outras imobiliárias
-df_prati = df_sem_canceladas_vendidas[df_sem_canceladas_vendidas['imobiliaria'].str.strip().str.upper() == 'PRATI EMPREENDIMENTOS']
-df_outras = df_sem_canceladas_vendidas[df_sem_canceladas_vendidas['imobiliaria'].str.strip().str.upper() != 'PRATI EMPREENDIMENTOS']
-
-# Análise por situação para cada grupo
-analise_situacao_prati = df_prati.groupby('situacao')['idreserva'].count().reset_index()
-analise_situacao_outras = df_outras.groupby('situacao')['idreserva'].count().reset_index()
-
-# Renomear colunas
-analise_situacao_prati.columns = ['Situação', 'Prati']
-analise_situacao_outras.columns = ['Situação', 'Outras']
-
-# Mesclar os dataframes
-analise_comparativa = pd.merge(analise_situacao_prati, analise_situacao_outras, on='Situação', how='outer').fillna(0)
+# Quantidade por situação para cada grupo, somada a partir do resumo por situação e imobiliária
+analise_comparativa = (
+    resumo_situacao_imobiliaria.dropna(subset=['situacao'])
+    .assign(grupo=lambda df: eh_prati(df['imobiliaria']).map({True: 'Prati', False: 'Outras'}).fillna('Outras'))
+    .pivot_table(index='situacao', columns='grupo', values='quantidade', aggfunc='sum', fill_value=0)
+    .reindex(columns=['Prati', 'Outras'], fill_value=0)
+    .reset_index()
+)
+analise_comparativa.columns = ['Situação', 'Prati', 'Outras']
 analise_comparativa = analise_comparativa.astype({'Prati': int, 'Outras': int})
 
-# Criar mapeamento para ordem
-ordem_mapping = {situacao: idx for idx, situacao in enumerate(ordem_situacoes)}
+# Ordem de cada situação no funil de vendas (tabela situacao_sla)
+ordem_mapping = situacoes_sla().set_index('situacao')['ordem_funil']
 
 # Adicionar coluna de ordem e ordenar
 analise_comparativa['ordem'] = analise_comparativa['Situação'].map(ordem_mapping)
@@ -273,7 +178,7 @@ col_valor, col_qtd = st.columns(2)
 with col_valor:
     st.subheader("Distribuição de Valores por Imobiliária")
     # Dados para o gráfico de valores
-    chart_data_valor = df_sem_canceladas_vendidas.groupby('imobiliaria')['valor_contrato'].sum().reset_index()
+    chart_data_valor = por_imobiliaria[['imobiliaria', 'valor_total']].copy()
     chart_data_valor.columns = ['Imobiliária', 'Valor']
     chart_data_valor = chart_data_valor.sort_values('Valor', ascending=False)
     chart_data_valor['Valor_Formatado'] = chart_data_valor['Valor'].apply(format_currency)
@@ -311,7 +216,7 @@ with col_valor:
 with col_qtd:
     st.subheader("Distribuição de Reservas por Imobiliária")
     # Dados para o gráfico de quantidades
-    chart_data_qtd = df_sem_canceladas_vendidas.groupby('imobiliaria')['idreserva'].count().reset_index()
+    chart_data_qtd = por_imobiliaria[['imobiliaria', 'quantidade']].copy()
     chart_data_qtd.columns = ['Imobiliária', 'Quantidade']
     chart_data_qtd = chart_data_qtd.sort_values('Quantidade', ascending=False)
 
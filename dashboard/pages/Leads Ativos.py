@@ -1,11 +1,9 @@
 import streamlit as st
-import duckdb
 import pandas as pd
 import plotly.graph_objects as go
-from datetime import datetime
-import os
 
 from utils import display_navigation
+from data import TABELA_LEADS, carregar, fora_de, intervalo_datas, opcoes
 
 # Display navigation bar (includes logo)
 display_navigation()
@@ -17,37 +15,12 @@ st.set_page_config(page_title="Leads Ativos - Funil de Vendas", page_icon="📊"
 
 st.title("📊 Funil de Leads Ativos")
 
-MOTHERDUCK_TOKEN = st.secrets.get("MOTHERDUCK_TOKEN", os.getenv("MOTHERDUCK_TOKEN", ""))
-if not MOTHERDUCK_TOKEN:
-    st.error("Token do MotherDuck não configurado. Verifique as configurações de secrets.")
-    st.stop()
+# Columns the page shows; filters run in the database
+COLUNAS_LEADS = ['Idlead as idlead', 'Data_cad as data_cad', 'Referencia_data as referencia_data',
+                 'Situacao as situacao_nome', 'Imobiliaria as imobiliaria', 'nome_situacao_anterior_lead',
+                 'gestor', 'empreendimento_ultimo']
 
-# Load all data with broad date range for filtering
-def get_all_leads_duckdb():
-    con = duckdb.connect(f"md:reservas?token={MOTHERDUCK_TOKEN}")
-    query = """
-    SELECT Idlead as idlead,
-           Data_cad as data_cad,
-           Referencia_data as referencia_data,
-           Situacao as situacao_nome,
-           Imobiliaria as imobiliaria,
-           nome_situacao_anterior_lead,
-           gestor,
-           empreendimento_ultimo
-    FROM cv_leads
-    ORDER BY data_cad DESC
-    """
-    df = con.execute(query).df()
-    con.close()
-    return df
-
-@st.cache_data
-def load_data():
-    return get_all_leads_duckdb()
-
-leads_df = load_data()
-
-if leads_df.empty:
+if intervalo_datas(TABELA_LEADS)[0] is None:
     st.warning("Nenhum dado retornado do Mother Duck.")
     st.stop()
 
@@ -55,25 +28,21 @@ if leads_df.empty:
 st.sidebar.header("Filtros")
 
 # Imobiliaria filter
-imobiliarias = sorted(leads_df['imobiliaria'].dropna().unique())
+imobiliarias = opcoes(TABELA_LEADS, 'imobiliaria')
 selected_imobiliaria = st.sidebar.selectbox("Imobiliária", ["Todas"] + list(imobiliarias))
 
 # Empreendimento filter
-empreendimentos = sorted(leads_df['empreendimento_ultimo'].dropna().unique())
+empreendimentos = opcoes(TABELA_LEADS, 'empreendimento_ultimo')
 selected_empreendimento = st.sidebar.selectbox("Empreendimento de Interesse", ["Todos"] + list(empreendimentos))
 
-# Apply filters
-filtered_df = leads_df.copy()
-
-if selected_imobiliaria != "Todas":
-    filtered_df = filtered_df[filtered_df['imobiliaria'] == selected_imobiliaria]
-
-if selected_empreendimento != "Todos":
-    filtered_df = filtered_df[filtered_df['empreendimento_ultimo'] == selected_empreendimento]
-
+# Apply filters in the database
 # Exclude converted leads: Descartado, Em Pré-Cadastro, Venda realizada
 exclude_situations = ['descartado', 'em pré-cadastro', 'venda realizada']
-filtered_df = filtered_df[~filtered_df['situacao_nome'].str.lower().str.strip().isin(exclude_situations)]
+filtered_df = carregar(
+    TABELA_LEADS, COLUNAS_LEADS, ordem='data_cad DESC',
+    iguais={'imobiliaria': selected_imobiliaria, 'empreendimento_ultimo': selected_empreendimento},
+    condicoes=[fora_de('lower(trim(situacao))', exclude_situations)]
+)
 
 # Mapeamento do funil baseado na tabela "de" (situação atual) -> "para" (etapa), com especial para "descartado" usando anterior
 mapa_funil = {
@@ -124,7 +93,6 @@ funil_etapas = [
 etapa_counts = [filtered_df[filtered_df["funil_etapa"] == etapa].shape[0] for etapa in funil_etapas]
 
 # Calcular tempo ativo (dias desde a data de cadastro até hoje)
-filtered_df["data_cad"] = pd.to_datetime(filtered_df["data_cad"], errors="coerce")
 now_ts = pd.Timestamp.now()
 filtered_df["dias_ativo"] = (now_ts - filtered_df["data_cad"]).dt.days
 # Formatar como "X dias" para exibição
@@ -1,11 +1,10 @@
 import streamlit as st
-import duckdb
 import pandas as pd
 import plotly.graph_objects as go
 from datetime import datetime
-import os
 
 from utils import display_navigation
+from data import TABELA_LEADS, carregar, intervalo_datas, opcoes
 
 # Display navigation bar (includes logo)
 display_navigation()
@@ -28,39 +27,12 @@ st.title("📊 Funil de Leads")
 # col4.metric(f"Com reserva {tooltip_icon(tooltip_texts['Com reserva'])}", etapa_counts[3], unsafe_allow_html=True)
 # col5.metric(f"Venda realizada {tooltip_icon(tooltip_texts['Venda realizada'])}", etapa_counts[4], unsafe_allow_html=True)
 
-# Carregar token do MotherDuck de forma segura
-MOTHERDUCK_TOKEN = st.secrets.get("MOTHERDUCK_TOKEN", os.getenv("MOTHERDUCK_TOKEN", ""))
-if not MOTHERDUCK_TOKEN:
-    st.error("Token do MotherDuck não configurado. Verifique as configurações de secrets.")
-    st.stop()
+# Columns the page shows; filters run in the database
+COLUNAS_LEADS = ['Idlead as idlead', 'Data_cad as data_cad', 'Referencia_data as referencia_data',
+                 'Situacao as situacao_nome', 'Imobiliaria as imobiliaria', 'nome_situacao_anterior_lead',
+                 'gestor', 'empreendimento_ultimo', 'corretor']
 
-# Load all data with broad date range for filtering
-def get_all_leads_duckdb():
-    con = duckdb.connect(f"md:reservas?token={MOTHERDUCK_TOKEN}")
-    query = """
-    SELECT Idlead as idlead,
-           Data_cad as data_cad,
-           Referencia_data as referencia_data,
-           Situacao as situacao_nome,
-           Imobiliaria as imobiliaria,
-           nome_situacao_anterior_lead,
-           gestor,
-           empreendimento_ultimo,
-           corretor
-    FROM cv_leads
-    ORDER BY data_cad DESC
-    """
-    df = con.execute(query).df()
-    con.close()
-    return df
-
-@st.cache_data
-def load_data():
-    return get_all_leads_duckdb()
-
-leads_df = load_data()
-
-if leads_df.empty:
+if intervalo_datas(TABELA_LEADS)[0] is None:
     st.warning("Nenhum dado retornado do Mother Duck.")
     st.stop()
 
@@ -72,31 +44,23 @@ data_inicio = st.sidebar.date_input("Data Inicial", value=datetime(2025, 1, 1).d
 data_fim = st.sidebar.date_input("Data Final", value=datetime.now().date())
 
 # Imobiliaria filter
-imobiliarias = sorted(leads_df['imobiliaria'].dropna().unique())
+imobiliarias = opcoes(TABELA_LEADS, 'imobiliaria')
 selected_imobiliaria = st.sidebar.selectbox("Imobiliária", ["Todas"] + list(imobiliarias))
 
 # Empreendimento filter
-empreendimentos = sorted(leads_df['empreendimento_ultimo'].dropna().unique())
+empreendimentos = opcoes(TABELA_LEADS, 'empreendimento_ultimo')
 selected_empreendimento = st.sidebar.selectbox("Empreendimento de Interesse", ["Todos"] + list(empreendimentos))
 
 # Corretor filter
-corretores = sorted(leads_df['corretor'].dropna().unique())
+corretores = opcoes(TABELA_LEADS, 'corretor')
 selected_corretor = st.sidebar.selectbox("Corretor", ["Todos"] + list(corretores))
 
-# Apply filters using data_cad
-filtered_df = leads_df[
-    (leads_df['data_cad'].dt.date >= data_inicio) &
-    (leads_df['data_cad'].dt.date <= data_fim)
-].copy()
-
-if selected_imobiliaria != "Todas":
-    filtered_df = filtered_df[filtered_df['imobiliaria'] == selected_imobiliaria]
-
-if selected_empreendimento != "Todos":
-    filtered_df = filtered_df[filtered_df['empreendimento_ultimo'] == selected_empreendimento]
-
-if selected_corretor != "Todos":
-    filtered_df = filtered_df[filtered_df['corretor'] == selected_corretor]
+# Apply filters using data_cad (in the database)
+filtered_df = carregar(
+    TABELA_LEADS, COLUNAS_LEADS, ordem='data_cad DESC', inicio=data_inicio, fim=data_fim,
+    iguais={'imobiliaria': selected_imobiliaria, 'empreendimento_ultimo': selected_empreendimento,
+            'corretor': selected_corretor}
+)
 
 # Mapeamento do funil baseado na tabela "de" (situação atual) -> "para" (etapa), com especial para "descartado" usando anterior
 mapa_funil = {
@@ -36,6 +36,13 @@ import sys
 from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent))
 from utils import display_navigation
+from config import SecureConfig
+from data import (
+    RESERVAS_COM_SLA, TABELA_RESERVAS, carregar, intervalo_datas, opcoes, ranking_imobiliarias, resumo_cubo,
+    situacoes_sla
+)
+from sla import COLUNAS_SLA, SQL_FORA_DO_PRAZO
+from cvcrm_client import get_sessao, url_api
 
 # Display navigation bar (includes logo)
 display_navigation()
@@ -45,12 +52,8 @@ st.session_state['current_page'] = __file__
 
 import pandas as pd
 from datetime import datetime
-import re
-import requests
 import locale
-import duckdb
 from dotenv import load_dotenv
-import os
 
 # Carregar variáveis de ambiente
 load_dotenv()
@@ -74,73 +77,11 @@ def format_currency(value):
     except:
         return f"R$ {value}"
 
-# MotherDuck connection
-@st.cache_resource
-def get_motherduck_connection():
-    """Create a cached connection to MotherDuck"""
-    try:
-        token = os.getenv('MOTHERDUCK_TOKEN')
-        if not token:
-            raise ValueError("MOTHERDUCK_TOKEN não encontrado nas variáveis de ambiente")
-        
-        # Sanitize o token
-        token = token.strip().strip('"').strip("'")
-        
-        # Conectar diretamente ao MotherDuck com o token na URL (formato para conta free)
-        connection_string = f'motherduck:reservas?motherduck_token={token}'
-        
-        try:
-            conn = duckdb.connect(connection_string)
-            return conn
-        except Exception as e:
-            st.error(f"Erro na conexão com MotherDuck: {str(e)}")
-            raise
-    except Exception as e:
-        st.error(f"Erro ao configurar conexão: {str(e)}")
-        raise
-
 # Título do aplicativo
 st.title("📅 Análise de Reservas Fora do Prazo")
 
-def extract_days(situacao):
-    # Extrai o número entre parênteses da situação
-    match = re.search(r'\((\d+)\)', situacao)
-    if match:
-        return int(match.group(1))
-    return 0
-
-def check_time_limit(row):
-    # Extrai o número entre parênteses da situação
-    dias_limite = extract_days(row['situacao'])
-    
-    if dias_limite == 0:
-        return False
-        
-    # Pega a data da última alteração
-    data_ultima_alteracao = pd.to_datetime(row['data_ultima_alteracao_situacao'])
-    
-    # Calcula a diferença entre agora e a última alteração em dias
-    dias_decorridos = (datetime.now() - data_ultima_alteracao).days
-    
-    # Verifica se o tempo desde a última alteração excede o limite
-    return dias_decorridos >= dias_limite
-
-# Carregando os dados
-@st.cache_data
-def load_data():
-    conn = get_motherduck_connection()      # Usando a tabela correta do MotherDuck
-    reservas_df = conn.sql("""
-        SELECT *
-        FROM reservas.main.reservas_abril
-    """).df()
-    
-    # Converter colunas de data
-    reservas_df['data_cad'] = pd.to_datetime(reservas_df['data_cad'])
-    reservas_df['data_ultima_alteracao_situacao'] = pd.to_datetime(reservas_df['data_ultima_alteracao_situacao'])
-    
-    return reservas_df
-
-reservas_df = load_data()
+# Período com dados (calculado no banco)
+min_data, max_data = intervalo_datas(TABELA_RESERVAS)
 
 # Sidebar para filtros
 st.sidebar.header("Filtros")
@@ -149,32 +90,27 @@ st.sidebar.header("Filtros")
 data_inicio = st.sidebar.date_input(
     "Data Inicial",
     value=pd.Timestamp('2025-01-01'),  # Data padrão definida para 01/01/2025
-    min_value=min(reservas_df['data_cad'].dt.date),
-    max_value=max(reservas_df['data_cad'].dt.date)
+    min_value=min_data,
+    max_value=max_data
 )
 data_fim = st.sidebar.date_input(
     "Data Final",
-    value=max(reservas_df['data_cad'].dt.date),
-    min_value=min(reservas_df['data_cad'].dt.date),
-    max_value=max(reservas_df['data_cad'].dt.date)
+    value=max_data,
+    min_value=min_data,
+    max_value=max_data
 )
 
 # Filtro de empreendimento
-empreendimentos = sorted(reservas_df['empreendimento'].unique())
+empreendimentos = opcoes(TABELA_RESERVAS, 'empreendimento')
 empreendimento_selecionado = st.sidebar.selectbox("Empreendimento", ["Todos"] + list(empreendimentos))
 
 # Filtro de imobiliária ordenado por vendas totais
-vendas_por_imobiliaria = reservas_df[reservas_df['situacao'] == 'Vendida'].groupby('imobiliaria')['idreserva'].count().reset_index()
-vendas_por_imobiliaria.columns = ['imobiliaria', 'total_vendas']
-vendas_por_imobiliaria = vendas_por_imobiliaria.sort_values('total_vendas', ascending=False)
+# (contagem no banco; imobiliárias sem vendas vêm no fim da lista)
+vendas_por_imobiliaria = ranking_imobiliarias()
 
 # Obter lista ordenada de imobiliárias por vendas
 imobiliarias = vendas_por_imobiliaria['imobiliaria'].tolist()
 
-# Adicionar imobiliárias sem vendas no período ao final da lista
-todas_imobiliarias = set(reservas_df['imobiliaria'].unique())
-imobiliarias.extend([i for i in todas_imobiliarias if i not in imobiliarias])
-
 # Preparar lista de opções com destaque para Prati e mostrar contagem de vendas
 options = ["Todas"] + imobiliarias
 formatted_options = [
@@ -193,76 +129,52 @@ imobiliaria_selecionada = st.sidebar.selectbox(
 )
 
 # Filtro de situação
-situacoes = sorted(reservas_df[~reservas_df['situacao'].isin(['Vendida', 'Distrato', 'Cancelada'])]['situacao'].unique())
+situacoes = opcoes(TABELA_RESERVAS, 'situacao', excluir={'situacao': ['Vendida', 'Distrato', 'Cancelada']})
 situacao_selecionada = st.sidebar.selectbox("Situação", ["Todas"] + list(situacoes))
 
-# Aplicar filtros
-mask = (reservas_df['data_cad'].dt.date >= data_inicio) & (reservas_df['data_cad'].dt.date <= data_fim)
-df_filtrado = reservas_df[mask].copy()
-
-if empreendimento_selecionado != "Todos":
-    df_filtrado = df_filtrado[df_filtrado['empreendimento'] == empreendimento_selecionado]
-if imobiliaria_selecionada != "Todas":
-    df_filtrado = df_filtrado[df_filtrado['imobiliaria'] == imobiliaria_selecionada]
-if situacao_selecionada != "Todas":
-    df_filtrado = df_filtrado[df_filtrado['situacao'] == situacao_selecionada]
-
-# Remover reservas canceladas e vendidas
-df_sem_canceladas_vendidas = df_filtrado[~df_filtrado['situacao'].isin(['Cancelada', 'Vendida'])]
-
-# Verificar reservas fora do prazo
-df_sem_canceladas_vendidas['fora_do_prazo'] = df_sem_canceladas_vendidas.apply(check_time_limit, axis=1)
-df_sem_canceladas_vendidas['dias_na_situacao'] = (datetime.now() - df_sem_canceladas_vendidas['data_ultima_alteracao_situacao']).dt.days
+# Resumos do cubo materializado pela ingestão (ver scripts/cubo.py), já sem
+# reservas canceladas e vendidas e com os filtros da barra lateral
+filtros_cubo = {
+    'empreendimento': empreendimento_selecionado,
+    'imobiliaria': imobiliaria_selecionada,
+    'situacao': situacao_selecionada,
+    'excluir_situacoes': ('Cancelada', 'Vendida'),
+}
+resumo_situacao = resumo_cubo('situacao', data_inicio, data_fim, **filtros_cubo)
+resumo_empreendimento = resumo_cubo('empreendimento', data_inicio, data_fim, **filtros_cubo)
 
 # Métricas principais
 col1, col2, col3 = st.columns(3)
 with col1:
-    total_fora_prazo = df_sem_canceladas_vendidas['fora_do_prazo'].sum()
+    total_fora_prazo = resumo_situacao['fora_do_prazo'].sum()
     st.metric(label="Total Fora do Prazo", value=int(total_fora_prazo))
 with col2:
-    percentual_fora_prazo = (total_fora_prazo / len(df_sem_canceladas_vendidas)) * 100
+    percentual_fora_prazo = (total_fora_prazo / resumo_situacao['quantidade'].sum()) * 100
     st.metric(label="Percentual Fora do Prazo", value=f"{percentual_fora_prazo:.1f}%")
 with col3:
-    valor_total_fora_prazo = df_sem_canceladas_vendidas[df_sem_canceladas_vendidas['fora_do_prazo']]['valor_contrato'].sum()
+    valor_total_fora_prazo = resumo_situacao['valor_fora_do_prazo'].sum()
     st.metric(label="Valor Total Fora do Prazo", value=format_currency(valor_total_fora_prazo))
 
-# Análise por situação
-st.subheader("Análise por Situação")
-
-# Definir ordem do funil de vendas
-ordem_situacoes = [
-    'Reserva (7)',
-    'Crédito (CEF) (3)',
-    'Negociação (5)',
-    'Mútuo',
-    'Análise Diretoria',
-    'Contrato - Elaboração',
-    'Contrato - Assinatura',
-    'Vendida',
-    'Distrato'
-]
 
-# Calcular tempo médio para todas as reservas por situação
-tempo_medio = df_sem_canceladas_vendidas.groupby('situacao')['dias_na_situacao'].mean().round(0).astype(int)
+def analise_fora_do_prazo(resumo, dimensao, titulo):
+    """Quantidade e valor fora do prazo e tempo médio (de todas as reservas) por `dimensao`"""
+    analise = resumo[resumo['fora_do_prazo'] > 0].dropna(subset=[dimensao])[
+        [dimensao, 'fora_do_prazo', 'valor_fora_do_prazo', 'tempo_medio']
+    ].copy()
+    analise.columns = [titulo, 'Quantidade', 'Valor Total', 'Tempo Médio']
+    analise['Tempo Médio'] = analise['Tempo Médio'].fillna(0).round(0).astype(int)
+    return analise
 
-# Análise das reservas fora do prazo
-analise_situacao = df_sem_canceladas_vendidas[df_sem_canceladas_vendidas['fora_do_prazo']].groupby('situacao').agg({
-    'idreserva': 'count',
-    'valor_contrato': 'sum'
-}).reset_index()
 
-# Adicionar tempo médio à análise
-analise_situacao = analise_situacao.merge(
-    tempo_medio.reset_index().rename(columns={'dias_na_situacao': 'Tempo Médio'}),
-    on='situacao'
-)
+# Análise por situação
+st.subheader("Análise por Situação")
 
-analise_situacao.columns = ['Situação', 'Quantidade', 'Valor Total', 'Tempo Médio']
+analise_situacao = analise_fora_do_prazo(resumo_situacao, 'situacao', 'Situação')
 
-# Criar mapeamento para ordem
-ordem_mapping = {situacao: idx for idx, situacao in enumerate(ordem_situacoes)}
+# Ordem de cada situação no funil de vendas (tabela situacao_sla)
+ordem_mapping = situacoes_sla().set_index('situacao')['ordem_funil']
 analise_situacao['ordem'] = analise_situacao['Situação'].map(ordem_mapping)
-analise_situacao = analise_situacao.sort_values('ordem').drop('ordem', axis=1)
+analise_situacao = analise_situacao.sort_values('ordem', ignore_index=True).drop('ordem', axis=1)
 
 # Formatar valor total
 analise_situacao['Valor Total'] = analise_situacao['Valor Total'].apply(format_currency)
@@ -274,22 +186,8 @@ st.divider()
 # Análise por empreendimento
 st.subheader("Análise por Empreendimento")
 
-# Calcular tempo médio para todas as reservas por empreendimento
-tempo_medio_emp = df_sem_canceladas_vendidas.groupby('empreendimento')['dias_na_situacao'].mean().round(0).astype(int)
-
-# Análise das reservas fora do prazo por empreendimento
-analise_empreendimento = df_sem_canceladas_vendidas[df_sem_canceladas_vendidas['fora_do_prazo']].groupby('empreendimento').agg({
-    'idreserva': 'count',
-    'valor_contrato': 'sum'
-}).reset_index()
-
-# Adicionar tempo médio à análise
-analise_empreendimento = analise_empreendimento.merge(
-    tempo_medio_emp.reset_index().rename(columns={'dias_na_situacao': 'Tempo Médio'}),
-    on='empreendimento'
-)
-
-analise_empreendimento.columns = ['Empreendimento', 'Quantidade', 'Valor Total', 'Tempo Médio']
+analise_empreendimento = analise_fora_do_prazo(resumo_empreendimento, 'empreendimento', 'Empreendimento')
+analise_empreendimento = analise_empreendimento.sort_values('Empreendimento', ignore_index=True)
 analise_empreendimento['Valor Total'] = analise_empreendimento['Valor Total'].apply(format_currency)
 
 st.table(analise_empreendimento)
@@ -297,29 +195,16 @@ st.table(analise_empreendimento)
 @st.cache_data
 def get_reservation_messages(idreserva):
     """Busca as mensagens de uma reserva específica"""
-    url = f"https://prati.cvcrm.com.br/api/v2/cv/reservas/{idreserva}/mensagens"
-    
-    # Obter credenciais de forma segura
-    try:
-        email = st.secrets["CVCRM_EMAIL"]
-        token = st.secrets["CVCRM_TOKEN"]
-    except KeyError:
-        # Fallback para variáveis de ambiente em desenvolvimento
-        email = os.getenv('CVCRM_EMAIL', '')
-        token = os.getenv('CVCRM_TOKEN', '')
+    url = url_api(f"api/v2/cv/reservas/{idreserva}/mensagens")
     
-    if not email or not token:
-        st.error("Credenciais CVCRM não configuradas. Verifique as configurações de secrets CVCRM_EMAIL e CVCRM_TOKEN.")
+    # Obter credenciais de forma segura (secrets ou variáveis de ambiente)
+    headers = SecureConfig.get_cvcrm_headers()
+    if not headers:
         return []
     
-    headers = {
-        "accept": "application/json",
-        "email": email.strip(),
-        "token": token.strip(),
-    }
-    
     try:
-        response = requests.get(url, headers=headers)
+        # Sessão compartilhada: reaproveita a conexão entre os cards
+        response = get_sessao().get(url, headers=headers)
         response.raise_for_status()
         messages = response.json().get("dados", [])
         return messages
@@ -331,7 +216,18 @@ st.divider()
 
 # Lista detalhada de reservas fora do prazo em formato de cards
 st.subheader("Cards de Reservas Fora do Prazo")
-df_fora_prazo = df_sem_canceladas_vendidas[df_sem_canceladas_vendidas['fora_do_prazo']]
+
+# Só as reservas fora do prazo, com as colunas dos cards
+# (dias na situação e fora do prazo calculados na consulta, ver scripts/sla.py)
+df_fora_prazo = carregar(
+    RESERVAS_COM_SLA,
+    ['idreserva', 'cliente', 'empreendimento', 'situacao', 'imobiliaria', 'valor_contrato', *COLUNAS_SLA],
+    inicio=data_inicio, fim=data_fim,
+    iguais={'empreendimento': empreendimento_selecionado, 'imobiliaria': imobiliaria_selecionada,
+            'situacao': situacao_selecionada},
+    excluir={'situacao': ['Cancelada', 'Vendida']},
+    condicoes=[SQL_FORA_DO_PRAZO]
+)
 
 # Criar colunas para os cards (3 cards por linha)
 for i in range(0, len(df_fora_prazo), 3):
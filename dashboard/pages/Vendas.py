@@ -3,13 +3,10 @@ import sys
 from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent))
 from utils import display_navigation
+from data import TABELA_RESERVAS, carregar, intervalo_datas, opcoes, ranking_imobiliarias
 import pandas as pd
-from datetime import datetime
-import plotly.express as px
 import locale
-import duckdb
 from dotenv import load_dotenv
-import os
 
 # Metas de vendas por mês e empreendimento
 meta_vendas = {
@@ -103,68 +100,30 @@ def format_currency(value):
     except:
         return f"R$ {value}"
 
-# MotherDuck connection
-@st.cache_resource
-def get_motherduck_connection():
-    """Create a cached connection to MotherDuck"""
-    try:
-        token = os.getenv('MOTHERDUCK_TOKEN')
-        if not token:
-            raise ValueError("MOTHERDUCK_TOKEN não encontrado nas variáveis de ambiente")
-        
-        # Sanitize o token
-        token = token.strip().strip('"').strip("'")
-        
-        # Conectar diretamente ao MotherDuck com o token na URL (formato para conta free)
-        connection_string = f'motherduck:reservas?motherduck_token={token}'
-        
-        try:
-            conn = duckdb.connect(connection_string)
-            return conn
-        except Exception as e:
-            st.error(f"Erro na conexão com MotherDuck: {str(e)}")
-            raise
-    except Exception as e:
-        st.error(f"Erro ao configurar conexão: {str(e)}")
-        raise
+# Colunas usadas na página (data_venda e a origem da venda calculadas no banco)
+COLUNAS_VENDAS = [
+    'idreserva', 'empreendimento', 'imobiliaria', 'situacao', 'valor_contrato',
+    'data_cad', 'data_ultima_alteracao_situacao',
+    """CASE
+        WHEN situacao = 'Vendida' THEN CAST(data_ultima_alteracao_situacao AS TIMESTAMP)
+        ELSE NULL
+    END AS data_venda""",
+    """CASE
+        WHEN upper(imobiliaria) LIKE '%PRATI%' THEN 'Venda Interna (Prati)'
+        ELSE 'Venda Externa (Imobiliárias)'
+    END AS tipo_venda_origem""",
+]
 
 # Carregando os dados
-@st.cache_data
-def load_data():
-    conn = get_motherduck_connection()    # Buscar todas as reservas com tipo de venda
-    reservas_df = conn.sql("""
-        SELECT 
-            r.*,
-            COALESCE(r.tipovenda, 'Outros') as tipo_venda,
-            CASE 
-                WHEN r.situacao = 'Vendida' THEN CAST(r.data_ultima_alteracao_situacao AS TIMESTAMP)
-                ELSE NULL 
-            END as data_venda,
-            CASE 
-                WHEN r.situacao = 'Vendida' THEN date_part('year', CAST(r.data_ultima_alteracao_situacao AS TIMESTAMP))
-                ELSE NULL 
-            END as ano_venda,
-            CASE 
-                WHEN r.situacao = 'Vendida' THEN date_part('month', CAST(r.data_ultima_alteracao_situacao AS TIMESTAMP))
-                ELSE NULL 
-            END as mes_venda
-        FROM reservas.main.reservas_abril r
-    """).df()
-    
-    # Converter colunas de data
-    reservas_df['data_cad'] = pd.to_datetime(reservas_df['data_cad'])
-    reservas_df['data_ultima_alteracao_situacao'] = pd.to_datetime(reservas_df['data_ultima_alteracao_situacao'])
-    reservas_df['data_venda'] = pd.to_datetime(reservas_df['data_venda'])
-  
-    
+def load_data(empreendimento, imobiliaria):
+    # Reservas do empreendimento e da imobiliária escolhidos, filtradas no banco. As datas
+    # ficam no pandas: a página compara períodos diferentes (mês anterior, mútuo) em colunas diferentes
+    reservas_df = carregar(TABELA_RESERVAS, COLUNAS_VENDAS,
+                           iguais={'empreendimento': empreendimento, 'imobiliaria': imobiliaria})
+
     # Calcular tempo até a venda (em dias)
     reservas_df['tempo_ate_venda'] = (reservas_df['data_ultima_alteracao_situacao'] - reservas_df['data_cad']).dt.days
-    
-    # Identificar vendas internas (Prati) e externas (outras imobiliárias)
-    reservas_df['tipo_venda_origem'] = reservas_df['imobiliaria'].apply(
-        lambda x: 'Venda Interna (Prati)' if 'PRATI' in str(x).upper() else 'Venda Externa (Imobiliárias)'
-    )
-    
+
     return reservas_df
 
 def normalizar_nome_empreendimento(nome):
@@ -179,16 +138,12 @@ def normalizar_nome_empreendimento(nome):
 # Título do aplicativo
 st.title("📈 Análise de Vendas")
 
-# Carregar dados
-reservas_df = load_data()
-
 # Sidebar para filtros
 st.sidebar.header("Filtros")
 
-# Log para debug das datas disponíveis
-vendas_datas = reservas_df[reservas_df['situacao'] == 'Vendida']['data_venda'].dropna()
-min_data = min(vendas_datas.dt.date)
-max_data = max(vendas_datas.dt.date)
+# Período com vendas (data_venda = última alteração das reservas vendidas), calculado no banco
+min_data, max_data = intervalo_datas(TABELA_RESERVAS, 'data_ultima_alteracao_situacao',
+                                     iguais={'situacao': 'Vendida'})
 
 # Filtro de data - usar data_venda para vendas
 data_inicio = st.sidebar.date_input(
@@ -205,23 +160,16 @@ data_fim = st.sidebar.date_input(
 )
 
 # Filtro de empreendimento
-empreendimentos = sorted(reservas_df['empreendimento'].unique())
+empreendimentos = opcoes(TABELA_RESERVAS, 'empreendimento')
 empreendimento_selecionado = st.sidebar.selectbox("Empreendimento", ["Todos"] + list(empreendimentos))
 
 # Filtro de imobiliária ordenado por vendas
-vendas_por_imobiliaria = reservas_df[
-    (reservas_df['situacao'] == 'Vendida')
-].groupby('imobiliaria')['idreserva'].count().reset_index()
-vendas_por_imobiliaria.columns = ['imobiliaria', 'total_vendas']
-vendas_por_imobiliaria = vendas_por_imobiliaria.sort_values('total_vendas', ascending=False)
+# (contagem no banco; imobiliárias sem vendas vêm no fim da lista)
+vendas_por_imobiliaria = ranking_imobiliarias()
 
 # Obter lista ordenada de imobiliárias por vendas
 imobiliarias = vendas_por_imobiliaria['imobiliaria'].tolist()
 
-# Adicionar imobiliárias sem vendas no período ao final da lista
-todas_imobiliarias = set(reservas_df['imobiliaria'].unique())
-imobiliarias.extend([i for i in todas_imobiliarias if i not in imobiliarias])
-
 # Preparar lista de opções com destaque para Prati e mostrar contagem de vendas
 options = ["Todas"] + imobiliarias
 formatted_options = [
@@ -239,17 +187,10 @@ imobiliaria_selecionada = st.sidebar.selectbox(
     format_func=lambda x: option_to_display[x]
 )
 
-# Aplicar filtros básicos (não relacionados à data)
+# Filtros básicos (não relacionados à data) aplicados na consulta
+reservas_df = load_data(empreendimento_selecionado, imobiliaria_selecionada)
 df_filtrado = reservas_df.copy()
 
-# Aplicar filtro de empreendimento se selecionado
-if empreendimento_selecionado != "Todos":
-    df_filtrado = df_filtrado[df_filtrado['empreendimento'] == empreendimento_selecionado]
-
-# Aplicar filtro de imobiliária se selecionado
-if imobiliaria_selecionada != "Todas":
-    df_filtrado = df_filtrado[df_filtrado['imobiliaria'] == imobiliaria_selecionada]
-
 # Para vendas, usar data_venda no filtro - com validação de dados
 vendas_2024 = df_filtrado[
     (df_filtrado['situacao'] == 'Vendida') & 
@@ -0,0 +1,115 @@
+"""
+Arquivo bruto das páginas devolvidas pela API do CVCRM.
+
+Cada execução grava as páginas extraídas, exatamente como vieram (antes do
+filtro de data e das transformações), em Parquet zstd particionado por
+fonte e mês de referencia_data:
+
+    arquivo_bruto/fonte=reservas/mes=2025-03/<execucao>_0.parquet
+
+O disco é só a etapa local: ao fim de uma ingestão bem-sucedida,
+publicar() acrescenta as partições ainda não publicadas à tabela
+arquivo_bruto do banco (MotherDuck ou o backend local), que é a cópia
+durável, e apaga os arquivos. Cada execução acrescenta só as páginas que
+ela mesma capturou.
+
+Com isso as tabelas podem ser reconstruídas sem a API
+(update_motherduck.py --replay), p.ex. depois de corrigir uma
+transformação, lendo a tabela e o que ainda estiver no disco. Um registro
+capturado por várias execuções aparece várias vezes; o replay fica com a
+versão mais recente de cada chave.
+"""
+import glob
+import json
+import os
+
+import duckdb
+
+DIRETORIO_ARQUIVO = os.environ.get(
+    'ARQUIVO_BRUTO_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'arquivo_bruto')
+)
+
+# ARQUIVO_BRUTO=0 desliga a gravação (a leitura para o replay continua possível)
+ARQUIVAR = os.environ.get('ARQUIVO_BRUTO', '1') != '0'
+
+TABELA_ARQUIVO = 'reservas.main.arquivo_bruto'
+
+
+def destino(fonte, diretorio=None):
+    """Diretório da partição da fonte"""
+    return os.path.join(diretorio or DIRETORIO_ARQUIVO, f"fonte={fonte}")
+
+
+def arquivos_locais(fonte='*', diretorio=None):
+    """Arquivos Parquet no disco (de uma fonte ou de todas), ainda não publicados"""
+    return sorted(glob.glob(os.path.join(destino(fonte, diretorio), 'mes=*', '*.parquet')))
+
+
+def _consulta_arquivos(arquivos):
+    return f"""
+        SELECT fonte, mes, execucao, capturado_em, pagina, registro
+        FROM read_parquet([{', '.join("'" + arquivo.replace("'", "''") + "'" for arquivo in arquivos)}],
+                          hive_partitioning = true, hive_types_autocast = false)
+    """
+
+
+def _tabela_existe(conn, tabela):
+    catalogo, esquema, nome = tabela.split('.')
+    return conn.execute("""
+        SELECT count(*) FROM duckdb_tables()
+        WHERE database_name = ? AND schema_name = ? AND table_name = ?
+    """, [catalogo, esquema, nome]).fetchone()[0] > 0
+
+
+def publicar(conn, diretorio=None, tabela=TABELA_ARQUIVO):
+    """
+    Acrescenta à tabela do banco as páginas que estão no disco e apaga os
+    arquivos. Retorna quantos registros foram publicados.
+    """
+    arquivos = arquivos_locais(diretorio=diretorio)
+    if not arquivos:
+        return 0
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {tabela} (
+            fonte VARCHAR,
+            mes VARCHAR,
+            execucao VARCHAR,
+            capturado_em TIMESTAMP,
+            pagina INTEGER,
+            registro VARCHAR
+        )
+    """)
+    quantidade = conn.execute(f"INSERT INTO {tabela} {_consulta_arquivos(arquivos)}").fetchone()[0]
+    for arquivo in arquivos:
+        os.remove(arquivo)
+    return quantidade
+
+
+def ler_paginas(fonte, diretorio=None, conn=None, tabela=TABELA_ARQUIVO):
+    """
+    Gera as páginas arquivadas da fonte (listas de registros), na ordem em
+    que foram capturadas: as publicadas na tabela (com `conn`) e as que
+    ainda estão no disco. Uma página dividida entre meses volta inteira.
+    """
+    partes, parametros = [], []
+    if conn is not None and _tabela_existe(conn, tabela):
+        partes.append(f"SELECT execucao, capturado_em, pagina, registro FROM {tabela} WHERE fonte = ?")
+        parametros.append(fonte)
+    arquivos = arquivos_locais(fonte, diretorio)
+    if arquivos:
+        partes.append(f"SELECT execucao, capturado_em, pagina, registro FROM ({_consulta_arquivos(arquivos)})")
+    if not partes:
+        return
+    cursor = conn.cursor() if conn is not None else duckdb.connect()
+    try:
+        resultado = cursor.execute(f"""
+            SELECT list(registro)
+            FROM ({' UNION ALL '.join(partes)})
+            GROUP BY execucao, pagina
+            ORDER BY min(capturado_em), pagina
+        """, parametros)
+        while (linha := resultado.fetchone()) is not None:
+            yield [json.loads(registro) for registro in linha[0]]
+    finally:
+        cursor.close()
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Onde ficam as tabelas `reservas`: MotherDuck, um arquivo DuckDB local ou
+um diretório de arquivos Parquet com o mesmo esquema.
+
+Escolha por variável de ambiente (ou secrets do Streamlit, via SecureConfig):
+
+    RESERVAS_BACKEND = motherduck (padrão) | duckdb | parquet
+    RESERVAS_CAMINHO = arquivo .duckdb ou diretório com <tabela>.parquet
+
+Em qualquer backend a conexão enxerga o catálogo `reservas` como banco
+padrão, então as consultas (`reservas.main.reservas_abril`, `cv_leads`)
+são as mesmas. No backend parquet as tabelas são lidas para a memória e
+gravadas de volta no diretório por persistir()/fechar().
+
+No backend duckdb o arquivo tem um único escritor: o DuckDB trava o arquivo
+para o processo que o abre, mesmo só para leitura. Enquanto o dashboard
+estiver aberto sobre o arquivo, a ingestão não consegue gravar (e, durante
+a ingestão, o dashboard não consegue abri-lo); pare o dashboard para rodar
+a ingestão e suba-o de novo depois. Para ler e gravar ao mesmo tempo, use
+o MotherDuck.
+
+Para trabalhar sem rede com dados reais, copie o MotherDuck uma vez:
+
+    python scripts/backend.py copiar --para parquet --caminho dados/reservas
+"""
+import argparse
+import glob
+import os
+import shutil
+
+import duckdb
+
+BACKENDS = ('motherduck', 'duckdb', 'parquet')
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+CAMINHOS_PADRAO = {
+    'duckdb': os.path.join(RAIZ, 'dados', 'reservas.duckdb'),
+    'parquet': os.path.join(RAIZ, 'dados', 'reservas'),
+}
+
+
+def configuracao(backend=None, caminho=None):
+    """(backend, caminho) a usar: os argumentos ou, na falta deles, o ambiente"""
+    backend = (backend or os.environ.get('RESERVAS_BACKEND') or 'motherduck').strip().lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend inválido: {backend} (use {', '.join(BACKENDS)})")
+    if backend == 'motherduck':
+        return backend, None
+    caminho = caminho or os.environ.get('RESERVAS_CAMINHO') or CAMINHOS_PADRAO[backend]
+    return backend, os.path.abspath(caminho)
+
+
+def _literal(texto):
+    return "'" + texto.replace("'", "''") + "'"
+
+
+def _arquivos_parquet(diretorio):
+    """Nome da tabela -> arquivo(s) Parquet (<tabela>.parquet ou <tabela>/**/*.parquet)"""
+    tabelas = {}
+    for caminho in sorted(glob.glob(os.path.join(diretorio, '*'))):
+        nome, extensao = os.path.splitext(os.path.basename(caminho))
+        if extensao == '.parquet':
+            tabelas[nome] = caminho
+        elif os.path.isdir(caminho):
+            tabelas[os.path.basename(caminho)] = os.path.join(caminho, '**', '*.parquet')
+    return tabelas
+
+
+def conectar(backend=None, caminho=None, token=None, somente_leitura=False):
+    """
+    Conexão com o catálogo `reservas` no backend configurado. `token` só
+    vale para o MotherDuck (sem ele, vale a variável motherduck_token).
+    """
+    backend, caminho = configuracao(backend, caminho)
+    if backend == 'motherduck':
+        return duckdb.connect(f"md:reservas?motherduck_token={token}" if token else 'md:reservas')
+
+    conn = duckdb.connect()
+    if backend == 'duckdb':
+        if somente_leitura and not os.path.exists(caminho):
+            raise FileNotFoundError(f"Arquivo DuckDB não encontrado: {caminho}")
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        opcoes = ' (READ_ONLY)' if somente_leitura else ''
+        try:
+            conn.execute(f"ATTACH {_literal(caminho)} AS reservas{opcoes}")
+        except duckdb.IOException as e:
+            conn.close()
+            if somente_leitura or 'lock' not in str(e):
+                raise
+            raise RuntimeError(
+                f"O arquivo {caminho} está aberto em outro processo (o dashboard ou outra ingestão); "
+                "no backend duckdb pare o dashboard antes de rodar a ingestão"
+            ) from e
+    else:
+        if somente_leitura and not os.path.isdir(caminho):
+            raise FileNotFoundError(f"Diretório Parquet não encontrado: {caminho}")
+        conn.execute("ATTACH ':memory:' AS reservas")
+        # Leitura: views sobre os arquivos; escrita: tabelas na memória
+        objeto = 'VIEW' if somente_leitura else 'TABLE'
+        for tabela, arquivos in _arquivos_parquet(caminho).items():
+            conn.execute(f"""
+                CREATE {objeto} reservas.main.{tabela} AS
+                SELECT * FROM read_parquet({_literal(arquivos)}, hive_partitioning = false)
+            """)
+    conn.execute("USE reservas")
+    return conn
+
+
+def tabelas(conn):
+    """Tabelas (e, no parquet só leitura, views) do catálogo `reservas`"""
+    return [linha[0] for linha in conn.execute("""
+        SELECT table_name FROM information_schema.tables
+        WHERE table_catalog = 'reservas' AND table_schema = 'main'
+        ORDER BY table_name
+    """).fetchall()]
+
+
+def exportar_parquet(conn, diretorio):
+    """
+    Grava cada tabela de `reservas` em <diretorio>/<tabela>.parquet (troca
+    atômica) e apaga os arquivos das tabelas que não existem mais, para que
+    não voltem na próxima conexão.
+    """
+    os.makedirs(diretorio, exist_ok=True)
+    anteriores = _arquivos_parquet(diretorio)
+    atuais = tabelas(conn)
+    for tabela in atuais:
+        destino = os.path.join(diretorio, f"{tabela}.parquet")
+        temporario = f"{destino}.tmp"
+        conn.execute(
+            f"COPY reservas.main.{tabela} TO {_literal(temporario)} (FORMAT parquet, COMPRESSION zstd)"
+        )
+        os.replace(temporario, destino)
+        # Uma tabela lida de <tabela>/ passa a ficar só em <tabela>.parquet
+        if os.path.isdir(os.path.join(diretorio, tabela)):
+            shutil.rmtree(os.path.join(diretorio, tabela))
+    for tabela in set(anteriores) - set(atuais):
+        if os.path.isdir(os.path.join(diretorio, tabela)):
+            shutil.rmtree(os.path.join(diretorio, tabela))
+        if os.path.exists(os.path.join(diretorio, f"{tabela}.parquet")):
+            os.remove(os.path.join(diretorio, f"{tabela}.parquet"))
+
+
+def persistir(conn, backend=None, caminho=None):
+    """No backend parquet, grava as tabelas de volta no diretório; nos outros não há o que fazer"""
+    backend, caminho = configuracao(backend, caminho)
+    if backend == 'parquet':
+        exportar_parquet(conn, caminho)
+
+
+def fechar(conn, backend=None, caminho=None):
+    """Persiste (se preciso) e fecha a conexão"""
+    try:
+        persistir(conn, backend, caminho)
+    finally:
+        conn.close()
+
+
+def copiar(origem, backend, caminho=None):
+    """Copia todas as tabelas da conexão `origem` para um backend local"""
+    backend, caminho = configuracao(backend, caminho)
+    if backend == 'motherduck':
+        raise ValueError("A cópia é para um backend local (duckdb ou parquet)")
+    nomes = tabelas(origem)
+    if backend == 'parquet':
+        exportar_parquet(origem, caminho)
+    else:
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        origem.execute(f"ATTACH {_literal(caminho)} AS copia_local")
+        try:
+            for tabela in nomes:
+                origem.execute(
+                    f"CREATE OR REPLACE TABLE copia_local.main.{tabela} AS SELECT * FROM reservas.main.{tabela}"
+                )
+        finally:
+            origem.execute("DETACH copia_local")
+    return nomes
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    parser = argparse.ArgumentParser(description="Backends das tabelas reservas")
+    subcomandos = parser.add_subparsers(dest='comando', required=True)
+    copia = subcomandos.add_parser('copiar', help="copia as tabelas do backend configurado para um local")
+    copia.add_argument('--para', choices=['duckdb', 'parquet'], required=True)
+    copia.add_argument('--caminho', help="arquivo .duckdb ou diretório Parquet de destino")
+    args = parser.parse_args()
+
+    load_dotenv()
+    origem = conectar(somente_leitura=True)
+    try:
+        nomes = copiar(origem, args.para, args.caminho)
+        print(f"{len(nomes)} tabelas copiadas para {configuracao(args.para, args.caminho)[1]}: {', '.join(nomes)}")
+    finally:
+        origem.close()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Benchmark da ingestão contra o mock local do CVCRM (mock_cvcrm.py).
+
+Mede registros/segundo, requisições feitas à API e pico de memória
+(tracemalloc) de obter_todos_dados() de cada fonte (reservas, workflow, leads) e da carga completa do
+update_motherduck(), publicada num arquivo DuckDB local em vez do MotherDuck.
+Os dados do mock são determinísticos, então os números de antes e depois de
+uma otimização são comparáveis:
+
+    python scripts/benchmark_ingestao.py --saida antes.json
+    # ... alteração ...
+    python scripts/benchmark_ingestao.py --comparar antes.json
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from mock_cvcrm import iniciar_mock
+
+CENARIOS = ['reservas', 'workflow', 'leads', 'update_motherduck']
+
+
+def configurar_ambiente(url_base, diretorio, args):
+    """Aponta a ingestão para o mock; precisa rodar antes de importar os módulos dela"""
+    os.environ['CVCRM_BASE_URL'] = url_base
+    os.environ.setdefault('CVCRM_EMAIL', 'benchmark@example.com')
+    os.environ.setdefault('CVCRM_TOKEN', 'benchmark')
+    os.environ['INGESTAO_DIR'] = os.path.join(diretorio, 'ingestao')
+    os.environ['TELEMETRIA_DIR'] = os.path.join(diretorio, 'telemetria')
+    os.environ['ARQUIVO_BRUTO_DIR'] = os.path.join(diretorio, 'arquivo_bruto')
+    # A carga completa publica num arquivo DuckDB local em vez do MotherDuck
+    os.environ['RESERVAS_BACKEND'] = 'duckdb'
+    os.environ['RESERVAS_CAMINHO'] = os.path.join(diretorio, 'benchmark.duckdb')
+    if args.req_por_segundo:
+        os.environ['CVCRM_REQ_POR_SEGUNDO'] = str(args.req_por_segundo)
+    if args.concorrencia:
+        os.environ['CVCRM_CONCORRENCIA'] = str(args.concorrencia)
+
+
+def medir(nome, funcao, servidor, memoria=True):
+    """Executa `funcao` (que devolve o número de linhas) e coleta as métricas"""
+    import cvcrm_fetcher
+
+    # Cada cenário começa com o limitador na taxa cheia e contadores zerados
+    cvcrm_fetcher._limitador = None
+    servidor.zerar_estatisticas()
+    if memoria:
+        tracemalloc.start()
+    inicio = time.perf_counter()
+    try:
+        linhas = funcao()
+    finally:
+        duracao = time.perf_counter() - inicio
+        pico = tracemalloc.get_traced_memory()[1] if memoria else None
+        if memoria:
+            tracemalloc.stop()
+
+    estatisticas = dict(servidor.estatisticas)
+    return {
+        'cenario': nome,
+        'linhas': linhas,
+        'segundos': round(duracao, 3),
+        'linhas_por_segundo': round(linhas / duracao, 1) if duracao else None,
+        'requisicoes': estatisticas['requisicoes'],
+        'respostas_429': estatisticas['respostas_429'],
+        'pico_memoria_mb': round(pico / 2 ** 20, 2) if pico is not None else None,
+    }
+
+
+def executar(args):
+    servidor = iniciar_mock(
+        registros=args.registros, latencia=args.latencia,
+        taxa_429=args.taxa_429, taxa_falha=args.taxa_falha, semente=args.semente,
+    )
+    resultados = []
+    with tempfile.TemporaryDirectory() as diretorio:
+        configurar_ambiente(servidor.url_base, diretorio, args)
+        import duckdb
+        import leads
+        import reservas
+        import update_motherduck
+        import workflow
+
+        banco = os.environ['RESERVAS_CAMINHO']
+
+        def carga_completa():
+            update_motherduck.update_motherduck()
+            conn = duckdb.connect(banco, read_only=True)
+            try:
+                return sum(
+                    conn.execute(f"SELECT COUNT(*) FROM {config['tabela'].split('.')[-1]}").fetchone()[0]
+                    for config in update_motherduck.FONTES.values()
+                    if not config.get('somente_incremental')
+                )
+            finally:
+                conn.close()
+
+        funcoes = {
+            'reservas': lambda: len(reservas.obter_todos_dados()),
+            'workflow': lambda: len(workflow.obter_todos_dados()),
+            'leads': lambda: len(leads.obter_todos_dados()),
+            'update_motherduck': carga_completa,
+        }
+        for nome in args.cenarios:
+            print(f"\n=== {nome} ===")
+            resultados.append(medir(nome, funcoes[nome], servidor, memoria=not args.sem_memoria))
+
+    servidor.shutdown()
+    servidor.server_close()
+    return resultados
+
+
+def imprimir(resultados, anteriores=None):
+    anteriores = {r['cenario']: r for r in (anteriores or [])}
+    print(f"\n{'cenário':<20}{'linhas':>9}{'seg':>9}{'linhas/s':>11}{'req':>7}{'429':>6}{'pico MB':>10}")
+    for r in resultados:
+        pico = '-' if r['pico_memoria_mb'] is None else f"{r['pico_memoria_mb']:.2f}"
+        print(f"{r['cenario']:<20}{r['linhas']:>9}{r['segundos']:>9.2f}{r['linhas_por_segundo'] or 0:>11.1f}"
+              f"{r['requisicoes']:>7}{r['respostas_429']:>6}{pico:>10}")
+        antes = anteriores.get(r['cenario'])
+        if antes and antes.get('segundos'):
+            print(f"{'  vs. anterior':<20}{'':>9}{r['segundos'] / antes['segundos']:>8.2f}x"
+                  f"{'':>11}{r['requisicoes'] - antes['requisicoes']:>+7}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark da ingestão contra o mock do CVCRM")
+    parser.add_argument('--cenarios', nargs='+', choices=CENARIOS, default=CENARIOS)
+    parser.add_argument('--registros', type=int, default=20000, help="registros por endpoint no mock")
+    parser.add_argument('--latencia', type=float, default=0.05, help="latência simulada por resposta (s)")
+    parser.add_argument('--taxa-429', type=float, default=0.0)
+    parser.add_argument('--taxa-falha', type=float, default=0.0)
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--req-por-segundo', type=float, help="sobrescreve CVCRM_REQ_POR_SEGUNDO")
+    parser.add_argument('--concorrencia', type=int, help="sobrescreve CVCRM_CONCORRENCIA")
+    parser.add_argument('--sem-memoria', action='store_true',
+                        help="não mede memória (tracemalloc deixa a execução mais lenta)")
+    parser.add_argument('--saida', help="grava os resultados em JSON")
+    parser.add_argument('--comparar', help="JSON de uma execução anterior para comparar")
+    args = parser.parse_args()
+
+    anteriores = None
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            anteriores = json.load(f)['resultados']
+
+    resultados = executar(args)
+    imprimir(resultados, anteriores)
+
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            json.dump({'parametros': vars(args), 'resultados': resultados}, f, ensure_ascii=False, indent=2)
+        print(f"\nResultados gravados em {args.saida}")
@@ -0,0 +1,98 @@
+"""
+Cubo de agregados das reservas, materializado pela ingestão.
+
+Uma tabela pequena (reservas_cubo) com contagens, valores, reservas fora
+do prazo (e o valor delas) e dias na situação já somados por situação, empreendimento,
+imobiliária, dia e mês de cadastro (GROUPING SETS). As tabelas-resumo do
+dashboard saem dela em vez de agrupar a tabela inteira no pandas.
+
+O prazo vem da tabela situacao_sla (sla.py), que a ingestão completa com
+as situações novas antes do cubo; os dias na situação são contados no
+momento da ingestão.
+"""
+from sla import TABELA_SLA, com_sla, expressao_dias, expressao_fora_do_prazo
+
+TABELA_CUBO = 'reservas.main.reservas_cubo'
+
+# Conjunto mais detalhado: os demais podem ser somados a partir dele
+NIVEL_DETALHADO = 'dia_situacao_empreendimento_imobiliaria'
+
+_DIMENSOES = ['dia', 'mes', 'situacao', 'empreendimento', 'imobiliaria']
+
+
+def construir_cubo(conn, tabela, cubo=TABELA_CUBO, sla=TABELA_SLA):
+    """Recria o cubo a partir das reservas ativas da tabela"""
+    nivel = ', '.join(f"CASE WHEN grouping({d}) = 0 THEN '{d}' END" for d in _DIMENSOES)
+    conn.execute(f"""
+        CREATE OR REPLACE TABLE {cubo} AS
+        WITH base AS (
+            SELECT
+                CAST(data_cad AS DATE) AS dia,
+                CAST(date_trunc('month', data_cad) AS DATE) AS mes,
+                situacao,
+                empreendimento,
+                imobiliaria,
+                valor_contrato,
+                {expressao_dias()} AS dias,
+                coalesce(limite_dias, 0) AS limite
+            FROM {com_sla(tabela, sla)}
+            WHERE _excluido_em IS NULL
+        )
+        SELECT
+            concat_ws('_', {nivel}) AS nivel,
+            dia, mes, situacao, empreendimento, imobiliaria,
+            count(*) AS quantidade,
+            coalesce(sum(valor_contrato), 0) AS valor_total,
+            count(*) FILTER (WHERE {expressao_fora_do_prazo('limite', 'dias')}) AS fora_do_prazo,
+            coalesce(sum(valor_contrato) FILTER (WHERE {expressao_fora_do_prazo('limite', 'dias')}), 0)
+                AS valor_fora_do_prazo,
+            coalesce(sum(dias), 0) AS dias_na_situacao,
+            count(dias) AS com_dias,
+            current_localtimestamp() AS calculado_em
+        FROM base
+        GROUP BY GROUPING SETS (
+            (dia, situacao, empreendimento, imobiliaria),
+            (mes, situacao), (mes, empreendimento), (mes, imobiliaria),
+            (situacao), (empreendimento), (imobiliaria),
+            ()
+        )
+    """)
+    return conn.execute(f"SELECT COUNT(*) FROM {cubo}").fetchone()[0]
+
+
+def resumo(conn, dimensao, inicio, fim, empreendimento=None, situacao=None,
+           excluir_situacoes=(), imobiliaria=None, cubo=TABELA_CUBO):
+    """
+    Soma o nível detalhado do cubo por `dimensao` (uma ou uma lista delas)
+    para reservas cadastradas entre `inicio` e `fim`, com os mesmos filtros
+    da página. Devolve as métricas somadas e o tempo médio na situação.
+    """
+    dimensoes = [dimensao] if isinstance(dimensao, str) else list(dimensao)
+    for nome in dimensoes:
+        if nome not in _DIMENSOES:
+            raise ValueError(f"Dimensão inválida: {nome}")
+    condicoes = ["nivel = ?", "dia BETWEEN ? AND ?"]
+    parametros = [NIVEL_DETALHADO, inicio, fim]
+    for coluna, valor in (('empreendimento', empreendimento), ('situacao', situacao),
+                          ('imobiliaria', imobiliaria)):
+        if valor:
+            condicoes.append(f"{coluna} = ?")
+            parametros.append(valor)
+    if excluir_situacoes:
+        # NULL fica, como nos filtros do dashboard
+        condicoes.append(f"(situacao IS NULL OR situacao NOT IN ({', '.join('?' for _ in excluir_situacoes)}))")
+        parametros.extend(excluir_situacoes)
+
+    return conn.execute(f"""
+        SELECT
+            {', '.join(dimensoes)},
+            sum(quantidade)::BIGINT AS quantidade,
+            sum(valor_total) AS valor_total,
+            sum(fora_do_prazo)::BIGINT AS fora_do_prazo,
+            sum(valor_fora_do_prazo) AS valor_fora_do_prazo,
+            sum(dias_na_situacao) / nullif(sum(com_dias), 0) AS tempo_medio
+        FROM {cubo}
+        WHERE {' AND '.join(condicoes)}
+        GROUP BY {', '.join(dimensoes)}
+        ORDER BY quantidade DESC
+    """, parametros).df()
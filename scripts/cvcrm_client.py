@@ -0,0 +1,82 @@
+"""
+Cliente HTTP compartilhado para a API do CVCRM.
+
+Uma única sessão por processo, com pool de conexões e keep-alive (sem um
+novo handshake TCP+TLS por requisição), gzip, timeout padrão e retry de
+falhas de conexão. Usado pelos scripts de ingestão e pelo dashboard.
+"""
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+URL_BASE_PADRAO = 'https://prati.cvcrm.com.br'
+
+# (conexão, leitura) em segundos
+TIMEOUT_PADRAO = (10, 60)
+
+# Conexões mantidas abertas; deve cobrir a concorrência da ingestão
+TAMANHO_POOL = int(os.environ.get('CVCRM_POOL', '16'))
+
+_sessao = None
+_lock = threading.Lock()
+
+
+class _SessaoCVCRM(requests.Session):
+    """Sessão que aplica o timeout padrão quando a chamada não informa um"""
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', TIMEOUT_PADRAO)
+        return super().request(method, url, **kwargs)
+
+
+def criar_sessao(tamanho_pool=TAMANHO_POOL):
+    """Cria uma sessão com pool de conexões e retry de conexão"""
+    sessao = _SessaoCVCRM()
+    # Só falhas de conexão/leitura são repetidas aqui; respostas 429/5xx
+    # ficam com quem chama (o limitador da ingestão precisa enxergá-las).
+    retry = Retry(
+        total=3,
+        connect=3,
+        read=2,
+        status=0,
+        backoff_factor=0.5,
+        allowed_methods=frozenset({'GET'}),
+        raise_on_status=False,
+    )
+    adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=tamanho_pool, max_retries=retry)
+    sessao.mount('https://', adaptador)
+    sessao.mount('http://', adaptador)
+    sessao.headers.update({
+        "accept": "application/json",
+        "Accept-Encoding": "gzip, deflate",
+        "Connection": "keep-alive",
+    })
+    return sessao
+
+
+def get_sessao():
+    """Sessão compartilhada do processo (criada na primeira chamada)"""
+    global _sessao
+    if _sessao is None:
+        with _lock:
+            if _sessao is None:
+                _sessao = criar_sessao()
+    return _sessao
+
+
+def url_api(caminho):
+    """Monta a URL completa de um caminho da API (CVCRM_BASE_URL troca o servidor)"""
+    base = os.environ.get('CVCRM_BASE_URL', URL_BASE_PADRAO).rstrip('/')
+    return f"{base}/{caminho.lstrip('/')}"
+
+
+def cabecalhos(email, token):
+    """Cabeçalhos de autenticação do CVCRM"""
+    return {
+        "accept": "application/json",
+        "email": (email or '').strip(),
+        "token": (token or '').strip(),
+    }
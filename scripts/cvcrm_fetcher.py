@@ -0,0 +1,490 @@
+#!/usr/bin/env python3
+"""
+Busca paginada concorrente para os endpoints CVDW do CVCRM.
+
+As páginas são buscadas por um pool limitado de threads e todas as
+requisições passam por um limitador token-bucket compartilhado, que
+reduz a taxa quando a API responde 429 ou 5xx. Falhas transitórias
+(rede, timeout, resposta inválida) são repetidas com backoff exponencial.
+
+O número de requisições em andamento se ajusta durante a busca (AIMD: sobe
+um a um enquanto as respostas chegam dentro da latência alvo, cai pela
+metade a cada recuo). O tamanho de página não pode mudar no meio de uma
+busca paginada; proximo_tamanho_pagina() o ajusta de uma execução para a
+outra a partir do que a busca mediu.
+
+EndpointCVDW junta a busca e o filtro da janela de datas de uma fonte;
+reservas.py, workflow.py e leads.py só declaram o endpoint.
+"""
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from cvcrm_client import get_sessao
+from telemetria import registrar_requisicao
+from transformacoes import filtrar_janela
+
+# Configuração via variáveis de ambiente (ver update-database.yml)
+CONCORRENCIA_PADRAO = int(os.environ.get('CVCRM_CONCORRENCIA', '4'))
+REQUISICOES_POR_SEGUNDO = float(os.environ.get('CVCRM_REQ_POR_SEGUNDO', '2'))
+MAX_TENTATIVAS = int(os.environ.get('CVCRM_MAX_TENTATIVAS', '5'))
+BACKOFF_BASE = float(os.environ.get('CVCRM_BACKOFF_BASE', '2'))
+TIMEOUT = 60
+
+# Limites do ajuste automático (ver ControleConcorrencia e proximo_tamanho_pagina)
+CONCORRENCIA_MAXIMA = int(os.environ.get('CVCRM_CONCORRENCIA_MAX', str(max(CONCORRENCIA_PADRAO, 8))))
+LATENCIA_ALVO = float(os.environ.get('CVCRM_LATENCIA_ALVO', '5'))
+PAGINA_MINIMA = int(os.environ.get('CVCRM_PAGINA_MIN', '100'))
+# O CVDW não documenta o máximo por página: acima dele a primeira página
+# viria incompleta e encerraria a busca, então o padrão é o valor de sempre
+PAGINA_MAXIMA = int(os.environ.get('CVCRM_PAGINA_MAX', '500'))
+
+# Respostas que indicam sobrecarga da API e disparam o recuo do limitador
+STATUS_RECUO = {429, 500, 502, 503, 504}
+
+# O tamanho de página só diminui com sobrecarga sustentada: pelo menos
+# SINAIS_MINIMOS respostas lentas, 5xx ou timeouts, e mais de
+# LIMIAR_SOBRECARGA das últimas JANELA_AJUSTE respostas. Um 429 é limite
+# de taxa, não sobrecarga: páginas menores só gastariam mais requisições
+JANELA_AJUSTE = 20
+SINAIS_MINIMOS = 3
+LIMIAR_SOBRECARGA = 0.25
+
+
+class ErroPagina(Exception):
+    """Falha ao buscar uma página específica"""
+
+    def __init__(self, pagina, erro):
+        super().__init__(f"Página {pagina}: {erro}")
+        self.pagina = pagina
+        self.erro = erro
+
+
+class TokenBucket:
+    """Limitador de taxa token-bucket compartilhado entre as threads"""
+
+    def __init__(self, taxa=REQUISICOES_POR_SEGUNDO, capacidade=None):
+        self.taxa_maxima = taxa
+        self.taxa = taxa
+        self.capacidade = capacidade or max(1.0, taxa)
+        self.tokens = self.capacidade
+        self.ultimo = time.monotonic()
+        self.pausado_ate = 0.0
+        self._lock = threading.Lock()
+
+    def _repor(self, agora):
+        self.tokens = min(self.capacidade, self.tokens + (agora - self.ultimo) * self.taxa)
+        self.ultimo = agora
+
+    def adquirir(self):
+        """Bloqueia até haver um token disponível"""
+        while True:
+            with self._lock:
+                agora = time.monotonic()
+                self._repor(agora)
+                espera = self.pausado_ate - agora
+                if espera <= 0:
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    espera = (1 - self.tokens) / self.taxa
+            time.sleep(espera)
+
+    def recuar(self, pausa=None):
+        """Reduz a taxa pela metade e pausa todas as threads"""
+        with self._lock:
+            self.taxa = max(self.taxa_maxima / 16, self.taxa / 2)
+            if pausa is None:
+                pausa = 1.0 / self.taxa
+            self.pausado_ate = max(self.pausado_ate, time.monotonic() + pausa)
+            self.tokens = 0
+
+    def sucesso(self):
+        """Recupera a taxa aos poucos depois de respostas bem-sucedidas"""
+        with self._lock:
+            self.taxa = min(self.taxa_maxima, self.taxa * 1.1)
+
+
+class ControleConcorrencia:
+    """
+    Quantas requisições manter em andamento, ajustado pelas respostas:
+    +1 depois de `atual` respostas seguidas dentro da latência alvo, -1 a
+    cada resposta lenta e metade a cada 429/5xx. Guarda as medições usadas
+    para escolher o tamanho de página da próxima execução, com os sinais de
+    sobrecarga (respostas lentas, 5xx e timeouts) das últimas respostas.
+    """
+
+    def __init__(self, inicial=None, minimo=1, maximo=None, latencia_alvo=None):
+        self.maximo = max(maximo or CONCORRENCIA_MAXIMA, minimo)
+        self.minimo = minimo
+        self.atual = min(max(inicial or CONCORRENCIA_PADRAO, minimo), self.maximo)
+        self.latencia_alvo = latencia_alvo or LATENCIA_ALVO
+        self.respostas = 0
+        self.recuos = 0
+        self.latencia_total = 0.0
+        self._rapidas = 0
+        # True para cada resposta lenta, 5xx ou timeout; False para as demais
+        self._sinais = deque(maxlen=JANELA_AJUSTE)
+        self._lock = threading.Lock()
+
+    def sucesso(self, latencia):
+        with self._lock:
+            self.respostas += 1
+            self.latencia_total += latencia
+            self._sinais.append(latencia > self.latencia_alvo)
+            if latencia > self.latencia_alvo:
+                self.atual = max(self.minimo, self.atual - 1)
+                self._rapidas = 0
+                return
+            self._rapidas += 1
+            if self._rapidas >= self.atual:
+                self.atual = min(self.maximo, self.atual + 1)
+                self._rapidas = 0
+
+    def recuo(self, status=None):
+        """429 ou 5xx: metade das requisições; só o 5xx conta como sobrecarga"""
+        with self._lock:
+            self.recuos += 1
+            self.atual = max(self.minimo, self.atual // 2)
+            self._rapidas = 0
+            self._sinais.append(status != 429)
+
+    def timeout(self):
+        """Requisição que estourou o tempo: sinal de sobrecarga, a concorrência não muda"""
+        with self._lock:
+            self._sinais.append(True)
+
+    def latencia_media(self):
+        return self.latencia_total / self.respostas if self.respostas else None
+
+    def taxa_recuo(self):
+        total = self.respostas + self.recuos
+        return self.recuos / total if total else 0.0
+
+    def sobrecarga(self):
+        """(sinais de sobrecarga, respostas) na janela das últimas respostas"""
+        with self._lock:
+            return sum(self._sinais), len(self._sinais)
+
+    def sobrecarga_sustentada(self):
+        sinais, total = self.sobrecarga()
+        return sinais >= SINAIS_MINIMOS and sinais > LIMIAR_SOBRECARGA * total
+
+
+def proximo_tamanho_pagina(tamanho, controle, minimo=None, maximo=None):
+    """
+    Tamanho de página para a próxima execução: menor com sobrecarga
+    sustentada (respostas lentas, 5xx e timeouts, ver ControleConcorrencia),
+    maior se sobrou folga, sempre entre os limites e em múltiplos de 50.
+    429 não reduz a página.
+    """
+    minimo = minimo or PAGINA_MINIMA
+    maximo = maximo or PAGINA_MAXIMA
+    latencia = controle.latencia_media()
+    sinais, _ = controle.sobrecarga()
+    if latencia is None or controle.respostas + controle.recuos < 3:
+        # Poucas medições (uma sincronização pequena) não dizem nada
+        novo = tamanho
+    elif controle.sobrecarga_sustentada():
+        novo = tamanho / 2
+    elif not sinais and latencia < controle.latencia_alvo / 2:
+        novo = tamanho * 1.5
+    else:
+        novo = tamanho
+    return int(min(max(round(novo / 50) * 50, minimo), maximo))
+
+
+_limitador = None
+_lock_limitador = threading.Lock()
+
+
+def limitador_compartilhado():
+    """
+    Limitador único do processo: fontes extraídas em paralelo dividem a
+    mesma taxa e recuam juntas quando a API reclama.
+    """
+    global _limitador
+    if _limitador is None:
+        with _lock_limitador:
+            if _limitador is None:
+                _limitador = TokenBucket()
+    return _limitador
+
+
+def _retry_after(response):
+    """Lê o cabeçalho Retry-After (em segundos), se houver"""
+    try:
+        return float(response.headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+
+def _transitorio(erro):
+    """Erros que valem nova tentativa; respostas HTTP de erro são definitivas"""
+    if isinstance(erro, requests.HTTPError):
+        return False
+    return isinstance(erro, (requests.RequestException, ValueError))
+
+
+def buscar_resposta(url, headers, pagina, registros_por_pagina, limitador, filtros=None, controle=None):
+    """
+    Busca uma página e devolve a resposta inteira da API (dados e totais),
+    recuando o limitador em 429/5xx e repetindo falhas transitórias com
+    backoff exponencial até MAX_TENTATIVAS. O `controle`, se houver, recebe
+    a latência de cada resposta e cada recuo.
+    """
+    params = {
+        "pagina": pagina,
+        "registros_por_pagina": registros_por_pagina,
+        **(filtros or {})
+    }
+
+    for tentativa in range(1, MAX_TENTATIVAS + 1):
+        limitador.adquirir()
+        inicio = time.perf_counter()
+        response = None
+        try:
+            response = get_sessao().get(url, headers=headers, params=params, timeout=TIMEOUT)
+            latencia = time.perf_counter() - inicio
+            registrar_requisicao(url, pagina, response.status_code, latencia, len(response.content))
+            if response.status_code in STATUS_RECUO and tentativa < MAX_TENTATIVAS:
+                # O limitador pausa todas as threads; não precisa de backoff próprio
+                print(f"Página {pagina} - HTTP {response.status_code}, reduzindo a taxa (tentativa {tentativa})")
+                limitador.recuar(_retry_after(response))
+                if controle:
+                    controle.recuo(response.status_code)
+                continue
+            response.raise_for_status()
+            corpo = response.json()
+            corpo.get("dados")
+        except Exception as e:
+            if response is None:
+                registrar_requisicao(url, pagina, None, time.perf_counter() - inicio, 0)
+            if controle and isinstance(e, requests.Timeout):
+                controle.timeout()
+            if tentativa == MAX_TENTATIVAS or not _transitorio(e):
+                raise ErroPagina(pagina, e) from e
+            espera = BACKOFF_BASE * 2 ** (tentativa - 1) * random.uniform(0.5, 1.5)
+            print(f"Página {pagina} - {e} (tentativa {tentativa}), nova tentativa em {espera:.1f}s")
+            time.sleep(espera)
+            continue
+
+        limitador.sucesso()
+        if controle:
+            controle.sucesso(latencia)
+        return corpo
+
+
+def buscar_pagina(url, headers, pagina, registros_por_pagina, limitador, filtros=None, controle=None):
+    """Registros de uma página (ver buscar_resposta)"""
+    return buscar_resposta(url, headers, pagina, registros_por_pagina, limitador, filtros, controle).get("dados", [])
+
+
+def total_de_paginas(corpo):
+    """Total de páginas informado pela API na resposta, se houver"""
+    try:
+        return int(corpo.get("total_de_paginas"))
+    except (TypeError, ValueError):
+        return None
+
+
+def buscar_paginas(url, headers, pagina_inicial=1, registros_por_pagina=500,
+                   concorrencia=None, limitador=None, filtros=None,
+                   pular=None, pagina_final=None, controle=None):
+    """
+    Gera (pagina, dados) em ordem de página, mantendo em andamento as
+    requisições que o `controle` permitir (começando em `concorrencia`).
+    Para na primeira página incompleta.
+
+    A primeira página vai sozinha: o total_de_paginas da resposta limita as
+    seguintes, e nenhuma requisição sai para depois da última, mesmo que
+    ela venha cheia (registros que entrarem durante a busca ficam para a
+    próxima sincronização). Sem o total, o limite é a primeira página
+    incompleta já recebida.
+
+    `filtros` são parâmetros extras repassados à API em toda requisição.
+    `pular` são páginas já concluídas (checkpoint) que não são buscadas de
+    novo; `pagina_final`, se conhecida, é a última página a buscar.
+    """
+    controle = controle or ControleConcorrencia(concorrencia)
+    limitador = limitador or limitador_compartilhado()
+    pular = pular or set()
+    # Última página conhecida (None = ainda não se sabe); do total da API só
+    # vale o da primeira resposta
+    ultima = {'pagina': None, 'total_lido': False}
+    lock_ultima = threading.Lock()
+
+    def buscar(pagina):
+        corpo = buscar_resposta(url, headers, pagina, registros_por_pagina, limitador, filtros, controle)
+        dados = corpo.get("dados", [])
+        with lock_ultima:
+            if len(dados) < registros_por_pagina:
+                if ultima['pagina'] is None or pagina < ultima['pagina']:
+                    ultima['pagina'] = pagina
+            elif not ultima['total_lido'] and ultima['pagina'] is None:
+                total = total_de_paginas(corpo)
+                # Um total menor que a página que veio cheia não é confiável
+                if total is not None and total >= pagina:
+                    ultima['pagina'] = total
+            ultima['total_lido'] = True
+        return dados
+
+    def dentro(pagina):
+        if pagina_final is not None and pagina > pagina_final:
+            return False
+        return ultima['pagina'] is None or pagina <= ultima['pagina']
+
+    executor = ThreadPoolExecutor(max_workers=controle.maximo)
+    em_andamento = {}
+    proxima = pagina_inicial
+    atual = pagina_inicial
+    recebidas = 0
+    try:
+        while True:
+            # Até a primeira resposta, uma requisição só
+            limite = controle.atual if recebidas else 1
+            while len(em_andamento) < limite and dentro(proxima):
+                if proxima not in pular:
+                    em_andamento[proxima] = executor.submit(buscar, proxima)
+                proxima += 1
+
+            while atual in pular and dentro(atual):
+                atual += 1
+            if atual not in em_andamento:
+                break
+
+            dados = em_andamento.pop(atual).result()
+            recebidas += 1
+            yield atual, dados
+
+            if len(dados) < registros_por_pagina:
+                break
+            for pagina in [p for p in em_andamento if not dentro(p)]:
+                em_andamento.pop(pagina).cancel()
+            atual += 1
+    finally:
+        for futuro in em_andamento.values():
+            futuro.cancel()
+        executor.shutdown(wait=True)
+
+
+def localizar_primeira_pagina(url, headers, registros_por_pagina, limite,
+                              campo='referencia_data', dica=None, limitador=None):
+    """
+    Menor página com algum registro em que `campo` >= `limite`, supondo o
+    endpoint ordenado por `campo`. Busca exponencial a partir da `dica`
+    (página encontrada numa execução anterior) seguida de busca binária,
+    então uma dica ainda válida custa só duas requisições.
+
+    Retorna (pagina, requisicoes).
+    """
+    limitador = limitador or limitador_compartilhado()
+    requisicoes = 0
+
+    def anterior_ao_limite(pagina):
+        """Página cheia com todos os registros antes do limite"""
+        nonlocal requisicoes
+        requisicoes += 1
+        dados = buscar_pagina(url, headers, pagina, registros_por_pagina, limitador)
+        if len(dados) < registros_por_pagina:
+            return False
+        return max(str(item.get(campo) or '') for item in dados) < limite
+
+    # `antes` é sempre uma página inteira antes do limite (0 = nenhuma)
+    antes = 0
+    if dica and dica > 1 and anterior_ao_limite(dica - 1):
+        antes = dica - 1
+
+    passo = 1
+    depois = antes + passo
+    while anterior_ao_limite(depois):
+        antes = depois
+        passo *= 2
+        depois = antes + passo
+
+    while depois - antes > 1:
+        meio = (antes + depois) // 2
+        if anterior_ao_limite(meio):
+            antes = meio
+        else:
+            depois = meio
+
+    return depois, requisicoes
+
+
+class EndpointCVDW:
+    """
+    Um endpoint paginado do CVDW com a janela de datas da fonte: a busca,
+    o filtro e a coleta das páginas, iguais para reservas, workflow e
+    leads. Os módulos das fontes só informam URL, cabeçalhos e data de corte.
+    """
+
+    def __init__(self, nome, url, headers, data_corte, registros_por_pagina=500, localizar_inicio=False):
+        self.nome = nome
+        self.url = url
+        self.headers = headers
+        self.data_corte = data_corte
+        self.registros_por_pagina = registros_por_pagina
+        # Endpoint sem filtro de data na API: começa na primeira página da data de corte
+        self.localizar_inicio = localizar_inicio
+
+    def filtrar_por_data(self, dados, desde=None):
+        """Filtra dados a partir da data de corte (e, se informado, a partir de `desde`)"""
+        return filtrar_janela(dados, self.data_corte, desde)
+
+    def localizar_pagina_inicial(self, dica=None, registros_por_pagina=None):
+        """Primeira página com registros a partir da data de corte (`dica`: resultado anterior)"""
+        pagina, requisicoes = localizar_primeira_pagina(
+            self.url, self.headers, registros_por_pagina or self.registros_por_pagina,
+            self.data_corte.strftime("%Y-%m-%d"), dica=dica
+        )
+        print(f"Primeira página a partir de {self.data_corte:%d/%m/%Y}: {pagina} ({requisicoes} requisições)")
+        return pagina
+
+    def iterar_paginas(self, desde=None, pular=None, pagina_final=None, pagina_inicial=None,
+                       registros_por_pagina=None, controle=None):
+        """
+        Gera (pagina, dados_filtrados, dados) conforme as páginas chegam da API;
+        `dados` é a página como a API devolveu, antes do filtro de data.
+
+        Com `desde` (referencia_data no formato 'AAAA-MM-DD HH:MM:SS') busca
+        apenas os registros alterados a partir dessa data. `pular` e
+        `pagina_final` vêm do checkpoint de uma execução interrompida;
+        `controle` ajusta as requisições em andamento. Sem `pagina_inicial`,
+        começa na página 1 ou, se o endpoint pede, na primeira página da
+        data de corte, localizada na API.
+        """
+        registros_por_pagina = registros_por_pagina or self.registros_por_pagina
+        filtros = None
+        if desde:
+            # A API já devolve só os registros alterados, a partir da página 1
+            pagina_inicial = 1
+            filtros = {"a_partir_data_referencia": desde}
+        elif pagina_inicial is None:
+            pagina_inicial = (self.localizar_pagina_inicial(registros_por_pagina=registros_por_pagina)
+                              if self.localizar_inicio else 1)
+
+        for pagina, dados in buscar_paginas(self.url, self.headers, pagina_inicial, registros_por_pagina,
+                                            filtros=filtros, pular=pular, pagina_final=pagina_final,
+                                            controle=controle):
+            print(f"{self.nome} - Página {pagina} - {len(dados)} registros")
+            yield pagina, self.filtrar_por_data(dados, desde), dados
+
+    def obter_todos_dados(self, desde=None):
+        """
+        Busca todos os dados paginados da API. Uma página que falha de vez
+        interrompe a busca com ErroPagina, em vez de devolver dados parciais.
+        """
+        todos_dados = []
+        try:
+            for _, dados_filtrados, _ in self.iterar_paginas(desde):
+                todos_dados.extend(dados_filtrados)
+        except ErroPagina as e:
+            print(f"Erro na página {e.pagina}: {str(e.erro)} ({len(todos_dados)} registros obtidos até ela)")
+            raise
+        return todos_dados
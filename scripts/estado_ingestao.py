@@ -0,0 +1,65 @@
+"""
+Estado persistente da ingestão (watermarks e afins) guardado no próprio MotherDuck
+"""
+import json
+from datetime import datetime
+
+TABELA_ESTADO = "reservas.main.estado_ingestao"
+
+# Versão dos dados publicados: muda a cada ingestão que altera as tabelas e
+# é o que o dashboard usa como chave do cache (ver dashboard/data.py)
+CHAVE_VERSAO = "versao_dados"
+
+
+def garantir_tabela_estado(conn):
+    """Cria a tabela de estado se ela ainda não existir"""
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {TABELA_ESTADO} (
+            chave VARCHAR PRIMARY KEY,
+            valor VARCHAR,
+            atualizado_em TIMESTAMP
+        )
+    """)
+
+
+def ler_estado(conn, chave, padrao=None):
+    """Lê um valor do estado (desserializado de JSON)"""
+    garantir_tabela_estado(conn)
+    linha = conn.execute(
+        f"SELECT valor FROM {TABELA_ESTADO} WHERE chave = ?", [chave]
+    ).fetchone()
+    if linha is None or linha[0] is None:
+        return padrao
+    return json.loads(linha[0])
+
+
+def gravar_estado(conn, chave, valor):
+    """Grava um valor no estado (serializado em JSON)"""
+    garantir_tabela_estado(conn)
+    # DELETE + INSERT em vez de INSERT OR REPLACE: a tabela lida de Parquet
+    # (backend local) não tem a chave primária
+    conn.execute(f"DELETE FROM {TABELA_ESTADO} WHERE chave = ?", [chave])
+    conn.execute(
+        f"INSERT INTO {TABELA_ESTADO} VALUES (?, ?, current_timestamp)",
+        [chave, json.dumps(valor)]
+    )
+
+
+def chave_watermark(fonte):
+    return f"watermark:{fonte}"
+
+
+def chave_pagina_inicial(fonte):
+    return f"pagina_inicial:{fonte}"
+
+
+def chave_ajuste(fonte):
+    return f"ajuste:{fonte}"
+
+
+def publicar_versao(conn, modo):
+    """Registra uma nova versão dos dados; chamar uma vez, depois de publicar tudo"""
+    versao = f"{datetime.now():%Y%m%dT%H%M%S.%f}"
+    gravar_estado(conn, CHAVE_VERSAO, {'versao': versao, 'modo': modo})
+    print(f"- Versão dos dados publicada: {versao}")
+    return versao
@@ -0,0 +1,43 @@
+"""
+Consultas "na data" sobre o histórico das reservas (reservas_historico).
+
+A ingestão mantém no histórico uma linha por versão de cada reserva, com
+o intervalo em que ela valeu (valido_de, valido_ate; valido_ate nulo é a
+versão atual). Assim a situação de qualquer dia passado sai de uma única
+consulta, sem buscar a API de novo.
+"""
+TABELA_HISTORICO = 'reservas.main.reservas_historico'
+
+
+def consulta_em(historico=TABELA_HISTORICO):
+    """SELECT das versões vigentes num instante (parâmetro ?, repetido duas vezes)"""
+    return f"""
+        SELECT * EXCLUDE (_hash, valido_de, valido_ate)
+        FROM {historico}
+        WHERE valido_de <= ? AND (valido_ate IS NULL OR valido_ate > ?)
+    """
+
+
+def reservas_em(conn, instante, historico=TABELA_HISTORICO):
+    """DataFrame com as reservas como estavam em `instante` (date ou datetime)"""
+    return conn.execute(consulta_em(historico), [instante, instante]).df()
+
+
+def evolucao_situacoes(conn, inicio, fim, historico=TABELA_HISTORICO):
+    """
+    Quantidade de reservas em cada situação no fim de cada dia entre
+    `inicio` e `fim` (colunas dia, situacao, quantidade).
+    """
+    return conn.execute(f"""
+        WITH dias AS (
+            SELECT CAST(dia AS DATE) AS dia
+            FROM generate_series(CAST(? AS DATE), CAST(? AS DATE), INTERVAL 1 DAY) AS g(dia)
+        )
+        SELECT d.dia, h.situacao, count(*) AS quantidade
+        FROM dias d
+        JOIN {historico} h
+          ON h.valido_de <= d.dia + INTERVAL 1 DAY
+         AND (h.valido_ate IS NULL OR h.valido_ate > d.dia + INTERVAL 1 DAY)
+        GROUP BY ALL
+        ORDER BY d.dia, h.situacao
+    """, [inicio, fim]).df()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+import csv
+import os
+import sys
+from datetime import datetime
+from dotenv import load_dotenv
+
+from cvcrm_client import cabecalhos, url_api
+from cvcrm_fetcher import EndpointCVDW
+
+load_dotenv()
+
+try:
+    url = url_api("api/v1/cvdw/leads")
+    headers = cabecalhos(os.environ.get('CVCRM_EMAIL', ''), os.environ.get('CVCRM_TOKEN', ''))
+except Exception as e:
+    print("Erro ao configurar credenciais. Verifique as variáveis de ambiente.")
+    sys.exit(1)
+
+# Data de corte - 01/01/2024
+DATA_CORTE = datetime(2024, 1, 1)
+
+REGISTROS_POR_PAGINA = 500
+
+# Colunas dos relatórios de leads exportados do CVCRM (leads_report_*.csv)
+# e a coluna correspondente em cv_leads
+COLUNAS_CSV = {
+    'idlead': 'idlead',
+    'data_cad': 'data_cad',
+    'situacao_nome': 'situacao',
+    'imobiliaria': 'imobiliaria',
+    'nome_situacao_anterior_lead': 'nome_situacao_anterior_lead',
+    'gestor': 'gestor',
+    'empreendimento_ultimo': 'empreendimento_ultimo',
+}
+
+# Colunas de cv_leads lidas pelo dashboard que os relatórios não trazem
+COLUNAS_SOMENTE_API = ['referencia_data', 'corretor']
+
+endpoint = EndpointCVDW('leads', url, headers, DATA_CORTE, REGISTROS_POR_PAGINA)
+filtrar_por_data = endpoint.filtrar_por_data
+iterar_paginas = endpoint.iterar_paginas
+obter_todos_dados = endpoint.obter_todos_dados
+
+def consulta_csv(caminhos):
+    """
+    SELECT que lê os relatórios CSV direto pelo leitor colunar do DuckDB,
+    já com os nomes de coluna de cv_leads. Aceita caminhos ou globs.
+    """
+    if isinstance(caminhos, str):
+        caminhos = [caminhos]
+    arquivos = ', '.join("'" + caminho.replace("'", "''") + "'" for caminho in caminhos)
+    colunas = ', '.join(
+        [f'"{origem}" AS {destino}' for origem, destino in COLUNAS_CSV.items()]
+        + [f'NULL::VARCHAR AS {coluna}' for coluna in COLUNAS_SOMENTE_API]
+    )
+    return f"SELECT {colunas} FROM read_csv([{arquivos}], header = true, union_by_name = true)"
+
+def gerar_csv(dados, nome_arquivo='cv_leads.csv'):
+    """Gera arquivo CSV com os dados filtrados"""
+    if not dados:
+        print("Nenhum dado para exportar")
+        return
+
+    campos = list(dados[0].keys())
+
+    with open(nome_arquivo, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=campos)
+        writer.writeheader()
+        writer.writerows(dados)
+
+    print(f"Arquivo {nome_arquivo} gerado com {len(dados)} registros")
+
+if __name__ == "__main__":
+    print("Iniciando busca de leads a partir de 01/01/2024...")
+    dados = obter_todos_dados()
+    print(f"Total de registros encontrados: {len(dados)}")
+    if dados:
+        gerar_csv(dados)
+    else:
+        print("Nenhum registro encontrado após a data de corte")
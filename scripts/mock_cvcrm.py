@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Servidor local que imita os endpoints CVDW do CVCRM usados na ingestão.
+
+Serve páginas sintéticas e determinísticas (mesma semente, mesmos dados) de
+reservas, workflow/tempo e leads, ordenadas por referencia_data, com o filtro
+a_partir_data_referencia e os totais (total_de_registros, total_de_paginas)
+como a API devolve. Latência, respostas 429 e falhas podem ser
+injetadas para reproduzir o comportamento da API real.
+
+Uso:
+    python scripts/mock_cvcrm.py --porta 8765 --registros 20000 --taxa-429 0.05
+    CVCRM_BASE_URL=http://127.0.0.1:8765 python scripts/update_motherduck.py
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+CAMINHOS = {
+    '/api/v1/cvdw/reservas': 'reservas',
+    '/api/v1/cvdw/reservas/workflow/tempo': 'workflow',
+    '/api/v1/cvdw/leads': 'leads',
+}
+
+SITUACOES_LEAD = ['Aguardando Atendimento', 'Em Atendimento', 'Qualificação', 'Visita Realizada', 'Com Reserva']
+SITUACOES = [
+    'Reserva (7)', 'Crédito (CEF) (3)', 'Negociação (5)', 'Mútuo', 'Análise Diretoria',
+    'Contrato - Elaboração', 'Contrato - Assinatura', 'Vendida', 'Distrato', 'Cancelada',
+]
+EMPREENDIMENTOS = ['Residencial Aurora', 'Parque das Flores', 'Vila Prati', 'Jardim Europa']
+IMOBILIARIAS = ['PRATI EMPREENDIMENTOS', 'Imobiliária Central', 'Casa & Cia', 'Lar Imóveis']
+
+INICIO_DADOS = datetime(2023, 1, 1)
+FORMATO_DATA = "%Y-%m-%d %H:%M:%S"
+
+
+class ConfigMock:
+    """Parâmetros do servidor; podem ser alterados com ele rodando"""
+
+    def __init__(self, registros=20000, latencia=0.0, taxa_429=0.0, taxa_falha=0.0,
+                 paginas_falha=(), semente=42, totais=True):
+        self.registros = registros
+        self.latencia = latencia
+        self.taxa_429 = taxa_429
+        self.taxa_falha = taxa_falha
+        self.paginas_falha = set(paginas_falha)
+        self.semente = semente
+        # False: respostas sem total_de_registros/total_de_paginas
+        self.totais = totais
+
+
+def _data(indice, total):
+    """referencia_data crescente com o índice, de INICIO_DADOS até a meia-noite de hoje"""
+    periodo = (datetime.combine(date.today(), datetime.min.time()) - INICIO_DADOS).total_seconds()
+    return INICIO_DADOS + timedelta(seconds=periodo * indice / max(total, 1))
+
+
+def gerar_registro(fonte, indice, config):
+    """Registro sintético `indice` da fonte, sempre igual para a mesma semente"""
+    aleatorio = random.Random(f"{config.semente}:{fonte}:{indice}")
+    referencia_data = _data(indice, config.registros)
+    data_cad = referencia_data - timedelta(days=aleatorio.randint(0, 120))
+    situacao = aleatorio.choice(SITUACOES)
+
+    if fonte == 'workflow':
+        return {
+            'referencia': f"W{indice}",
+            'referencia_data': referencia_data.strftime(FORMATO_DATA),
+            'idreserva': indice // 3 + 1,
+            'situacao': situacao,
+            'data_entrada': data_cad.strftime(FORMATO_DATA),
+            'tempo': aleatorio.randint(0, 60),
+        }
+
+    if fonte == 'leads':
+        return {
+            'idlead': indice + 1,
+            'referencia': f"L{indice + 1}",
+            'referencia_data': referencia_data.strftime(FORMATO_DATA),
+            'data_cad': data_cad.strftime(FORMATO_DATA),
+            'situacao': aleatorio.choice(SITUACOES_LEAD),
+            'nome_situacao_anterior_lead': aleatorio.choice(SITUACOES_LEAD),
+            'imobiliaria': aleatorio.choice(IMOBILIARIAS),
+            'gestor': 'SDR (Comercial)',
+            'corretor': f"Corretor {aleatorio.randint(1, 20)}",
+            'empreendimento_ultimo': aleatorio.choice(EMPREENDIMENTOS),
+        }
+
+    valor = aleatorio.randint(150_000, 900_000) + aleatorio.randint(0, 99) / 100
+    valor_texto = f"R$ {valor:,.2f}".replace(',', '_').replace('.', ',').replace('_', '.')
+    return {
+        'idreserva': indice + 1,
+        'referencia': f"R{indice + 1}",
+        'referencia_data': referencia_data.strftime(FORMATO_DATA),
+        'data_cad': data_cad.strftime(FORMATO_DATA),
+        'data_ultima_alteracao_situacao': referencia_data.strftime(FORMATO_DATA),
+        'data_venda': referencia_data.strftime(FORMATO_DATA) if situacao == 'Vendida' else None,
+        'situacao': situacao,
+        'empreendimento': aleatorio.choice(EMPREENDIMENTOS),
+        'imobiliaria': aleatorio.choice(IMOBILIARIAS),
+        'cliente': f"Cliente {indice + 1}",
+        'valor_contrato': valor_texto,
+    }
+
+
+def primeiro_indice_desde(desde, total):
+    """Primeiro índice com referencia_data >= `desde` (datas crescem com o índice)"""
+    inicio, fim = 0, total
+    while inicio < fim:
+        meio = (inicio + fim) // 2
+        if _data(meio, total).strftime(FORMATO_DATA) < desde:
+            inicio = meio + 1
+        else:
+            fim = meio
+    return inicio
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        servidor = self.server
+        config = servidor.config
+        endereco = urlparse(self.path)
+        fonte = CAMINHOS.get(endereco.path.rstrip('/'))
+        servidor.contar('requisicoes')
+
+        if fonte is None:
+            return self._responder(404, {'erro': 'endpoint não simulado'})
+
+        params = parse_qs(endereco.query)
+        try:
+            pagina = int(params.get('pagina', ['1'])[0])
+            por_pagina = int(params.get('registros_por_pagina', ['500'])[0])
+        except ValueError:
+            return self._responder(400, {'erro': 'parâmetros inválidos'})
+
+        if config.latencia:
+            time.sleep(config.latencia)
+
+        sorteio = servidor.sortear()
+        if sorteio < config.taxa_429:
+            servidor.contar('respostas_429')
+            return self._responder(429, {'erro': 'limite de requisições'}, {'Retry-After': '0.2'})
+        if sorteio < config.taxa_429 + config.taxa_falha:
+            servidor.contar('falhas')
+            return self._responder(503, {'erro': 'indisponível'})
+        if pagina in config.paginas_falha:
+            servidor.contar('falhas')
+            return self._responder(400, {'erro': f'falha simulada na página {pagina}'})
+
+        inicio = 0
+        desde = params.get('a_partir_data_referencia', [None])[0]
+        if desde:
+            inicio = primeiro_indice_desde(desde, config.registros)
+        primeiro = inicio + (pagina - 1) * por_pagina
+        ultimo = min(primeiro + por_pagina, config.registros)
+        dados = [gerar_registro(fonte, i, config) for i in range(primeiro, ultimo)]
+
+        restantes = max(config.registros - inicio, 0)
+        servidor.contar('registros', len(dados))
+        corpo = {'pagina': pagina, 'registros': len(dados), 'dados': dados}
+        if config.totais:
+            corpo['total_de_registros'] = restantes
+            corpo['total_de_paginas'] = -(-restantes // por_pagina)
+        self._responder(200, corpo)
+
+    def _responder(self, status, corpo, cabecalhos=None):
+        conteudo = json.dumps(corpo, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(conteudo)))
+        for nome, valor in (cabecalhos or {}).items():
+            self.send_header(nome, valor)
+        self.end_headers()
+        self.wfile.write(conteudo)
+
+    def log_message(self, *args):
+        pass
+
+
+class ServidorMock(ThreadingHTTPServer):
+    """Servidor do mock, com contadores do que foi atendido"""
+
+    daemon_threads = True
+
+    def __init__(self, endereco, config):
+        super().__init__(endereco, _Handler)
+        self.config = config
+        self._lock = threading.Lock()
+        self._aleatorio = random.Random(config.semente)
+        self.zerar_estatisticas()
+
+    def sortear(self):
+        with self._lock:
+            return self._aleatorio.random()
+
+    def contar(self, contador, quantidade=1):
+        with self._lock:
+            self.estatisticas[contador] += quantidade
+
+    def zerar_estatisticas(self):
+        with self._lock:
+            self.estatisticas = {'requisicoes': 0, 'respostas_429': 0, 'falhas': 0, 'registros': 0}
+
+    @property
+    def url_base(self):
+        host, porta = self.server_address[:2]
+        return f"http://{host}:{porta}"
+
+
+def iniciar_mock(porta=0, **config):
+    """Sobe o mock numa thread em segundo plano (porta 0 = livre) e devolve o servidor"""
+    servidor = ServidorMock(('127.0.0.1', porta), ConfigMock(**config))
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock local dos endpoints CVDW do CVCRM")
+    parser.add_argument('--porta', type=int, default=8765)
+    parser.add_argument('--registros', type=int, default=20000, help="registros por endpoint")
+    parser.add_argument('--latencia', type=float, default=0.0, help="segundos por resposta")
+    parser.add_argument('--taxa-429', type=float, default=0.0, help="fração de respostas 429")
+    parser.add_argument('--taxa-falha', type=float, default=0.0, help="fração de respostas 503")
+    parser.add_argument('--paginas-falha', type=int, nargs='*', default=[],
+                        help="páginas que sempre respondem 400")
+    parser.add_argument('--semente', type=int, default=42)
+    args = parser.parse_args()
+
+    servidor = ServidorMock(('127.0.0.1', args.porta), ConfigMock(
+        registros=args.registros, latencia=args.latencia, taxa_429=args.taxa_429,
+        taxa_falha=args.taxa_falha, paginas_falha=args.paginas_falha, semente=args.semente,
+    ))
+    print(f"Mock do CVCRM em {servidor.url_base} ({args.registros} registros por endpoint)")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
@@ -1,21 +1,18 @@
 #!/usr/bin/env python3
 import os
 import sys
-import requests
-import time
 import csv
 from datetime import datetime
 from dotenv import load_dotenv
 
+from cvcrm_client import cabecalhos, url_api
+from cvcrm_fetcher import EndpointCVDW
+
 load_dotenv()
 
 try:
-    url = "https://prati.cvcrm.com.br/api/v1/cvdw/reservas"
-    headers = {
-        "accept": "application/json",
-        "email": os.environ.get('CVCRM_EMAIL', '').strip(),
-        "token": os.environ.get('CVCRM_TOKEN', '').strip(),
-    }
+    url = url_api("api/v1/cvdw/reservas")
+    headers = cabecalhos(os.environ.get('CVCRM_EMAIL', ''), os.environ.get('CVCRM_TOKEN', ''))
 
     # Debug removido por questões de segurança
     print("Credenciais configuradas com sucesso")
@@ -27,52 +24,12 @@ except Exception as e:
 # Data de corte - 01/01/2024
 DATA_CORTE = datetime(2024, 1, 1)
 
-def filtrar_por_data(dados):
-    """Filtra dados a partir de 01/01/2024"""
-    dados_filtrados = []
-    for item in dados:
-        try:
-            data_str = item.get('referencia_data', '').split()[0] 
-            data_item = datetime.strptime(data_str, "%Y-%m-%d")
-            if data_item >= DATA_CORTE:
-                dados_filtrados.append(item)
-        except (ValueError, AttributeError):
-            continue
-    return dados_filtrados
+REGISTROS_POR_PAGINA = 500
 
-def obter_todos_dados():
-    """Busca todos os dados paginados da API"""
-    pagina = 1
-    registros_por_pagina = 500
-    todos_dados = []
-    
-    while True:
-        try:
-            params = {
-                "pagina": pagina,
-                "registros_por_pagina": registros_por_pagina
-            }
-            
-            response = requests.get(url, headers=headers, params=params)
-            response.raise_for_status()
-            
-            dados = response.json().get("dados", [])
-            print(f"Página {pagina} - {len(dados)} registros")
-            
-            dados_filtrados = filtrar_por_data(dados)
-            todos_dados.extend(dados_filtrados)
-            
-            if len(dados) < registros_por_pagina:
-                break
-                
-            pagina += 1
-            time.sleep(3) 
-            
-        except Exception as e:
-            print(f"Erro na página {pagina}: {str(e)}")
-            break
-            
-    return todos_dados
+endpoint = EndpointCVDW('reservas', url, headers, DATA_CORTE, REGISTROS_POR_PAGINA)
+filtrar_por_data = endpoint.filtrar_por_data
+iterar_paginas = endpoint.iterar_paginas
+obter_todos_dados = endpoint.obter_todos_dados
 
 def gerar_csv(dados, nome_arquivo='reservas_abril.csv'):
     """Gera arquivo CSV com os dados filtrados"""
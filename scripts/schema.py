@@ -0,0 +1,63 @@
+"""
+Esquema declarado das tabelas publicadas no MotherDuck.
+
+A ingestão grava as colunas já com o tipo final (TIMESTAMP, DOUBLE,
+INTEGER), então o dashboard só lê, sem converter nada no pandas. Colunas
+que a API mandar e não estiverem aqui seguem com o tipo inferido do JSON,
+inclusive quando aparecem depois e são acrescentadas à tabela existente.
+"""
+import re
+
+# Tipo de cada coluna conhecida, por tabela (nome curto)
+ESQUEMAS = {
+    'reservas_abril': {
+        'idreserva': 'INTEGER',
+        'referencia_data': 'TIMESTAMP',
+        'data_cad': 'TIMESTAMP',
+        'data_venda': 'TIMESTAMP',
+        'data_ultima_alteracao_situacao': 'TIMESTAMP',
+        'valor_contrato': 'DOUBLE',
+    },
+    'workflow_abril': {
+        'idreserva': 'INTEGER',
+        'referencia_data': 'TIMESTAMP',
+    },
+    'cv_leads': {
+        'idlead': 'INTEGER',
+        'referencia_data': 'TIMESTAMP',
+        'data_cad': 'TIMESTAMP',
+    },
+}
+
+# Colunas de data não listadas acima (data_*, *_data) também viram TIMESTAMP
+PADRAO_DATA = re.compile(r'^data_|_data$', re.IGNORECASE)
+
+
+def tipos_declarados(tabela, colunas):
+    """Tipo declarado de cada uma das `colunas` presentes na tabela"""
+    esquema = ESQUEMAS.get(tabela.split('.')[-1], {})
+    tipos = {}
+    for coluna in colunas:
+        tipo = esquema.get(coluna.lower())
+        if tipo is None and PADRAO_DATA.search(coluna):
+            tipo = 'TIMESTAMP'
+        if tipo:
+            tipos[coluna] = tipo
+    return tipos
+
+
+def tipo_da_coluna(tabela, coluna, inferido):
+    """Tipo com que uma coluna nova é criada: o declarado ou, sem declaração, o inferido"""
+    return tipos_declarados(tabela, [coluna]).get(coluna, inferido)
+
+
+def consulta_tipada(tabela, consulta, colunas):
+    """
+    Envolve `consulta` convertendo as colunas declaradas com TRY_CAST:
+    um valor que não converte vira NULL em vez de derrubar a carga.
+    """
+    tipos = tipos_declarados(tabela, colunas)
+    if not tipos:
+        return consulta
+    conversoes = ', '.join(f'TRY_CAST("{c}" AS {t}) AS "{c}"' for c, t in tipos.items())
+    return f"SELECT * REPLACE ({conversoes}) FROM ({consulta})"
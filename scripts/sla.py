@@ -0,0 +1,113 @@
+"""
+Prazo (SLA) e etapa do funil das situações das reservas.
+
+A tabela situacao_sla tem uma linha por situação (as que aparecem nas
+reservas e as etapas do funil): etapa canônica, prazo em dias e posição
+no funil. É ela a fonte dos prazos: a ingestão só acrescenta as situações
+novas, sugerindo o número entre parênteses do nome como prazo (p.ex.
+'Reserva (7)'; sem número, sem prazo), e nunca mexe nas que já existem,
+então um prazo ou etapa editado na tabela vale dali em diante. Uma
+reserva está fora do prazo quando os dias desde a última mudança de
+situação chegam ao prazo.
+
+O cubo da ingestão (cubo.py) e as consultas do dashboard juntam as
+reservas com situacao_sla no SQL (com_sla), em vez de extrair o prazo do
+nome linha a linha.
+"""
+TABELA_SLA = 'reservas.main.situacao_sla'
+
+# Etapas do funil de vendas, na ordem
+ETAPAS_FUNIL = [
+    'Reserva (7)',
+    'Crédito (CEF) (3)',
+    'Negociação (5)',
+    'Mútuo',
+    'Análise Diretoria',
+    'Contrato - Elaboração',
+    'Contrato - Assinatura',
+    'Vendida',
+    'Distrato',
+]
+
+# Colunas calculadas por COLUNAS_SLA
+LIMITE = 'limite_dias'
+DIAS = 'dias_na_situacao'
+FORA_DO_PRAZO = 'fora_do_prazo'
+
+
+def expressao_etapa(situacao='situacao'):
+    """Etapa canônica do funil para as variações de nome de uma situação"""
+    return f"""CASE
+        WHEN {situacao} LIKE '%Análise%' AND ({situacao} LIKE '%Diretoria%' OR {situacao} LIKE '%proposta%')
+            THEN 'Análise Diretoria'
+        WHEN {situacao} LIKE '%Assinatura%' OR {situacao} LIKE '%Assinado%' THEN 'Contrato - Assinatura'
+        WHEN {situacao} LIKE '%Elaboração%' THEN 'Contrato - Elaboração'
+        WHEN {situacao} LIKE '%Crédito%' OR {situacao} LIKE '%CEF%' THEN 'Crédito (CEF) (3)'
+        WHEN {situacao} LIKE '%Reserva%' THEN 'Reserva (7)'
+        WHEN {situacao} LIKE '%Negociação%' THEN 'Negociação (5)'
+        WHEN {situacao} LIKE '%Mútuo%' OR {situacao} LIKE '%Mutuo%' THEN 'Mútuo'
+        ELSE {situacao}
+    END"""
+
+
+def expressao_limite(situacao='situacao'):
+    """Prazo em dias da situação (0 quando o nome não traz um número entre parênteses)"""
+    return f"coalesce(TRY_CAST(regexp_extract({situacao}, '\\((\\d+)\\)', 1) AS INTEGER), 0)"
+
+
+def expressao_dias(alteracao='data_ultima_alteracao_situacao'):
+    """Dias completos desde a última mudança de situação"""
+    return f"datediff('second', {alteracao}, current_localtimestamp()) // 86400"
+
+
+def expressao_fora_do_prazo(limite, dias):
+    """Verdadeiro se a situação tem prazo e ele venceu (falso sem data de alteração)"""
+    return f"coalesce({limite} > 0 AND {dias} >= {limite}, false)"
+
+
+def atualizar_situacao_sla(conn, tabela, destino=TABELA_SLA):
+    """
+    Cria situacao_sla se ainda não existe e acrescenta as situações da
+    tabela e as etapas do funil que faltam. Retorna quantas entraram.
+    """
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {destino} (
+            situacao VARCHAR PRIMARY KEY,
+            etapa VARCHAR,
+            limite_dias INTEGER,
+            ordem_funil INTEGER
+        )
+    """)
+    return conn.execute(f"""
+        INSERT INTO {destino}
+        WITH funil(ordem_funil, etapa) AS (
+            VALUES {', '.join('(?, ?)' for _ in ETAPAS_FUNIL)}
+        ),
+        situacoes AS (
+            SELECT situacao FROM {tabela} WHERE _excluido_em IS NULL AND situacao IS NOT NULL
+            UNION
+            SELECT etapa FROM funil
+        )
+        SELECT situacao, etapa, limite_dias, ordem_funil
+        FROM (
+            SELECT situacao, {expressao_etapa()} AS etapa, {expressao_limite()} AS limite_dias
+            FROM situacoes
+            WHERE situacao NOT IN (SELECT situacao FROM {destino})
+        )
+        LEFT JOIN funil USING (etapa)
+        ORDER BY ordem_funil NULLS LAST, situacao
+    """, [valor for ordem, etapa in enumerate(ETAPAS_FUNIL, start=1) for valor in (ordem, etapa)]).fetchone()[0]
+
+
+def com_sla(tabela, sla=TABELA_SLA):
+    """FROM com a tabela de reservas junta a situacao_sla (pela situação)"""
+    return f"{tabela} LEFT JOIN {sla} USING (situacao)"
+
+
+# Condição e colunas de SLA para consultas FROM com_sla(...)
+SQL_FORA_DO_PRAZO = expressao_fora_do_prazo(f'coalesce({LIMITE}, 0)', expressao_dias())
+COLUNAS_SLA = [
+    f"coalesce({LIMITE}, 0) AS {LIMITE}",
+    f"{expressao_dias()} AS {DIAS}",
+    f"{SQL_FORA_DO_PRAZO} AS {FORA_DO_PRAZO}",
+]
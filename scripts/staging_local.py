@@ -0,0 +1,209 @@
+"""
+Staging local em DuckDB para a ingestão.
+
+Cada página buscada da API é anexada direto num arquivo DuckDB em disco,
+então a memória fica limitada a uma página por vez, não importa quantas
+páginas o endpoint devolva. Os registros são guardados como JSON e só
+viram colunas na hora de publicar, com o tipo inferido sobre todas as
+páginas.
+
+O mesmo arquivo guarda o checkpoint de cada página concluída: uma execução
+interrompida pode ser retomada com os mesmos parâmetros sem buscar de novo
+o que já foi gravado. Guarda também as páginas brutas (como a API
+devolveu), copiadas para o arquivo Parquet por arquivar().
+"""
+import json
+import os
+from datetime import datetime, timedelta
+
+import duckdb
+
+DIRETORIO_STAGING = os.environ.get(
+    'INGESTAO_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '.ingestao')
+)
+
+# Checkpoints mais antigos que isto são descartados em vez de retomados
+VALIDADE_CHECKPOINT = timedelta(hours=float(os.environ.get('INGESTAO_VALIDADE_HORAS', '12')))
+
+# Tipos inferidos pelo DuckDB que trocamos por equivalentes mais comuns
+_TIPOS_JSON = {
+    '"UBIGINT"': '"BIGINT"',
+    '"NULL"': '"VARCHAR"',
+}
+
+
+class StagingLocal:
+    """Arquivo DuckDB local que recebe as páginas de uma fonte"""
+
+    def __init__(self, fonte, diretorio=None, transformacao=None):
+        diretorio = diretorio or DIRETORIO_STAGING
+        os.makedirs(diretorio, exist_ok=True)
+        self.fonte = fonte
+        # Expressão SQL sobre cada registro JSON `r`, avaliada para a página inteira
+        self.transformacao = transformacao or "r"
+        self.caminho = os.path.abspath(os.path.join(diretorio, f"{fonte}.duckdb"))
+        self.conn = duckdb.connect(self.caminho)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS registros (pagina INTEGER, registro JSON)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS brutos (pagina INTEGER, registro VARCHAR)")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS paginas (
+                pagina INTEGER PRIMARY KEY,
+                recebidos INTEGER,
+                gravados INTEGER,
+                concluida_em TIMESTAMP
+            )
+        """)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS execucao (parametros VARCHAR, iniciada_em TIMESTAMP)")
+        self._total = None
+        self._estrutura = None
+
+    def reiniciar(self):
+        """Descarta o que sobrou de uma execução anterior"""
+        for tabela in ('registros', 'brutos', 'paginas', 'execucao'):
+            self.conn.execute(f"DELETE FROM {tabela}")
+
+    def preparar(self, **parametros):
+        """
+        Retoma o checkpoint se ele foi gravado com os mesmos parâmetros e
+        ainda está dentro da validade; caso contrário começa do zero.
+        Retorna True quando há páginas aproveitadas.
+        """
+        chave = json.dumps(parametros, sort_keys=True, default=str)
+        anterior = self.conn.execute("SELECT parametros, iniciada_em FROM execucao").fetchone()
+        if anterior and anterior[0] == chave and datetime.now() - anterior[1] < VALIDADE_CHECKPOINT:
+            concluidas = len(self.paginas_concluidas())
+            if concluidas:
+                print(f"- Retomando {self.fonte}: {concluidas} páginas já concluídas")
+                return True
+
+        self.reiniciar()
+        self.conn.execute("INSERT INTO execucao VALUES (?, ?)", [chave, datetime.now()])
+        return False
+
+    def paginas_concluidas(self):
+        return {linha[0] for linha in self.conn.execute("SELECT pagina FROM paginas").fetchall()}
+
+    def ultima_pagina(self, registros_por_pagina):
+        """Página incompleta já gravada (fim dos dados), se houver"""
+        return self.conn.execute(
+            "SELECT min(pagina) FROM paginas WHERE recebidos < ?", [registros_por_pagina]
+        ).fetchone()[0]
+
+    def anexar(self, pagina, dados, recebidos=None, brutos=None):
+        """
+        Grava os registros de uma página e o checkpoint dela numa única
+        transação. `brutos`, se informado, é a página inteira como veio da
+        API, guardada para o arquivo bruto.
+        """
+        if recebidos is None:
+            recebidos = len(dados) if brutos is None else len(brutos)
+        self.conn.execute("BEGIN TRANSACTION")
+        try:
+            self.conn.execute("DELETE FROM registros WHERE pagina = ?", [pagina])
+            self.conn.execute("DELETE FROM brutos WHERE pagina = ?", [pagina])
+            if brutos:
+                self.conn.execute(
+                    "INSERT INTO brutos SELECT ?, r FROM unnest(?::VARCHAR[]) AS t(r)",
+                    [pagina, [json.dumps(item, ensure_ascii=False) for item in brutos]]
+                )
+            if dados:
+                # A página vai como um único parâmetro LIST, expandido e
+                # transformado pelo próprio DuckDB
+                self.conn.execute(
+                    f"INSERT INTO registros SELECT ?, {self.transformacao} FROM unnest(?::VARCHAR[]) AS t(r)",
+                    [pagina, [json.dumps(item, ensure_ascii=False) for item in dados]]
+                )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO paginas VALUES (?, ?, ?, ?)",
+                [pagina, recebidos, len(dados), datetime.now()]
+            )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def concluir(self):
+        """Limpa o staging depois de uma publicação bem-sucedida"""
+        self.fechar()
+        conn = duckdb.connect(self.caminho)
+        try:
+            for tabela in ('registros', 'brutos', 'paginas', 'execucao'):
+                conn.execute(f"DELETE FROM {tabela}")
+        finally:
+            conn.close()
+
+    def arquivar(self, destino, execucao):
+        """
+        Copia as páginas brutas para `destino` em Parquet (zstd), um
+        diretório mes=AAAA-MM por mês de referencia_data. Retorna quantos
+        registros foram copiados.
+        """
+        quantidade = self.conn.execute("SELECT COUNT(*) FROM brutos").fetchone()[0]
+        if not quantidade:
+            return 0
+        os.makedirs(destino, exist_ok=True)
+        destino = destino.replace("'", "''")
+        self.conn.execute(f"""
+            COPY (
+                SELECT
+                    coalesce(substr(json_extract_string(registro, '$.referencia_data'), 1, 7), 'sem_data') AS mes,
+                    ? AS execucao,
+                    current_localtimestamp() AS capturado_em,
+                    pagina,
+                    registro
+                FROM brutos
+            ) TO '{destino}' (
+                FORMAT parquet, COMPRESSION zstd, PARTITION_BY (mes),
+                FILENAME_PATTERN '{execucao}_{{i}}', OVERWRITE_OR_IGNORE
+            )
+        """, [execucao])
+        return quantidade
+
+    def total(self):
+        if self._total is not None:
+            return self._total
+        return self.conn.execute("SELECT COUNT(*) FROM registros").fetchone()[0]
+
+    def estrutura(self):
+        """Estrutura JSON comum a todos os registros, com os tipos inferidos"""
+        if self._estrutura is not None:
+            return self._estrutura
+        estrutura = self.conn.execute(
+            "SELECT json_group_structure(registro) FROM registros"
+        ).fetchone()[0]
+        if estrutura is None:
+            return None
+        for tipo, substituto in _TIPOS_JSON.items():
+            estrutura = estrutura.replace(tipo, substituto)
+        return estrutura
+
+    def colunas(self):
+        """Nomes das colunas que a consulta de publicação vai gerar"""
+        estrutura = self.estrutura()
+        return list(json.loads(estrutura)) if estrutura else []
+
+    def fechar(self):
+        """Fecha o arquivo, guardando o que a publicação precisa saber dele"""
+        if self.conn is None:
+            return
+        self._total = self.total()
+        self._estrutura = self.estrutura()
+        self.conn.close()
+        self.conn = None
+
+    def anexar_em(self, conn, alias):
+        """Fecha o arquivo e o anexa, somente leitura, à conexão de destino"""
+        self.fechar()
+        conn.execute(f"ATTACH '{self.caminho}' AS {alias} (READ_ONLY)")
+
+    def consulta(self, alias):
+        """
+        SELECT que expande os registros em colunas, para ser executado numa
+        conexão em que este arquivo foi anexado como `alias`.
+        """
+        estrutura = self.estrutura()
+        if estrutura is None:
+            raise ValueError(f"Staging de {self.fonte} está vazio")
+        estrutura = estrutura.replace("'", "''")
+        return f"SELECT unnest(json_transform(registro, '{estrutura}')) FROM {alias}.registros"
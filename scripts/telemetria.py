@@ -0,0 +1,227 @@
+"""
+Telemetria das execuções da ingestão.
+
+Cada execução (carga completa ou incremental) registra os eventos que
+interessam para saber onde o tempo vai: cada requisição à API (latência,
+bytes, status), cada página gravada no staging (registros recebidos e
+mantidos pelo filtro de data) e a duração das etapas de cada fonte
+(extração, transformação, carga). No fim, o resumo por fonte vai para a
+tabela ingestion_runs e todos os eventos para um arquivo JSON-lines, que
+o GitHub Actions guarda como artefato.
+
+Sem execução iniciada (scripts avulsos, benchmark), os registros são ignorados.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+TABELA_EXECUCOES = 'reservas.main.ingestion_runs'
+
+DIRETORIO_TELEMETRIA = os.environ.get(
+    'TELEMETRIA_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'telemetria')
+)
+
+# Etapas com coluna própria em ingestion_runs (duração somada por fonte)
+ETAPAS = ['localizar_inicio', 'extracao', 'transformacao', 'carga']
+
+
+class Execucao:
+    """Eventos de uma execução da ingestão, registrados por várias threads"""
+
+    def __init__(self, modo):
+        self.inicio = datetime.now()
+        self.id = f"{self.inicio:%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:6]}"
+        self.modo = modo
+        self.fim = None
+        self.erro = None
+        self.eventos = []
+        self._relogio = time.perf_counter()
+        self._fontes_por_url = {}
+        self._lock = threading.Lock()
+
+    def associar_url(self, url, fonte):
+        """As requisições a `url` contam para `fonte`"""
+        self._fontes_por_url[url] = fonte
+
+    def registrar(self, tipo, **campos):
+        evento = {'tipo': tipo, 't_s': round(time.perf_counter() - self._relogio, 4), **campos}
+        with self._lock:
+            self.eventos.append(evento)
+
+    def requisicao(self, url, pagina, status, latencia, tamanho):
+        self.registrar('requisicao', fonte=self._fontes_por_url.get(url), pagina=pagina,
+                       status=status, latencia_s=round(latencia, 4), bytes=tamanho)
+
+    @contextmanager
+    def etapa(self, fonte, nome):
+        """Mede a duração de uma etapa da fonte, mesmo que ela falhe"""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar('etapa', fonte=fonte, etapa=nome,
+                           duracao_s=round(time.perf_counter() - inicio, 4))
+
+    def falhar(self, erro):
+        self.erro = str(erro)
+
+    def resumo(self):
+        """Uma linha por fonte com as contagens e durações somadas"""
+        fontes = {}
+        for evento in self.eventos:
+            fonte = evento.get('fonte')
+            if fonte is None:
+                continue
+            linha = fontes.setdefault(fonte, {
+                'paginas': 0, 'requisicoes': 0, 'respostas_429': 0, 'bytes': 0,
+                'registros_recebidos': 0, 'registros_mantidos': 0, 'latencias': [],
+                **{f"{etapa}_s": 0.0 for etapa in ETAPAS},
+            })
+            if evento['tipo'] == 'requisicao':
+                linha['requisicoes'] += 1
+                linha['respostas_429'] += evento['status'] == 429
+                linha['bytes'] += evento['bytes'] or 0
+                linha['latencias'].append(evento['latencia_s'])
+            elif evento['tipo'] == 'pagina':
+                linha['paginas'] += 1
+                linha['registros_recebidos'] += evento['recebidos']
+                linha['registros_mantidos'] += evento['mantidos']
+            elif evento['tipo'] == 'etapa' and evento['etapa'] in ETAPAS:
+                linha[f"{evento['etapa']}_s"] += evento['duracao_s']
+
+        for linha in fontes.values():
+            latencias = sorted(linha.pop('latencias'))
+            linha['latencia_media_s'] = sum(latencias) / len(latencias) if latencias else None
+            linha['latencia_p95_s'] = latencias[int(0.95 * (len(latencias) - 1))] if latencias else None
+            linha['latencia_max_s'] = latencias[-1] if latencias else None
+        return fontes
+
+    def cabecalho(self):
+        return {
+            'execucao_id': self.id,
+            'modo': self.modo,
+            'iniciada_em': self.inicio.isoformat(sep=' '),
+            'concluida_em': self.fim.isoformat(sep=' ') if self.fim else None,
+            'status': 'erro' if self.erro else 'sucesso',
+            'erro': self.erro,
+        }
+
+    def relatorio(self):
+        """Tabela de tempos por fonte e etapa para o log da execução"""
+        linhas = [f"Telemetria {self.id} ({self.modo}):"]
+        for fonte, resumo in self.resumo().items():
+            etapas = ', '.join(f"{etapa} {resumo[f'{etapa}_s']:.1f}s" for etapa in ETAPAS if resumo[f'{etapa}_s'])
+            latencia = f"{resumo['latencia_media_s']:.2f}s" if resumo['latencia_media_s'] is not None else '-'
+            linhas.append(
+                f"- {fonte}: {resumo['requisicoes']} requisições (latência média {latencia}, "
+                f"{resumo['respostas_429']} x 429, {resumo['bytes'] / 1e6:.1f} MB), "
+                f"{resumo['registros_mantidos']}/{resumo['registros_recebidos']} registros mantidos; {etapas}"
+            )
+        return '\n'.join(linhas)
+
+    def gravar_jsonl(self, diretorio=None):
+        """Grava cabeçalho, resumo por fonte e eventos em <diretorio>/<id>.jsonl"""
+        diretorio = diretorio or DIRETORIO_TELEMETRIA
+        os.makedirs(diretorio, exist_ok=True)
+        caminho = os.path.join(diretorio, f"{self.id}.jsonl")
+        with open(caminho, 'w', encoding='utf-8') as arquivo:
+            arquivo.write(json.dumps({'tipo': 'execucao', **self.cabecalho()}) + '\n')
+            for fonte, resumo in self.resumo().items():
+                arquivo.write(json.dumps({'tipo': 'resumo', 'fonte': fonte, **resumo}) + '\n')
+            for evento in self.eventos:
+                arquivo.write(json.dumps(evento) + '\n')
+        return caminho
+
+    def gravar_tabela(self, conn, tabela=TABELA_EXECUCOES):
+        """Acrescenta uma linha por fonte (ou uma só, sem fontes) em ingestion_runs"""
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {tabela} (
+                execucao_id VARCHAR,
+                modo VARCHAR,
+                iniciada_em TIMESTAMP,
+                concluida_em TIMESTAMP,
+                status VARCHAR,
+                erro VARCHAR,
+                fonte VARCHAR,
+                paginas INTEGER,
+                requisicoes INTEGER,
+                respostas_429 INTEGER,
+                bytes BIGINT,
+                registros_recebidos BIGINT,
+                registros_mantidos BIGINT,
+                latencia_media_s DOUBLE,
+                latencia_p95_s DOUBLE,
+                latencia_max_s DOUBLE,
+                {', '.join(f'{etapa}_s DOUBLE' for etapa in ETAPAS)}
+            )
+        """)
+        cabecalho = self.cabecalho()
+        linhas = [{**cabecalho, 'fonte': fonte, **resumo} for fonte, resumo in self.resumo().items()]
+        linhas = linhas or [{**cabecalho, 'fonte': None}]
+        colunas = list(cabecalho) + ['fonte'] + [
+            'paginas', 'requisicoes', 'respostas_429', 'bytes', 'registros_recebidos', 'registros_mantidos',
+            'latencia_media_s', 'latencia_p95_s', 'latencia_max_s', *(f'{etapa}_s' for etapa in ETAPAS),
+        ]
+        conn.executemany(
+            f"INSERT INTO {tabela} ({', '.join(colunas)}) VALUES ({', '.join('?' for _ in colunas)})",
+            [[linha.get(coluna) for coluna in colunas] for linha in linhas]
+        )
+
+
+_atual = None
+
+
+def iniciar_execucao(modo):
+    """Começa a registrar uma execução; os registros do processo vão para ela"""
+    global _atual
+    _atual = Execucao(modo)
+    return _atual
+
+
+def execucao_atual():
+    return _atual
+
+
+def registrar_requisicao(url, pagina, status, latencia, tamanho):
+    if _atual is not None:
+        _atual.requisicao(url, pagina, status, latencia, tamanho)
+
+
+def registrar_pagina(fonte, pagina, recebidos, mantidos, duracao):
+    if _atual is not None:
+        _atual.registrar('pagina', fonte=fonte, pagina=pagina, recebidos=recebidos,
+                         mantidos=mantidos, staging_s=round(duracao, 4))
+
+
+def etapa(fonte, nome):
+    """Contexto que mede a etapa na execução atual (ou não faz nada)"""
+    return _atual.etapa(fonte, nome) if _atual is not None else nullcontext()
+
+
+def encerrar_execucao(conn):
+    """
+    Grava a execução atual na tabela (se houver conexão) e no JSON-lines.
+    Uma falha aqui é só avisada: a telemetria não derruba a ingestão.
+    """
+    global _atual
+    execucao, _atual = _atual, None
+    if execucao is None:
+        return None
+    execucao.fim = datetime.now()
+    print(f"\n{execucao.relatorio()}")
+    try:
+        caminho = execucao.gravar_jsonl()
+        print(f"- Eventos gravados em {caminho}")
+    except Exception as e:
+        print(f"- Não foi possível gravar a telemetria em arquivo: {e}")
+    if conn is not None:
+        try:
+            execucao.gravar_tabela(conn)
+        except Exception as e:
+            print(f"- Não foi possível gravar a telemetria em {TABELA_EXECUCOES}: {e}")
+    return execucao
@@ -0,0 +1,56 @@
+"""
+Transformações da ingestão, aplicadas por página (lote) de forma vetorizada.
+
+O filtro de janela usa operações de coluna do pandas sobre a página inteira;
+a limpeza de valores é uma expressão SQL que o DuckDB avalia sobre todos os
+registros da página ao gravá-la no staging (ver StagingLocal.anexar).
+"""
+from itertools import compress
+
+import pandas as pd
+
+
+def mascara_janela(dados, data_corte, desde=None):
+    """Máscara booleana: referencia_data >= data_corte (e >= `desde`, se informado)"""
+    referencias = pd.Series([item.get('referencia_data') for item in dados], dtype=object).astype('string')
+    datas = pd.to_datetime(referencias.str.slice(0, 10), format="%Y-%m-%d", errors='coerce')
+    mascara = datas >= pd.Timestamp(data_corte)
+    if desde:
+        mascara &= (referencias >= desde).fillna(False).astype(bool)
+    return mascara.to_numpy()
+
+
+def filtrar_janela(dados, data_corte, desde=None):
+    """Mantém da página só os registros dentro da janela; datas inválidas são descartadas"""
+    if not dados:
+        return []
+    return list(compress(dados, mascara_janela(dados, data_corte, desde)))
+
+
+def sql_moeda(campo):
+    """
+    Expressão DuckDB que converte o campo do registro JSON `r` para DOUBLE:
+    textos no formato 'R$ 1.234,56' são limpos, números passam direto.
+    """
+    caminho = f"'$.{campo}'"
+    return f"""CASE WHEN json_type(r, {caminho}) = 'VARCHAR'
+        THEN TRY_CAST(trim(replace(replace(replace(r->>{caminho}, 'R$', ''), '.', ''), ',', '.')) AS DOUBLE)
+        ELSE TRY_CAST(r->>{caminho} AS DOUBLE) END"""
+
+
+def sql_substituir(campo, expressao):
+    """
+    Reescreve um campo do registro JSON `r` com o resultado de `expressao`.
+    O objeto é remontado chave a chave (json_group_object) em vez de usar
+    json_merge_patch, que apagaria a chave num resultado nulo: o null fica
+    no registro, e o tipo da coluna não passa a sair só das outras páginas.
+    """
+    return f"""CASE WHEN NOT json_exists(r, '$.{campo}') THEN r
+        ELSE (SELECT json_group_object(k, CASE WHEN k = '{campo}' THEN to_json({expressao}) ELSE r->k END)
+              FROM unnest(json_keys(r)) AS t(k)) END"""
+
+
+# Expressão aplicada a cada registro `r` de uma página ao gravá-la no staging
+TRANSFORMACOES = {
+    'reservas': sql_substituir('valor_contrato', sql_moeda('valor_contrato')),
+}
@@ -1,11 +1,56 @@
 import os
-import pandas as pd
+import time
+import argparse
 import duckdb
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from dotenv import load_dotenv
 
+import arquivo_bruto
+from backend import configuracao, conectar, fechar
+from cubo import TABELA_CUBO, construir_cubo
+from cvcrm_fetcher import PAGINA_MAXIMA, PAGINA_MINIMA, ControleConcorrencia, ErroPagina, proximo_tamanho_pagina
+from estado_ingestao import (
+    chave_ajuste, chave_pagina_inicial, chave_watermark, gravar_estado, ler_estado, publicar_versao
+)
+from historico import TABELA_HISTORICO
+from schema import consulta_tipada, tipo_da_coluna, tipos_declarados
+from sla import TABELA_SLA, atualizar_situacao_sla
+from staging_local import StagingLocal
+from telemetria import encerrar_execucao, etapa, execucao_atual, iniciar_execucao, registrar_pagina
+from transformacoes import TRANSFORMACOES
+
+# Fontes sincronizadas: tabela de destino e chave usada no upsert incremental.
+# O workflow/tempo tem várias linhas por reserva; no CVDW cada registro é
+# identificado por `referencia`. Com `localizar_inicio`, a carga completa
+# começa na primeira página da data de corte em vez da página 1. Fontes
+# `somente_incremental` ficam fora da carga completa: só recebem upserts
+# (a primeira sincronização, sem watermark, busca tudo). Com `historico`,
+# cada versão das linhas fica registrada com o período em que valeu; com
+# `cubo`, os agregados do dashboard são recalculados a cada execução (e,
+# antes deles, a tabela de prazos `sla` de que o cubo depende).
+FONTES = {
+    'reservas': {
+        'tabela': 'reservas.main.reservas_abril', 'chave': ['idreserva'],
+        'historico': TABELA_HISTORICO, 'cubo': TABELA_CUBO, 'sla': TABELA_SLA,
+    },
+    'workflow': {'tabela': 'reservas.main.workflow_abril', 'chave': ['referencia'], 'localizar_inicio': True},
+    'leads': {'tabela': 'reservas.main.cv_leads', 'chave': ['idlead'], 'somente_incremental': True},
+}
+
+# Colunas de controle da mesclagem por hash, presentes em todas as tabelas publicadas
+COLUNAS_CONTROLE = {'_hash': 'VARCHAR', '_excluido_em': 'TIMESTAMP'}
+
+# Uma carga completa com menos que esta fração das linhas atuais não é publicada
+PROPORCAO_MINIMA_STAGING = float(os.environ.get('PROPORCAO_MINIMA_STAGING', '0.5'))
+
 def get_motherduck_connection():
-    """Create a connection to MotherDuck"""
+    """Create a connection to MotherDuck (ou ao backend local de RESERVAS_BACKEND)"""
+    backend, caminho = configuracao()
+    if backend != 'motherduck':
+        print(f"Usando o backend local {backend}: {caminho}")
+        return conectar(backend, caminho)
+
     token = os.environ.get('MOTHERDUCK_TOKEN', '').strip()
     # Debug removido por questões de segurança
     print("Verificando configuração do MotherDuck...")
@@ -34,113 +79,788 @@ def get_motherduck_connection():
         print(f"- Erro original: {str(e)}")
         print("- Verifique se o token está correto")
         raise
-    
+
+def ler_ajuste(conn, fonte, modulo):
+    """
+    Tamanho de página e controle de concorrência da fonte, partindo do que
+    a execução anterior mediu (estado `ajuste:<fonte>`).
+    """
+    anterior = ler_estado(conn, chave_ajuste(fonte), {})
+    registros_por_pagina = anterior.get('registros_por_pagina', modulo.REGISTROS_POR_PAGINA)
+    registros_por_pagina = min(max(registros_por_pagina, PAGINA_MINIMA), PAGINA_MAXIMA)
+    return registros_por_pagina, ControleConcorrencia(anterior.get('concorrencia'))
+
+def gravar_ajuste(conn, fonte, registros_por_pagina, controle):
+    """Guarda o tamanho de página e a concorrência para a próxima execução"""
+    proximo = proximo_tamanho_pagina(registros_por_pagina, controle)
+    latencia = controle.latencia_media()
+    gravar_estado(conn, chave_ajuste(fonte), {
+        'registros_por_pagina': proximo,
+        'concorrencia': controle.atual,
+        'latencia_media': round(latencia, 3) if latencia is not None else None,
+        'taxa_recuo': round(controle.taxa_recuo(), 3),
+        'sobrecarga': list(controle.sobrecarga()),
+    })
+    print(f"- Ajuste de {fonte}: {registros_por_pagina} -> {proximo} registros por página, "
+          f"{controle.atual} requisições em andamento")
+
+def localizar_pagina_inicial(conn, fonte, modulo, registros_por_pagina):
+    """
+    Primeira página da data de corte, partindo da encontrada na execução
+    anterior (guardada no estado) para gastar o mínimo de requisições.
+    """
+    chave = chave_pagina_inicial(fonte)
+    parametros = {
+        'registros_por_pagina': registros_por_pagina,
+        'data_corte': modulo.DATA_CORTE.strftime("%Y-%m-%d"),
+    }
+    anterior = ler_estado(conn, chave, {})
+    dica = anterior.get('pagina') if all(anterior.get(k) == v for k, v in parametros.items()) else None
+    pagina = modulo.localizar_pagina_inicial(dica, registros_por_pagina)
+    gravar_estado(conn, chave, {'pagina': pagina, **parametros})
+    return pagina
+
+def extrair_para_staging(fonte, modulo, desde=None, pagina_inicial=1, registros_por_pagina=None, controle=None):
+    """
+    Busca as páginas de uma fonte gravando cada uma no staging local assim
+    que chega. Retoma o checkpoint de uma execução interrompida e, se uma
+    página falhar de vez, interrompe a carga em vez de seguir com dados parciais.
+    Extraída a fonte, as páginas brutas vão para o arquivo Parquet.
+    """
+    registros_por_pagina = registros_por_pagina or modulo.REGISTROS_POR_PAGINA
+    staging = StagingLocal(fonte, transformacao=TRANSFORMACOES.get(fonte))
+    staging.preparar(desde=desde, registros_por_pagina=registros_por_pagina,
+                     pagina_inicial=pagina_inicial)
+    pular = staging.paginas_concluidas()
+    pagina_final = staging.ultima_pagina(registros_por_pagina)
+    try:
+        for pagina, dados, brutos in modulo.iterar_paginas(desde, pular, pagina_final, pagina_inicial,
+                                                           registros_por_pagina, controle):
+            inicio = time.perf_counter()
+            staging.anexar(pagina, dados, len(brutos), brutos if arquivo_bruto.ARQUIVAR else None)
+            registrar_pagina(fonte, pagina, len(brutos), len(dados), time.perf_counter() - inicio)
+        if arquivo_bruto.ARQUIVAR:
+            arquivar_paginas(fonte, staging)
+    except ErroPagina as e:
+        raise RuntimeError(
+            f"Falha definitiva na página {e.pagina} de {fonte}: {e.erro}. "
+            "As páginas concluídas ficam no checkpoint; execute novamente para retomar."
+        ) from e
+    finally:
+        staging.fechar()
+
+    print(f"- {staging.total()} registros de {fonte} no staging local")
+    return staging
+
+def arquivar_paginas(fonte, staging):
+    """Copia as páginas brutas do staging para o arquivo; uma falha aqui só é avisada"""
+    execucao = execucao_atual()
+    rotulo = execucao.id if execucao else datetime.now().strftime('%Y%m%dT%H%M%S')
     try:
-        return duckdb.connect(connection_string)
+        quantidade = staging.arquivar(arquivo_bruto.destino(fonte), rotulo)
+        print(f"- {quantidade} registros brutos de {fonte} arquivados")
     except Exception as e:
-        print(f"\nErro na conexão com MotherDuck:")
-        print(f"- Erro original: {str(e)}")
-        print("- Verifique se o token está correto no arquivo .env")
-        print("- Certifique-se que o token não tem espaços extras ou caracteres inválidos")
+        print(f"- Não foi possível arquivar as páginas brutas de {fonte}: {e}")
+
+def publicar_arquivo(conn):
+    """Leva as páginas brutas arquivadas no disco para a tabela do banco; uma falha aqui só é avisada"""
+    if not arquivo_bruto.ARQUIVAR:
+        return
+    try:
+        quantidade = arquivo_bruto.publicar(conn)
+        if quantidade:
+            print(f"- {quantidade} registros brutos publicados em {_nome_curto(arquivo_bruto.TABELA_ARQUIVO)}")
+    except Exception as e:
+        print(f"- Não foi possível publicar o arquivo bruto (fica no disco para a próxima execução): {e}")
+
+def extrair_fontes(tarefas):
+    """
+    Extrai as fontes em paralelo, uma thread por fonte, e espera todas.
+    `tarefas` mapeia cada fonte para (modulo, argumentos de extrair_para_staging).
+    A falha de uma fonte não interrompe as outras, que ficam no checkpoint.
+
+    Retorna (stagings, falhas), ambos por fonte.
+    """
+    def extrair(fonte, modulo, argumentos):
+        inicio = time.perf_counter()
+        try:
+            with etapa(fonte, 'extracao'):
+                return extrair_para_staging(fonte, modulo, **argumentos)
+        finally:
+            print(f"- Extração de {fonte}: {time.perf_counter() - inicio:.1f}s")
+
+    with ThreadPoolExecutor(max_workers=len(tarefas) or 1) as executor:
+        futuros = {
+            fonte: executor.submit(extrair, fonte, modulo, argumentos)
+            for fonte, (modulo, argumentos) in tarefas.items()
+        }
+
+    stagings, falhas = {}, {}
+    for fonte, futuro in futuros.items():
+        try:
+            stagings[fonte] = futuro.result()
+        except Exception as e:
+            print(f"- Falha na extração de {fonte}: {e}")
+            falhas[fonte] = e
+    return stagings, falhas
+
+def maior_referencia_data(conn, relacao):
+    """Maior referencia_data do lote, usada como watermark da próxima execução"""
+    return conn.execute(
+        f"SELECT max(CAST(referencia_data AS VARCHAR)) FROM {relacao}"
+    ).fetchone()[0]
+
+def colunas_de(conn, relacao):
+    return [linha[0] for linha in conn.execute(f"DESCRIBE {relacao}").fetchall()]
+
+def consulta_com_hash(consulta, colunas):
+    """
+    Acrescenta à consulta o hash do conteúdo de cada linha (_hash) e a
+    coluna de exclusão lógica (_excluido_em). As colunas entram no hash em
+    ordem alfabética, então a ordem em que a API as manda não importa.
+    """
+    campos = ', '.join(f'"{c}" := "{c}"' for c in sorted(c for c in colunas if c not in COLUNAS_CONTROLE))
+    return (
+        f"SELECT *, md5(to_json(struct_pack({campos}))) AS _hash, "
+        f"NULL::TIMESTAMP AS _excluido_em FROM ({consulta})"
+    )
+
+def ultima_versao(consulta, chave):
+    """
+    Uma linha por chave, a de maior referencia_data: a API pode repetir um
+    registro que muda de página enquanto as páginas são buscadas.
+    """
+    return (
+        f"SELECT * FROM ({consulta}) "
+        f"QUALIFY row_number() OVER (PARTITION BY {', '.join(chave)} ORDER BY referencia_data DESC) = 1"
+    )
+
+def evoluir_esquema(conn, tabela, origem):
+    """
+    Compara as colunas da origem com as da tabela e acrescenta as que
+    faltam (ALTER TABLE ADD COLUMN), com o tipo do registro em schema.py ou
+    o inferido. Tabelas anteriores às colunas de controle ganham as duas aqui.
+
+    Retorna o tipo na tabela de cada coluna (nome em minúsculas).
+    """
+    tipos = {nome.lower(): tipo for nome, tipo, *_ in conn.execute(f"DESCRIBE {tabela}").fetchall()}
+    novas = []
+    for nome, inferido, *_ in conn.execute(f"DESCRIBE {origem}").fetchall():
+        if nome.lower() in tipos:
+            continue
+        tipo = COLUNAS_CONTROLE.get(nome) or tipo_da_coluna(tabela, nome, inferido)
+        conn.execute(f'ALTER TABLE {tabela} ADD COLUMN "{nome}" {tipo}')
+        tipos[nome.lower()] = tipo
+        novas.append(f"{nome} {tipo}")
+    if novas:
+        print(f"- Novas colunas em {_nome_curto(tabela)}: {', '.join(novas)}")
+    return tipos
+
+def completar_origem(conn, tabela, origem, chave, colunas):
+    """
+    Tabela temporária com as linhas da origem em que só `colunas` (e a
+    chave) vêm dela; as demais colunas vêm da linha que já está na tabela,
+    se houver. O _hash é recalculado sobre a linha completa.
+    """
+    proprias = {c.lower() for c in [*colunas, *chave]}
+    completas = [c for c in colunas_de(conn, tabela) if c not in COLUNAS_CONTROLE]
+    selecao = ', '.join(f'{"o" if c.lower() in proprias else "t"}."{c}" AS "{c}"' for c in completas)
+    juncao = ' AND '.join(f"t.{c} = o.{c}" for c in chave)
+    consulta = f"SELECT {selecao} FROM {origem} o LEFT JOIN {tabela} t ON {juncao}"
+    conn.execute(f"CREATE OR REPLACE TEMP TABLE origem_completa AS {consulta_com_hash(consulta, completas)}")
+    return 'origem_completa'
+
+def mesclar_tabela(conn, tabela, origem, chave, excluir_ausentes=False, colunas=None):
+    """
+    Aplica na tabela só o que mudou em relação à origem, comparando o _hash
+    de cada linha pela chave: insere as novas, reescreve as alteradas e,
+    com `excluir_ausentes`, marca _excluido_em nas que sumiram da origem.
+    Tudo numa única transação. Se a tabela ainda não existe, ela é criada
+    com a origem.
+
+    Com `colunas`, a origem só é dona dessas colunas (p.ex. um relatório
+    CSV com parte dos campos): nas linhas que já existem, as outras
+    colunas ficam com o valor da tabela.
+
+    Retorna as contagens de inseridos, atualizados, excluidos e inalterados.
+    """
+    total = conn.execute(f"SELECT COUNT(*) FROM {origem}").fetchone()[0]
+    if not tabela_existe(conn, tabela):
+        conn.execute(f"CREATE TABLE {tabela} AS SELECT * FROM {origem}")
+        return {'inseridos': total, 'atualizados': 0, 'excluidos': 0, 'inalterados': 0}
+
+    # Campos novos viram colunas; os que sumiram da origem ficam nulos nas linhas novas
+    tipos = evoluir_esquema(conn, tabela, origem)
+    completada = colunas is not None
+    if completada:
+        origem = completar_origem(conn, tabela, origem, chave, colunas)
+    lista = ', '.join(f'TRY_CAST(o."{c}" AS {tipos[c.lower()]}) AS "{c}"' for c in colunas_de(conn, origem))
+
+    juncao = ' AND '.join(f"t.{c} = o.{c}" for c in chave)
+    conn.execute(f"""
+        CREATE OR REPLACE TEMP TABLE delta_mesclagem AS
+        SELECT {lista}, t.{chave[0]} IS NOT NULL AS _existente
+        FROM {origem} o LEFT JOIN {tabela} t ON {juncao}
+        WHERE t.{chave[0]} IS NULL OR t._hash IS DISTINCT FROM o._hash OR t._excluido_em IS NOT NULL
+    """)
+    condicao = ' AND '.join(f"{tabela}.{c} = d.{c}" for c in chave)
+    try:
+        conn.execute("BEGIN TRANSACTION")
+        conn.execute(
+            f"DELETE FROM {tabela} WHERE EXISTS "
+            f"(SELECT 1 FROM delta_mesclagem d WHERE d._existente AND {condicao})"
+        )
+        conn.execute(f"INSERT INTO {tabela} BY NAME SELECT * EXCLUDE (_existente) FROM delta_mesclagem")
+        excluidos = 0
+        if excluir_ausentes:
+            ausencia = ' AND '.join(f"{tabela}.{c} = o.{c}" for c in chave)
+            excluidos = conn.execute(f"""
+                UPDATE {tabela} SET _excluido_em = current_timestamp
+                WHERE _excluido_em IS NULL AND NOT EXISTS (SELECT 1 FROM {origem} o WHERE {ausencia})
+            """).fetchone()[0]
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+    inseridos, atualizados = conn.execute(
+        "SELECT count(*) FILTER (NOT _existente), count(*) FILTER (_existente) FROM delta_mesclagem"
+    ).fetchone()
+    conn.execute("DROP TABLE delta_mesclagem")
+    if completada:
+        conn.execute(f"DROP TABLE {origem}")
+    return {
+        'inseridos': inseridos,
+        'atualizados': atualizados,
+        'excluidos': excluidos,
+        'inalterados': total - inseridos - atualizados,
+    }
+
+def atualizar_historico(conn, tabela, historico, chave):
+    """
+    Registra no histórico (SCD tipo 2) o estado atual da tabela: fecha
+    (valido_ate) as versões que mudaram ou foram excluídas e abre uma versão
+    nova (valido_de) para cada linha ativa sem versão aberta igual. Linhas
+    que não mudaram não geram nada.
+    """
+    agora = conn.execute("SELECT CAST(current_timestamp AS TIMESTAMP)").fetchone()[0]
+    conn.execute(f"""
+        CREATE OR REPLACE TEMP VIEW historico_atual AS
+        SELECT * EXCLUDE (_excluido_em) FROM {tabela} WHERE _excluido_em IS NULL
+    """)
+    if not tabela_existe(conn, historico):
+        conn.execute(f"""
+            CREATE TABLE {historico} AS
+            SELECT *, CAST(? AS TIMESTAMP) AS valido_de, NULL::TIMESTAMP AS valido_ate
+            FROM historico_atual
+        """, [agora])
+        abertas = conn.execute(f"SELECT COUNT(*) FROM {historico}").fetchone()[0]
+        return {'abertas': abertas, 'fechadas': 0}
+
+    tipos = evoluir_esquema(conn, historico, 'historico_atual')
+    colunas = colunas_de(conn, 'historico_atual')
+    lista = ', '.join(f'TRY_CAST(a."{c}" AS {tipos[c.lower()]}) AS "{c}"' for c in colunas)
+    mesma_chave = ' AND '.join(f"a.{c} = {historico}.{c}" for c in chave)
+    try:
+        conn.execute("BEGIN TRANSACTION")
+        fechadas = conn.execute(f"""
+            UPDATE {historico} SET valido_ate = ?
+            WHERE valido_ate IS NULL AND NOT EXISTS (
+                SELECT 1 FROM historico_atual a WHERE {mesma_chave} AND a._hash = {historico}._hash
+            )
+        """, [agora]).fetchone()[0]
+        abertas = conn.execute(f"""
+            INSERT INTO {historico} BY NAME
+            SELECT {lista}, CAST(? AS TIMESTAMP) AS valido_de
+            FROM historico_atual a
+            WHERE NOT EXISTS (
+                SELECT 1 FROM {historico} WHERE {mesma_chave} AND {historico}.valido_ate IS NULL
+            )
+        """, [agora]).fetchone()[0]
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return {'abertas': abertas, 'fechadas': fechadas}
+
+def publicar_historico(conn, fonte):
+    """Atualiza o histórico da fonte, se ela tiver um"""
+    config = FONTES[fonte]
+    if not config.get('historico'):
+        return
+    contagens = atualizar_historico(conn, config['tabela'], config['historico'], config['chave'])
+    print(f"- {_nome_curto(config['historico'])}: {contagens['abertas']} versões novas, "
+          f"{contagens['fechadas']} encerradas")
+
+def publicar_cubo(conn, fonte):
+    """Recalcula o cubo de agregados da fonte (acrescentando as situações novas à tabela de prazos), se ela tiver um"""
+    config = FONTES[fonte]
+    if not config.get('cubo'):
+        return
+    # O cubo junta a tabela de prazos: as situações novas entram nela antes
+    novas = atualizar_situacao_sla(conn, config['tabela'], config['sla'])
+    print(f"- {_nome_curto(config['sla'])}: {novas} situações novas")
+    linhas = construir_cubo(conn, config['tabela'], config['cubo'], config['sla'])
+    print(f"- {_nome_curto(config['cubo'])}: {linhas} linhas")
+
+def houve_alteracao(contagens):
+    return any(contagens[nome] for nome in ('inseridos', 'atualizados', 'excluidos'))
+
+def resumo_mesclagem(contagens):
+    return ', '.join(f"{quantidade} {nome}" for nome, quantidade in contagens.items())
+
+def _nome_curto(tabela):
+    return tabela.split('.')[-1]
+
+def tabela_existe(conn, tabela):
+    """Verifica no catálogo se a tabela (banco.schema.nome) existe"""
+    banco, schema, nome = tabela.split('.')
+    return conn.execute("""
+        SELECT COUNT(*) FROM information_schema.tables
+        WHERE table_catalog = ? AND table_schema = ? AND table_name = ?
+    """, [banco, schema, nome]).fetchone()[0] > 0
+
+def tipar_tabela(conn, tabela):
+    """Converte no lugar as colunas de uma tabela existente que ainda não têm o tipo declarado"""
+    if not tabela_existe(conn, tabela):
+        return False
+    atuais = {linha[0]: linha[1] for linha in conn.execute(f"DESCRIBE {tabela}").fetchall()}
+    pendentes = [c for c, t in tipos_declarados(tabela, atuais).items() if atuais[c] != t]
+    if not pendentes:
+        return False
+    print(f"- Aplicando esquema em {_nome_curto(tabela)}: {', '.join(pendentes)}")
+    conn.execute(f"CREATE OR REPLACE TABLE {tabela} AS {consulta_tipada(tabela, f'SELECT * FROM {tabela}', atuais)}")
+    return True
+
+def validar_staging(conn, tabela, chave):
+    """Confere a tabela *_staging antes da publicação"""
+    staging = f"{tabela}_staging"
+    total = conn.execute(f"SELECT COUNT(*) FROM {staging}").fetchone()[0]
+    colunas = [linha[0] for linha in conn.execute(f"DESCRIBE {staging}").fetchall()]
+    print(f"- Registros em {_nome_curto(staging)}: {total}")
+    print(f"- Colunas: {', '.join(colunas)}")
+    if total == 0:
+        raise ValueError(f"{_nome_curto(staging)} foi criada vazia!")
+
+    chaves_nulas = conn.execute(
+        f"SELECT COUNT(*) FROM {staging} WHERE " + " OR ".join(f"{c} IS NULL" for c in chave)
+    ).fetchone()[0]
+    if chaves_nulas:
+        raise ValueError(f"{_nome_curto(staging)} tem {chaves_nulas} registros sem {', '.join(chave)}")
+
+    distintas = conn.execute(f"SELECT COUNT(*) FROM (SELECT DISTINCT {', '.join(chave)} FROM {staging})").fetchone()[0]
+    if distintas != total:
+        raise ValueError(f"{_nome_curto(staging)} tem {total - distintas} registros com {', '.join(chave)} repetido")
+
+    if tabela_existe(conn, tabela):
+        ativas = "WHERE _excluido_em IS NULL" if '_excluido_em' in colunas_de(conn, tabela) else ""
+        atual = conn.execute(f"SELECT COUNT(*) FROM {tabela} {ativas}").fetchone()[0]
+        if total < atual * PROPORCAO_MINIMA_STAGING:
+            raise ValueError(
+                f"{_nome_curto(staging)} tem {total} registros contra {atual} em produção; "
+                "carga provavelmente incompleta"
+            )
+
+def trocar_tabelas(conn, tabelas):
+    """
+    Coloca as tabelas *_staging no lugar das de produção numa única transação.
+    A geração atual é mantida como *_anterior para rollback imediato.
+    """
+    try:
+        conn.execute("BEGIN TRANSACTION")
+        for tabela in tabelas:
+            nome = _nome_curto(tabela)
+            conn.execute(f"DROP TABLE IF EXISTS {tabela}_anterior")
+            if tabela_existe(conn, tabela):
+                conn.execute(f"ALTER TABLE {tabela} RENAME TO {nome}_anterior")
+            conn.execute(f"ALTER TABLE {tabela}_staging RENAME TO {nome}")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+def restaurar_geracao_anterior(conn, tabelas):
+    """Volta as tabelas de produção para a geração *_anterior"""
+    for tabela in tabelas:
+        if not tabela_existe(conn, f"{tabela}_anterior"):
+            raise ValueError(f"Não há geração anterior de {_nome_curto(tabela)} para restaurar")
+
+    try:
+        conn.execute("BEGIN TRANSACTION")
+        for tabela in tabelas:
+            nome = _nome_curto(tabela)
+            conn.execute(f"DROP TABLE IF EXISTS {tabela}_descartada")
+            conn.execute(f"ALTER TABLE {tabela} RENAME TO {nome}_descartada")
+            conn.execute(f"ALTER TABLE {tabela}_anterior RENAME TO {nome}")
+            conn.execute(f"DROP TABLE {tabela}_descartada")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
         raise
 
-def clean_currency(value):
-    """Remove R$ e converte para número"""
-    if isinstance(value, str):
-        return float(value.replace('R$ ', '').replace('.', '').replace(',', '.'))
-    return value
-
-def validate_dataframe(df, name):
-    """Validate DataFrame content"""
-    if df.empty:
-        raise ValueError(f"DataFrame {name} está vazio")
-    print(f"\nValidando DataFrame {name}:")
-    print(f"- Número de linhas: {len(df)}")
-    print(f"- Colunas: {', '.join(df.columns)}")
-    print(f"- Primeiras linhas:\n{df.head()}\n")
+def reverter_carga():
+    """
+    Restaura a geração anterior das tabelas da carga completa e refaz sobre
+    ela os cubos, para os resumos do dashboard baterem com as listas.
+    """
+    conn = get_motherduck_connection()
+    try:
+        fontes = [fonte for fonte, config in FONTES.items() if not config.get('somente_incremental')]
+        restaurar_geracao_anterior(conn, [FONTES[fonte]['tabela'] for fonte in fontes])
+        for fonte in fontes:
+            publicar_cubo(conn, fonte)
+        publicar_versao(conn, 'rollback')
+        print("Geração anterior restaurada.")
+    finally:
+        fechar(conn)
+
+def iniciar_telemetria(modo, modulos):
+    """Começa a registrar a execução, com as requisições de cada módulo na sua fonte"""
+    execucao = iniciar_execucao(modo)
+    for fonte, modulo in modulos.items():
+        execucao.associar_url(modulo.url, fonte)
+    return execucao
 
 def update_motherduck():
+    conn = None
+    execucao = None
     try:
         print("Iniciando atualização do MotherDuck...")
         
         # Verificar carregamento do .env
         print("\nVerificando configuração do ambiente:")
         load_dotenv(verbose=True)  # Adiciona mais informações sobre o carregamento do .env
-        print("\nObtendo dados das APIs...")
         import reservas
         import workflow
+        modulos = {'reservas': reservas, 'workflow': workflow}
+        execucao = iniciar_telemetria('completa', modulos)
         
-        # Obter dados diretamente das APIs
-        dados_reservas = reservas.obter_todos_dados()
-        dados_workflow = workflow.obter_todos_dados()
-        
-        # Converter para DataFrames
-        reservas_df = pd.DataFrame(dados_reservas)
-        workflow_df = pd.DataFrame(dados_workflow)
-        
-        if reservas_df.empty or workflow_df.empty:
-            raise ValueError("Não foram encontrados dados para atualizar")
-        
-        # Validar os DataFrames
-        validate_dataframe(reservas_df, "reservas")
-        validate_dataframe(workflow_df, "workflow")
-        
-        # Limpar os valores monetários
-        if 'valor_contrato' in reservas_df.columns:
-            print("\nProcessando valores monetários...")
-            reservas_df['valor_contrato'] = reservas_df['valor_contrato'].apply(clean_currency)
-        
-        # Conectar ao MotherDuck e atualizar as tabelas
+        # Conectar ao MotherDuck (o estado da ingestão fica lá)
         print("\nConectando ao MotherDuck...")
         conn = get_motherduck_connection()
         
         # Criar schema se não existir
         print("\nVerificando/criando schema...")
         conn.sql("CREATE SCHEMA IF NOT EXISTS reservas.main")
+        
+        # Gravar as páginas no staging local conforme chegam das APIs,
+        # com as fontes extraídas em paralelo
+        print("\nObtendo dados das APIs...")
+        tarefas = {}
+        ajustes = {fonte: ler_ajuste(conn, fonte, modulo) for fonte, modulo in modulos.items()}
+        for fonte, modulo in modulos.items():
+            registros_por_pagina, controle = ajustes[fonte]
+            pagina_inicial = 1
+            if FONTES[fonte].get('localizar_inicio'):
+                with etapa(fonte, 'localizar_inicio'):
+                    pagina_inicial = localizar_pagina_inicial(conn, fonte, modulo, registros_por_pagina)
+            tarefas[fonte] = (modulo, {
+                'pagina_inicial': pagina_inicial, 'registros_por_pagina': registros_por_pagina, 'controle': controle,
+            })
+        stagings, falhas = extrair_fontes(tarefas)
+        
+        # A publicação troca todas as tabelas juntas; sem uma fonte não há carga
+        if falhas:
+            raise RuntimeError(f"Falha na extração de: {', '.join(falhas)}")
+        
+        if any(staging.total() == 0 for staging in stagings.values()):
+            raise ValueError("Não foram encontrados dados para atualizar")
+        
           # Atualizar tabelas com validação
         print("\nAtualizando tabelas no MotherDuck...")
         
+        tabelas = [FONTES[fonte]['tabela'] for fonte in stagings]
         try:
-            print("- Removendo tabelas antigas...")
-            conn.sql("DROP TABLE IF EXISTS reservas.main.reservas_abril")
-            conn.sql("DROP TABLE IF EXISTS reservas.main.workflow_abril")
+            print("- Criando tabelas de staging...")
+            for fonte, staging in stagings.items():
+                alias = f"local_{fonte}"
+                tabela = FONTES[fonte]['tabela']
+                with etapa(fonte, 'transformacao'):
+                    staging.anexar_em(conn, alias)
+                    consulta = consulta_tipada(tabela, staging.consulta(alias), staging.colunas())
+                    consulta = ultima_versao(consulta_com_hash(consulta, staging.colunas()), FONTES[fonte]['chave'])
+                    conn.execute(f"CREATE OR REPLACE TABLE {tabela}_staging AS {consulta}")
+                    conn.execute(f"DETACH {alias}")
+            
+            # Validar as tabelas de staging antes de publicar
+            print("\nValidando tabelas de staging...")
+            for fonte in stagings:
+                validar_staging(conn, FONTES[fonte]['tabela'], FONTES[fonte]['chave'])
+            
+            # Watermarks para as próximas sincronizações incrementais
+            watermarks = {
+                fonte: maior_referencia_data(conn, f"{FONTES[fonte]['tabela']}_staging")
+                for fonte in stagings
+            }
+            
+            # O delta de cada tabela existente é aplicado numa cópia dela, que
+            # vira o novo *_staging; a produção só muda na troca
+            print("\nAplicando alterações...")
+            for fonte in stagings:
+                config = FONTES[fonte]
+                tabela = config['tabela']
+                if not tabela_existe(conn, tabela):
+                    continue
+                with etapa(fonte, 'carga'):
+                    conn.execute(f"CREATE OR REPLACE TABLE {tabela}_geracao AS SELECT * FROM {tabela}")
+                    contagens = mesclar_tabela(
+                        conn, f"{tabela}_geracao", f"{tabela}_staging", config['chave'], excluir_ausentes=True
+                    )
+                    print(f"- {_nome_curto(tabela)}: {resumo_mesclagem(contagens)}")
+                    conn.execute(f"DROP TABLE {tabela}_staging")
+                    conn.execute(f"ALTER TABLE {tabela}_geracao RENAME TO {_nome_curto(tabela)}_staging")
             
-            print("- Criando novas tabelas...")
-            conn.execute("CREATE TABLE reservas.main.reservas_abril AS SELECT * FROM reservas_df")
-            conn.execute("CREATE TABLE reservas.main.workflow_abril AS SELECT * FROM workflow_df")
+            # Todas as fontes publicadas numa transação; a geração atual fica como *_anterior
+            print("\nPublicando tabelas...")
+            trocar_tabelas(conn, tabelas)
             
-            # Validar se as tabelas foram criadas corretamente
-            print("\nValidando tabelas criadas...")
-            reservas_count = conn.sql("SELECT COUNT(*) as count FROM reservas.main.reservas_abril").fetchone()[0]
-            workflow_count = conn.sql("SELECT COUNT(*) as count FROM reservas.main.workflow_abril").fetchone()[0]
+            for fonte in stagings:
+                with etapa(fonte, 'carga'):
+                    publicar_historico(conn, fonte)
+                    publicar_cubo(conn, fonte)
             
-            print(f"- Registros em reservas_abril: {reservas_count}")
-            print(f"- Registros em workflow_abril: {workflow_count}")
+            for fonte, watermark in watermarks.items():
+                gravar_estado(conn, chave_watermark(fonte), watermark)
             
-            if reservas_count == 0 or workflow_count == 0:
-                raise ValueError("Uma ou mais tabelas foram criadas vazias!")
+            publicar_versao(conn, 'completa')
+            
+            # Publicado: o checkpoint local não é mais necessário. O ajuste só é
+            # gravado agora porque o tamanho de página entra na chave do checkpoint:
+            # gravado antes, uma execução que falhou descartaria o que já foi baixado
+            for fonte, staging in stagings.items():
+                staging.concluir()
+                gravar_ajuste(conn, fonte, *ajustes[fonte])
+            publicar_arquivo(conn)
             
             print("\nDados atualizados com sucesso no MotherDuck!")
             
         except Exception as e:
             print(f"\nErro ao atualizar tabelas: {str(e)}")
-            print("Tentando reverter alterações...")
+            print("Descartando tabelas de staging; as tabelas de produção não foram alteradas.")
             try:
-                conn.sql("DROP TABLE IF EXISTS reservas.main.reservas_abril")
-                conn.sql("DROP TABLE IF EXISTS reservas.main.workflow_abril")
+                for tabela in tabelas:
+                    conn.execute(f"DROP TABLE IF EXISTS {tabela}_staging")
+                    conn.execute(f"DROP TABLE IF EXISTS {tabela}_geracao")
             except:
                 pass
             raise e
             
     except Exception as e:
         print(f"\nErro durante a atualização: {str(e)}")
+        if execucao:
+            execucao.falhar(e)
         raise e
     finally:
+        encerrar_execucao(conn)
         try:
-            conn.close()
+            fechar(conn)
             print("\nConexão com MotherDuck fechada.")
         except:
             pass
 
+def aplicar_alteracoes(conn, fonte, staging, watermark=True):
+    """
+    Mescla o lote do staging na tabela da fonte e atualiza o histórico.
+    Um registro que aparece mais de uma vez no lote entra só com a última versão.
+    Retorna as contagens da mesclagem.
+    """
+    config = FONTES[fonte]
+    alias = f"local_{fonte}"
+    with etapa(fonte, 'transformacao'):
+        staging.anexar_em(conn, alias)
+        consulta = consulta_com_hash(
+            consulta_tipada(config['tabela'], staging.consulta(alias), staging.colunas()), staging.colunas()
+        )
+        conn.execute(f"CREATE OR REPLACE TEMP TABLE alteracoes_{fonte} AS {ultima_versao(consulta, config['chave'])}")
+        conn.execute(f"DETACH {alias}")
+
+    with etapa(fonte, 'carga'):
+        tipar_tabela(conn, config['tabela'])
+        contagens = mesclar_tabela(conn, config['tabela'], f"alteracoes_{fonte}", config['chave'])
+        if watermark:
+            gravar_estado(conn, chave_watermark(fonte), maior_referencia_data(conn, f"alteracoes_{fonte}"))
+        staging.concluir()
+        print(f"- {_nome_curto(config['tabela'])}: {resumo_mesclagem(contagens)}")
+        publicar_historico(conn, fonte)
+    return contagens
+
+def sincronizar_incremental():
+    """Busca só o que mudou desde o último watermark de cada fonte e mescla o delta"""
+    conn = None
+    execucao = None
+    try:
+        print("Iniciando sincronização incremental do MotherDuck...")
+        load_dotenv(verbose=True)
+        import leads
+        import reservas
+        import workflow
+        modulos = {'reservas': reservas, 'workflow': workflow, 'leads': leads}
+        execucao = iniciar_telemetria('incremental', modulos)
+
+        print("\nConectando ao MotherDuck...")
+        conn = get_motherduck_connection()
+
+        tarefas = {}
+        ajustes = {}
+        for fonte, modulo in modulos.items():
+            desde = ler_estado(conn, chave_watermark(fonte))
+            if desde:
+                print(f"- Buscando {fonte} alterados desde {desde}")
+            elif FONTES[fonte].get('somente_incremental'):
+                print(f"- Sem watermark para {fonte}; buscando todos os registros")
+            else:
+                raise ValueError(f"Sem watermark para {fonte}; execute uma carga completa primeiro")
+            registros_por_pagina, controle = ajustes[fonte] = ler_ajuste(conn, fonte, modulo)
+            tarefas[fonte] = (modulo, {'desde': desde, 'registros_por_pagina': registros_por_pagina, 'controle': controle})
+
+        print("\nObtendo alterações das APIs...")
+        stagings, falhas = extrair_fontes(tarefas)
+
+        # Cada fonte é aplicada por conta própria: as que foram extraídas
+        # são publicadas mesmo que outra tenha falhado. O ajuste é gravado só
+        # depois de aplicar, pois o tamanho de página entra na chave do checkpoint
+        alteradas = []
+        for fonte, staging in stagings.items():
+            if staging.total() == 0:
+                print(f"- Nenhuma alteração em {fonte}")
+                staging.concluir()
+            elif houve_alteracao(aplicar_alteracoes(conn, fonte, staging)):
+                alteradas.append(fonte)
+            gravar_ajuste(conn, fonte, *ajustes[fonte])
+
+        # Cubo e versão só mudam se alguma linha mudou: sem alterações o
+        # dashboard mantém o cache (os dias na situação do cubo são
+        # recontados na próxima alteração ou na carga completa diária).
+        # Mesmo com uma fonte falhando, as outras já mudaram
+        for fonte in alteradas:
+            with etapa(fonte, 'carga'):
+                publicar_cubo(conn, fonte)
+        if alteradas:
+            publicar_versao(conn, 'incremental')
+        else:
+            print("- Nada mudou; a versão dos dados continua a mesma")
+        if stagings:
+            publicar_arquivo(conn)
+
+        if falhas:
+            raise RuntimeError(f"Falha na extração de: {', '.join(falhas)}")
+
+        print("\nSincronização incremental concluída!")
+
+    except Exception as e:
+        print(f"\nErro durante a sincronização incremental: {str(e)}")
+        if execucao:
+            execucao.falhar(e)
+        raise e
+    finally:
+        encerrar_execucao(conn)
+        try:
+            fechar(conn)
+            print("\nConexão com MotherDuck fechada.")
+        except:
+            pass
+
+def reprocessar_arquivo(fontes=None):
+    """
+    Reconstrói as tabelas a partir do arquivo bruto, sem chamar a API: as
+    páginas arquivadas passam pelo mesmo filtro de data, transformações,
+    tipos e mesclagem da ingestão. Serve para aplicar uma correção de
+    transformação ou carregar um backend local do zero. Os watermarks não
+    mudam, então a próxima sincronização continua de onde a API parou.
+    """
+    conn = None
+    execucao = None
+    try:
+        print("Reprocessando o arquivo bruto...")
+        load_dotenv()
+        import leads
+        import reservas
+        import workflow
+        modulos = {'reservas': reservas, 'workflow': workflow, 'leads': leads}
+        modulos = {fonte: modulo for fonte, modulo in modulos.items() if not fontes or fonte in fontes}
+        execucao = iniciar_execucao('replay')
+
+        conn = get_motherduck_connection()
+        for fonte, modulo in modulos.items():
+            staging = StagingLocal(f"replay_{fonte}", transformacao=TRANSFORMACOES.get(fonte))
+            staging.reiniciar()
+            with etapa(fonte, 'extracao'):
+                for pagina, brutos in enumerate(arquivo_bruto.ler_paginas(fonte, conn=conn), start=1):
+                    dados = modulo.filtrar_por_data(brutos)
+                    staging.anexar(pagina, dados, len(brutos))
+                    registrar_pagina(fonte, pagina, len(brutos), len(dados), 0)
+            staging.fechar()
+
+            if staging.total() == 0:
+                print(f"- Nada arquivado para {fonte}")
+                staging.concluir()
+                continue
+            print(f"- {staging.total()} registros de {fonte} lidos do arquivo")
+            aplicar_alteracoes(conn, fonte, staging, watermark=False)
+            with etapa(fonte, 'carga'):
+                publicar_cubo(conn, fonte)
+
+        publicar_versao(conn, 'replay')
+        print("\nReprocessamento concluído!")
+
+    except Exception as e:
+        print(f"\nErro durante o reprocessamento: {str(e)}")
+        if execucao:
+            execucao.falhar(e)
+        raise e
+    finally:
+        encerrar_execucao(conn)
+        if conn is not None:
+            fechar(conn)
+
+def carregar_csv_leads(caminhos):
+    """
+    Carrega relatórios de leads exportados do CVCRM (CSV) em cv_leads,
+    com upsert por idlead. Os arquivos são lidos pelo próprio DuckDB. Leads
+    que já existem mantêm as colunas que só a API traz (COLUNAS_SOMENTE_API).
+    """
+    import leads
+
+    config = FONTES['leads']
+    colunas = [*leads.COLUNAS_CSV.values(), *leads.COLUNAS_SOMENTE_API]
+    conn = get_motherduck_connection()
+    try:
+        # Sem referencia_data no relatório, a última linha de cada lead vence
+        conn.execute(f"""
+            CREATE OR REPLACE TEMP TABLE leads_csv AS
+            SELECT * FROM ({consulta_com_hash(consulta_tipada(config['tabela'], leads.consulta_csv(caminhos), colunas), colunas)})
+            WHERE idlead IS NOT NULL
+            QUALIFY row_number() OVER (PARTITION BY idlead ORDER BY data_cad DESC) = 1
+        """)
+        tipar_tabela(conn, config['tabela'])
+        # O relatório não traz os campos só da API: eles ficam como estão
+        contagens = mesclar_tabela(conn, config['tabela'], 'leads_csv', config['chave'],
+                                   colunas=list(leads.COLUNAS_CSV.values()))
+        print(f"- {_nome_curto(config['tabela'])}: {resumo_mesclagem(contagens)}")
+        publicar_versao(conn, 'csv_leads')
+    finally:
+        fechar(conn)
+
 if __name__ == "__main__":
-    update_motherduck()
+    parser = argparse.ArgumentParser(description="Atualiza as tabelas do MotherDuck a partir do CVCRM")
+    parser.add_argument('--incremental', action='store_true',
+                        help="busca só os registros alterados desde a última execução")
+    parser.add_argument('--rollback', action='store_true',
+                        help="restaura a geração anterior das tabelas")
+    parser.add_argument('--csv-leads', nargs='+', metavar='CSV',
+                        help="carrega relatórios de leads exportados do CVCRM em cv_leads")
+    parser.add_argument('--replay', nargs='*', metavar='FONTE', choices=list(FONTES),
+                        help="reconstrói as tabelas (todas ou só as FONTEs) a partir do arquivo bruto, sem a API")
+    args = parser.parse_args()
+
+    if args.replay is not None:
+        reprocessar_arquivo(args.replay)
+    elif args.csv_leads:
+        load_dotenv()
+        carregar_csv_leads(args.csv_leads)
+    elif args.rollback:
+        reverter_carga()
+    elif args.incremental:
+        sincronizar_incremental()
+    else:
+        update_motherduck()
@@ -0,0 +1,73 @@
+"""
+Testes do arquivo bruto (scripts/arquivo_bruto.py): partições no disco,
+publicação na tabela do banco e leitura para o replay.
+"""
+import duckdb
+import pytest
+
+import arquivo_bruto
+from staging_local import StagingLocal
+
+
+def arquivar(tmp_path, execucao, paginas):
+    """Grava `paginas` (listas de registros) no arquivo do disco como uma execução da ingestão"""
+    staging = StagingLocal(f"reservas_{execucao}", diretorio=str(tmp_path / 'staging'))
+    for pagina, registros in enumerate(paginas, start=1):
+        staging.anexar(pagina, registros, brutos=registros)
+    quantidade = staging.arquivar(arquivo_bruto.destino('reservas', str(tmp_path / 'arquivo')), execucao)
+    staging.fechar()
+    return quantidade
+
+
+@pytest.fixture
+def banco():
+    conn = duckdb.connect()
+    conn.execute("ATTACH ':memory:' AS reservas")
+    yield conn
+    conn.close()
+
+
+def test_particiona_por_mes(tmp_path):
+    arquivar(tmp_path, 'e1', [[
+        {'idreserva': 1, 'referencia_data': '2025-03-10 10:00:00'},
+        {'idreserva': 2, 'referencia_data': '2025-04-01 08:00:00'},
+        {'idreserva': 3},
+    ]])
+    meses = sorted(caminho.split('mes=')[1].split('/')[0]
+                   for caminho in arquivo_bruto.arquivos_locais('reservas', str(tmp_path / 'arquivo')))
+    assert meses == ['2025-03', '2025-04', 'sem_data']
+
+
+def test_publicar_acrescenta_so_o_que_esta_no_disco(tmp_path, banco):
+    diretorio = str(tmp_path / 'arquivo')
+    arquivar(tmp_path, 'e1', [[{'idreserva': 1, 'referencia_data': '2025-03-10 10:00:00'}]])
+
+    assert arquivo_bruto.publicar(banco, diretorio) == 1
+    assert arquivo_bruto.arquivos_locais(diretorio=diretorio) == []
+    # Sem nada novo no disco, nada é acrescentado
+    assert arquivo_bruto.publicar(banco, diretorio) == 0
+
+    arquivar(tmp_path, 'e2', [[{'idreserva': 1, 'referencia_data': '2025-03-11 10:00:00'},
+                               {'idreserva': 2, 'referencia_data': '2025-03-11 11:00:00'}]])
+    assert arquivo_bruto.publicar(banco, diretorio) == 2
+    assert banco.execute(
+        f"SELECT fonte, mes, count(*) FROM {arquivo_bruto.TABELA_ARQUIVO} GROUP BY ALL"
+    ).fetchall() == [('reservas', '2025-03', 3)]
+
+
+def test_ler_paginas_junta_tabela_e_disco_na_ordem_da_captura(tmp_path, banco):
+    diretorio = str(tmp_path / 'arquivo')
+    arquivar(tmp_path, 'e1', [[{'idreserva': 1, 'situacao': 'Reserva (7)'}],
+                              [{'idreserva': 2, 'situacao': 'Reserva (7)'}]])
+    arquivo_bruto.publicar(banco, diretorio)
+    # A segunda execução ainda não foi publicada
+    arquivar(tmp_path, 'e2', [[{'idreserva': 1, 'situacao': 'Vendida'}]])
+
+    paginas = list(arquivo_bruto.ler_paginas('reservas', diretorio, conn=banco))
+
+    assert paginas == [
+        [{'idreserva': 1, 'situacao': 'Reserva (7)'}],
+        [{'idreserva': 2, 'situacao': 'Reserva (7)'}],
+        [{'idreserva': 1, 'situacao': 'Vendida'}],
+    ]
+    assert list(arquivo_bruto.ler_paginas('workflow', diretorio, conn=banco)) == []
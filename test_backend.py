@@ -0,0 +1,50 @@
+"""
+Testes do backend parquet (scripts/backend.py): as tabelas vão para a
+memória, voltam para o diretório e as removidas somem do disco.
+"""
+import os
+
+import duckdb
+
+from backend import conectar, fechar, tabelas
+
+
+def test_parquet_grava_e_le_de_volta(tmp_path):
+    caminho = str(tmp_path / 'reservas')
+    conn = conectar('parquet', caminho)
+    conn.execute("CREATE TABLE reservas.main.reservas_abril AS SELECT range AS idreserva FROM range(3)")
+    fechar(conn, 'parquet', caminho)
+
+    assert os.listdir(caminho) == ['reservas_abril.parquet']
+    conn = conectar('parquet', caminho, somente_leitura=True)
+    assert conn.execute("SELECT count(*) FROM reservas_abril").fetchone()[0] == 3
+    conn.close()
+
+
+def test_parquet_apaga_o_arquivo_da_tabela_removida(tmp_path):
+    caminho = str(tmp_path / 'reservas')
+    conn = conectar('parquet', caminho)
+    conn.execute("CREATE TABLE reservas.main.reservas_abril AS SELECT 1 AS idreserva")
+    conn.execute("CREATE TABLE reservas.main.reservas_abril_anterior AS SELECT 1 AS idreserva")
+    fechar(conn, 'parquet', caminho)
+
+    conn = conectar('parquet', caminho)
+    conn.execute("DROP TABLE reservas.main.reservas_abril_anterior")
+    fechar(conn, 'parquet', caminho)
+
+    assert sorted(os.listdir(caminho)) == ['reservas_abril.parquet']
+    conn = conectar('parquet', caminho, somente_leitura=True)
+    assert tabelas(conn) == ['reservas_abril']
+    conn.close()
+
+
+def test_parquet_regrava_tabela_particionada_como_arquivo(tmp_path):
+    caminho = tmp_path / 'reservas'
+    (caminho / 'cv_leads' / 'mes=2025-03').mkdir(parents=True)
+    duckdb.execute(f"COPY (SELECT 1 AS idlead) TO '{caminho / 'cv_leads' / 'mes=2025-03' / 'dados.parquet'}'")
+
+    conn = conectar('parquet', str(caminho))
+    assert conn.execute("SELECT count(*) FROM cv_leads").fetchone()[0] == 1
+    fechar(conn, 'parquet', str(caminho))
+
+    assert os.listdir(caminho) == ['cv_leads.parquet']
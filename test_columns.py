@@ -1,8 +1,17 @@
+import os
+
 import duckdb
 import pandas as pd
+import pytest
+from dotenv import load_dotenv
+
+load_dotenv()
+MOTHERDUCK_TOKEN = os.environ.get('MOTHERDUCK_TOKEN', '').strip()
 
 
 def test_columns():
+    if not MOTHERDUCK_TOKEN:
+        pytest.skip("MOTHERDUCK_TOKEN não configurado")
     try:
         con = duckdb.connect(f"md:reservas?token={MOTHERDUCK_TOKEN}")
         # Get column names
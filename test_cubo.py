@@ -0,0 +1,76 @@
+"""
+Testes do cubo de agregados (scripts/cubo.py): as somas do nível
+detalhado e o resumo batem com a tabela de reservas.
+"""
+from datetime import date, datetime, timedelta
+
+import duckdb
+import pytest
+
+from cubo import NIVEL_DETALHADO, TABELA_CUBO, construir_cubo, resumo
+from sla import TABELA_SLA, atualizar_situacao_sla
+
+TABELA = 'reservas.main.reservas_abril'
+
+
+@pytest.fixture
+def conn():
+    conn = duckdb.connect()
+    conn.execute("ATTACH ':memory:' AS reservas")
+    conn.execute(f"""
+        CREATE TABLE {TABELA} (
+            idreserva INTEGER, data_cad TIMESTAMP, situacao VARCHAR, empreendimento VARCHAR,
+            imobiliaria VARCHAR, valor_contrato DOUBLE, data_ultima_alteracao_situacao TIMESTAMP,
+            _excluido_em TIMESTAMP
+        )
+    """)
+    agora = datetime.now()
+    conn.executemany(f"INSERT INTO {TABELA} VALUES (?, ?, ?, ?, ?, ?, ?, ?)", [
+        # Reserva (7) há 10 dias: fora do prazo; há 2 dias: dentro
+        (1, datetime(2025, 3, 1), 'Reserva (7)', 'Vila Prati', 'Casa & Cia', 100.0, agora - timedelta(days=10), None),
+        (2, datetime(2025, 3, 2), 'Reserva (7)', 'Vila Prati', 'Lar Imóveis', 200.0, agora - timedelta(days=2), None),
+        # Sem número no nome, sem prazo
+        (3, datetime(2025, 3, 2), 'Vendida', 'Jardim Europa', 'Casa & Cia', 300.0, agora - timedelta(days=40), None),
+        (4, datetime(2025, 4, 5), 'Negociação (5)', 'Jardim Europa', 'Casa & Cia', None, None, None),
+        # Excluída: fica fora do cubo
+        (5, datetime(2025, 3, 3), 'Reserva (7)', 'Vila Prati', 'Casa & Cia', 999.0, agora - timedelta(days=30),
+         agora),
+    ])
+    atualizar_situacao_sla(conn, TABELA)
+    construir_cubo(conn, TABELA)
+    yield conn
+    conn.close()
+
+
+def test_nivel_detalhado_soma_as_reservas_ativas(conn):
+    quantidade, valor, fora = conn.execute(f"""
+        SELECT sum(quantidade), sum(valor_total), sum(fora_do_prazo) FROM {TABELA_CUBO} WHERE nivel = ?
+    """, [NIVEL_DETALHADO]).fetchone()
+    assert (quantidade, valor, fora) == (4, 600.0, 1)
+
+
+def test_resumo_por_imobiliaria_com_filtros(conn):
+    por_imobiliaria = resumo(conn, 'imobiliaria', date(2025, 3, 1), date(2025, 3, 31)).set_index('imobiliaria')
+    assert por_imobiliaria.loc['Casa & Cia', 'quantidade'] == 2
+    assert por_imobiliaria.loc['Casa & Cia', 'valor_fora_do_prazo'] == 100.0
+    assert por_imobiliaria.loc['Casa & Cia', 'tempo_medio'] == 25
+    assert por_imobiliaria.loc['Lar Imóveis', 'fora_do_prazo'] == 0
+
+    sem_vendidas = resumo(conn, ['empreendimento', 'situacao'], date(2025, 1, 1), date(2025, 12, 31),
+                          excluir_situacoes=['Vendida'])
+    assert sorted(zip(sem_vendidas['empreendimento'], sem_vendidas['situacao'], sem_vendidas['quantidade'])) == [
+        ('Jardim Europa', 'Negociação (5)', 1), ('Vila Prati', 'Reserva (7)', 2),
+    ]
+
+
+def test_prazo_editado_vale_no_proximo_cubo(conn):
+    conn.execute(f"UPDATE {TABELA_SLA} SET limite_dias = 1 WHERE situacao = 'Reserva (7)'")
+    atualizar_situacao_sla(conn, TABELA)
+    construir_cubo(conn, TABELA)
+    fora = conn.execute(f"SELECT sum(fora_do_prazo) FROM {TABELA_CUBO} WHERE nivel = ?", [NIVEL_DETALHADO]).fetchone()[0]
+    assert fora == 2
+
+
+def test_dimensao_invalida(conn):
+    with pytest.raises(ValueError, match="Dimensão inválida"):
+        resumo(conn, 'valor_contrato; DROP TABLE x', date(2025, 1, 1), date(2025, 12, 31))
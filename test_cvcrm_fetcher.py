@@ -0,0 +1,187 @@
+"""
+Testes da busca paginada, do endpoint com janela de datas e do ajuste de
+concorrência e de tamanho de página (scripts/cvcrm_fetcher.py), com o mock
+do CVCRM onde há requisições.
+"""
+import time
+from datetime import datetime
+
+import pytest
+
+from cvcrm_fetcher import (
+    ControleConcorrencia, EndpointCVDW, TokenBucket, buscar_paginas, localizar_primeira_pagina, proximo_tamanho_pagina
+)
+from mock_cvcrm import iniciar_mock, primeiro_indice_desde
+
+
+@pytest.fixture(scope='module')
+def servidor():
+    servidor = iniciar_mock(registros=0)
+    yield servidor
+    servidor.shutdown()
+    servidor.server_close()
+
+
+def buscar(servidor, registros, por_pagina, totais=True, concorrencia=4, **kwargs):
+    """(páginas recebidas com o número de registros, requisições feitas)"""
+    servidor.config.registros = registros
+    servidor.config.totais = totais
+    servidor.zerar_estatisticas()
+    paginas = [
+        (pagina, len(dados))
+        for pagina, dados in buscar_paginas(
+            f"{servidor.url_base}/api/v1/cvdw/reservas", {}, registros_por_pagina=por_pagina,
+            limitador=TokenBucket(taxa=1000), controle=ControleConcorrencia(concorrencia, maximo=concorrencia), **kwargs
+        )
+    ]
+    return paginas, servidor.estatisticas['requisicoes']
+
+
+@pytest.mark.parametrize('registros, por_pagina, paginas', [
+    (1200, 500, 3),
+    # Múltiplos exatos: a última página vem cheia e o total da API encerra a busca
+    (1000, 500, 2),
+    (2500, 100, 25),
+])
+def test_nao_busca_alem_do_total(servidor, registros, por_pagina, paginas):
+    recebidas, requisicoes = buscar(servidor, registros, por_pagina)
+    assert [pagina for pagina, _ in recebidas] == list(range(1, paginas + 1))
+    assert sum(quantidade for _, quantidade in recebidas) == registros
+    assert requisicoes == paginas
+
+
+def test_sem_total_para_na_pagina_incompleta(servidor):
+    recebidas, requisicoes = buscar(servidor, 1200, 100, totais=False, concorrencia=4)
+    assert sum(quantidade for _, quantidade in recebidas) == 1200
+    assert recebidas[-1] == (13, 0)
+    # Além das 13 páginas, no máximo as que já estavam em andamento
+    assert requisicoes <= 13 + 3
+
+
+def test_pula_paginas_do_checkpoint(servidor):
+    recebidas, requisicoes = buscar(servidor, 1200, 500, pular={2})
+    assert [pagina for pagina, _ in recebidas] == [1, 3]
+    assert requisicoes == 2
+
+
+@pytest.mark.parametrize('distancia_da_dica', [None, 0, -1, 1, -20, 50])
+def test_localiza_a_primeira_pagina_da_data_de_corte(servidor, distancia_da_dica):
+    servidor.config.registros = 10000
+    servidor.config.totais = True
+    # As datas do mock vão até hoje, então a página certa muda com o tempo
+    esperada = primeiro_indice_desde('2024-01-01', 10000) // 100 + 1
+    dica = None if distancia_da_dica is None else max(esperada + distancia_da_dica, 1)
+    pagina, requisicoes = localizar_primeira_pagina(
+        f"{servidor.url_base}/api/v1/cvdw/reservas", {}, 100, '2024-01-01', dica=dica,
+        limitador=TokenBucket(taxa=1000)
+    )
+    assert pagina == esperada
+    if distancia_da_dica == 0:
+        # A dica da execução anterior ainda vale: a página antes dela e ela mesma
+        assert requisicoes == 2
+
+
+def test_endpoint_filtra_a_janela_e_comeca_na_data_de_corte(servidor):
+    servidor.config.registros = 10000
+    servidor.config.totais = True
+    corte = datetime(2024, 1, 1)
+    na_janela = 10000 - primeiro_indice_desde(corte.strftime('%Y-%m-%d'), 10000)
+    requisicoes = {}
+    for fonte, caminho, localizar in [('reservas', 'reservas', False), ('workflow', 'reservas/workflow/tempo', True)]:
+        servidor.zerar_estatisticas()
+        endpoint = EndpointCVDW(fonte, f"{servidor.url_base}/api/v1/cvdw/{caminho}", {}, corte, 100,
+                                localizar_inicio=localizar)
+        assert len(endpoint.obter_todos_dados()) == na_janela
+        requisicoes[fonte] = servidor.estatisticas['requisicoes']
+    # As páginas anteriores ao corte só são sondadas pela busca binária, não baixadas uma a uma
+    assert requisicoes['workflow'] < requisicoes['reservas'] - 10
+
+
+def test_controle_sobe_com_respostas_rapidas_e_cai_pela_metade_no_recuo():
+    controle = ControleConcorrencia(inicial=2, maximo=4, latencia_alvo=1.0)
+    for _ in range(2):
+        controle.sucesso(0.1)
+    assert controle.atual == 3
+    controle.sucesso(2.0)
+    assert controle.atual == 2
+    controle.recuo(429)
+    assert controle.atual == 1
+    controle.recuo(503)
+    assert controle.atual == 1
+    for _ in range(20):
+        controle.sucesso(0.1)
+    assert controle.atual == 4
+
+
+def test_token_bucket_recua_e_recupera_a_taxa():
+    limitador = TokenBucket(taxa=8)
+    limitador.recuar(pausa=0)
+    assert limitador.taxa == 4
+    for _ in range(10):
+        limitador.recuar(pausa=0)
+    assert limitador.taxa == 0.5
+    for _ in range(100):
+        limitador.sucesso()
+    assert limitador.taxa == 8
+
+
+def test_token_bucket_limita_a_taxa():
+    limitador = TokenBucket(taxa=50, capacidade=1)
+    inicio = time.monotonic()
+    for _ in range(11):
+        limitador.adquirir()
+    # O primeiro token já está no balde; os outros dez chegam a 50 por segundo
+    assert time.monotonic() - inicio >= 0.18
+
+
+def controle_com(latencias=(), status=(), timeouts=0, latencia_alvo=1.0):
+    controle = ControleConcorrencia(inicial=4, maximo=8, latencia_alvo=latencia_alvo)
+    for latencia in latencias:
+        controle.sucesso(latencia)
+    for codigo in status:
+        controle.recuo(codigo)
+    for _ in range(timeouts):
+        controle.timeout()
+    return controle
+
+
+def test_poucas_medicoes_nao_mudam_a_pagina():
+    assert proximo_tamanho_pagina(300, controle_com([5.0, 5.0])) == 300
+
+
+def test_um_429_nao_reduz_a_pagina():
+    # O caso do benchmark: um 429 em 11 requisições derrubava 500 para 250
+    controle = controle_com([0.6] * 10, status=[429])
+    assert proximo_tamanho_pagina(500, controle, maximo=500) == 500
+
+
+def test_429_repetidos_nao_reduzem_a_pagina():
+    controle = controle_com([0.1] * 10, status=[429] * 6)
+    assert proximo_tamanho_pagina(300, controle, maximo=500) == 450
+
+
+def test_um_5xx_isolado_nao_reduz_a_pagina():
+    controle = controle_com([0.6] * 15, status=[503])
+    assert proximo_tamanho_pagina(300, controle) == 300
+
+
+def test_sobrecarga_sustentada_reduz_a_pagina():
+    controle = controle_com([0.6] * 8 + [3.0] * 2, status=[503, 502], timeouts=1)
+    assert controle.sobrecarga() == (5, 13)
+    assert proximo_tamanho_pagina(400, controle) == 200
+
+
+def test_respostas_lentas_reduzem_a_pagina():
+    assert proximo_tamanho_pagina(400, controle_com([3.0] * 6)) == 200
+
+
+def test_folga_aumenta_a_pagina_dentro_dos_limites():
+    assert proximo_tamanho_pagina(200, controle_com([0.1] * 10), maximo=500) == 300
+    assert proximo_tamanho_pagina(400, controle_com([0.1] * 10), maximo=500) == 500
+    assert proximo_tamanho_pagina(100, controle_com([3.0] * 6), minimo=100) == 100
+
+
+def test_janela_esquece_sinais_antigos():
+    controle = controle_com([3.0] * 5 + [0.6] * 20)
+    assert controle.sobrecarga() == (0, 20)
+    assert proximo_tamanho_pagina(300, controle) == 300
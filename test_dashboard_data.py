@@ -0,0 +1,122 @@
+"""
+Testes da camada de dados do dashboard (dashboard/data.py): montagem dos
+filtros (sem banco) e o pool de conexões (com DuckDB em memória).
+"""
+import threading
+
+import duckdb
+import pytest
+
+pytest.importorskip('streamlit')
+
+import data
+
+
+@pytest.fixture
+def colunas(monkeypatch):
+    """Colunas que a tabela dos testes tem (em vez de consultar o information_schema)"""
+    existentes = {'data_cad', 'situacao', 'empreendimento', '_hash', '_excluido_em'}
+    monkeypatch.setattr(data, 'colunas_da_tabela', lambda tabela: existentes)
+    return existentes
+
+
+def test_filtros_com_colunas_e_valores_como_parametros(colunas):
+    where, parametros = data.montar_filtros(
+        'reservas_abril', inicio='2025-01-01', iguais={'empreendimento': 'Vila Prati', 'situacao': 'Todas'},
+        excluir={'situacao': ['Cancelada', 'Vendida']}
+    )
+    assert where == (
+        '_excluido_em IS NULL AND "data_cad" >= CAST(? AS DATE) AND "empreendimento" = ? '
+        'AND ("situacao" IS NULL OR "situacao" NOT IN (?, ?))'
+    )
+    assert parametros == ['2025-01-01', 'Vila Prati', 'Cancelada', 'Vendida']
+
+
+def test_sem_excluido_em_nao_filtra_a_coluna(colunas):
+    colunas.discard('_excluido_em')
+    assert data.montar_filtros('cv_leads') == ('true', [])
+    assert data.montar_consulta('cv_leads')[0] == 'SELECT * EXCLUDE (_hash) FROM cv_leads WHERE true'
+
+
+@pytest.mark.parametrize('filtros', [
+    {'iguais': {'lower(situacao)': 'vendida'}},
+    {'excluir': {"situacao) OR (1=1": ['x']}},
+    {'coluna_data': 'data_cad; DROP TABLE reservas_abril', 'inicio': '2025-01-01'},
+])
+def test_expressao_no_lugar_da_coluna_e_recusada(colunas, filtros):
+    with pytest.raises(ValueError, match="Coluna inválida"):
+        data.montar_filtros('reservas_abril', **filtros)
+
+
+def test_condicoes_explicitas(colunas):
+    where, parametros = data.montar_filtros(
+        'cv_leads', iguais={'situacao': 'Em Atendimento'},
+        condicoes=['dias > 3', data.fora_de('lower(trim(situacao))', ['descartado'])]
+    )
+    assert where == (
+        '_excluido_em IS NULL AND "situacao" = ? AND (dias > 3) '
+        'AND ((lower(trim(situacao)) IS NULL OR lower(trim(situacao)) NOT IN (?)))'
+    )
+    assert parametros == ['Em Atendimento', 'descartado']
+
+
+class ConexaoCaida:
+    """Conexão cujos cursores falham como um MotherDuck que caiu"""
+
+    def cursor(self):
+        return self
+
+    def execute(self, *args):
+        raise duckdb.ConnectionException("Connection closed")
+
+    def close(self):
+        pass
+
+
+def pool_com(*conexoes, **kwargs):
+    """Pool que abre, em ordem, as `conexoes`"""
+    abertas = iter(conexoes)
+    return data.PoolConexoes(lambda: next(abertas), **kwargs)
+
+
+def test_pool_reaproveita_a_conexao_e_os_cursores():
+    pool = pool_com(duckdb.connect(), tamanho=2)
+    for _ in range(5):
+        assert pool.consultar("SELECT 42 AS x")['x'].tolist() == [42]
+    assert pool._criados == 1
+
+
+def test_pool_cheio_espera_e_desiste(monkeypatch):
+    monkeypatch.setattr(data, 'ESPERA_CURSOR', 0.05)
+    pool = pool_com(duckdb.connect(), tamanho=1)
+    erros = []
+
+    def outra_sessao():
+        try:
+            pool.consultar("SELECT 1")
+        except TimeoutError as e:
+            erros.append(e)
+
+    with pool.cursor():
+        sessao = threading.Thread(target=outra_sessao)
+        sessao.start()
+        sessao.join()
+    assert len(erros) == 1
+    # Devolvido, o cursor volta a servir
+    assert pool.consultar("SELECT 1 AS x")['x'].tolist() == [1]
+
+
+def test_pool_reconecta_quando_a_conexao_cai():
+    pool = pool_com(ConexaoCaida(), duckdb.connect())
+    assert pool.consultar("SELECT 'ok' AS x")['x'].tolist() == ['ok']
+    assert pool._geracao == 1
+
+
+def test_pool_testa_cursor_parado_antes_de_usar():
+    primeira = duckdb.connect()
+    pool = pool_com(primeira, duckdb.connect(), tamanho=1, verificar_apos=0)
+    pool.consultar("SELECT 1")
+    primeira.close()
+    # O SELECT 1 no cursor livre falha e o pool reconecta antes da consulta
+    assert pool.consultar("SELECT 2 AS x")['x'].tolist() == [2]
+    assert pool._geracao == 1
@@ -0,0 +1,56 @@
+"""
+Testes das consultas "na data" sobre o histórico (scripts/historico.py),
+com duas versões de uma reserva.
+"""
+from datetime import date, datetime
+
+import duckdb
+import pytest
+
+from historico import TABELA_HISTORICO, evolucao_situacoes, reservas_em
+
+
+@pytest.fixture
+def conn():
+    conn = duckdb.connect()
+    conn.execute("ATTACH ':memory:' AS reservas")
+    conn.execute(f"""
+        CREATE TABLE {TABELA_HISTORICO} (
+            idreserva BIGINT, situacao VARCHAR, _hash UBIGINT,
+            valido_de TIMESTAMP, valido_ate TIMESTAMP
+        )
+    """)
+    conn.execute(f"""
+        INSERT INTO {TABELA_HISTORICO} VALUES
+            (1, 'Reserva (7)', 10, '2025-03-01 09:00:00', '2025-03-10 14:00:00'),
+            (1, 'Vendida',     11, '2025-03-10 14:00:00', NULL),
+            (2, 'Reserva (7)', 20, '2025-03-05 08:00:00', NULL)
+    """)
+    yield conn
+    conn.close()
+
+
+def test_reservas_em_cada_versao(conn):
+    antes = reservas_em(conn, datetime(2025, 3, 2))
+    assert antes.to_dict('records') == [{'idreserva': 1, 'situacao': 'Reserva (7)'}]
+
+    primeira = reservas_em(conn, datetime(2025, 3, 10, 13, 59)).sort_values('idreserva')
+    assert primeira['situacao'].tolist() == ['Reserva (7)', 'Reserva (7)']
+
+    # valido_ate é exclusivo: no instante da troca já vale a versão nova
+    segunda = reservas_em(conn, datetime(2025, 3, 10, 14, 0)).sort_values('idreserva')
+    assert segunda['situacao'].tolist() == ['Vendida', 'Reserva (7)']
+
+
+def test_reservas_em_antes_do_historico(conn):
+    assert reservas_em(conn, date(2025, 2, 1)).empty
+
+
+def test_evolucao_situacoes_no_fim_de_cada_dia(conn):
+    evolucao = evolucao_situacoes(conn, date(2025, 3, 9), date(2025, 3, 10))
+    linhas = [(linha.dia.date(), linha.situacao, linha.quantidade) for linha in evolucao.itertuples()]
+    assert linhas == [
+        (date(2025, 3, 9), 'Reserva (7)', 2),
+        (date(2025, 3, 10), 'Reserva (7)', 1),
+        (date(2025, 3, 10), 'Vendida', 1),
+    ]
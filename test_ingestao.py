@@ -0,0 +1,183 @@
+"""
+Testes da ingestão contra o mock do CVCRM (scripts/mock_cvcrm.py), com as
+tabelas publicadas num arquivo DuckDB local (backend duckdb) em tmp_path.
+"""
+import csv
+import os
+
+import duckdb
+import pytest
+
+# Três páginas de 500 por fonte
+REGISTROS = 1200
+
+
+@pytest.fixture(scope='module')
+def mock():
+    """Mock do CVCRM; a URL precisa estar no ambiente antes de importar a ingestão"""
+    from mock_cvcrm import iniciar_mock
+
+    servidor = iniciar_mock(registros=REGISTROS)
+    os.environ['CVCRM_BASE_URL'] = servidor.url_base
+    os.environ.setdefault('CVCRM_EMAIL', 'teste@example.com')
+    os.environ.setdefault('CVCRM_TOKEN', 'teste')
+    yield servidor
+    servidor.shutdown()
+    servidor.server_close()
+
+
+@pytest.fixture
+def ingestao(mock, tmp_path, monkeypatch):
+    """update_motherduck publicando em tmp_path, com staging e telemetria também lá"""
+    import arquivo_bruto
+    import staging_local
+    import telemetria
+    import update_motherduck
+
+    monkeypatch.setenv('RESERVAS_BACKEND', 'duckdb')
+    monkeypatch.setenv('RESERVAS_CAMINHO', str(tmp_path / 'reservas.duckdb'))
+    monkeypatch.setattr(staging_local, 'DIRETORIO_STAGING', str(tmp_path / 'ingestao'))
+    monkeypatch.setattr(telemetria, 'DIRETORIO_TELEMETRIA', str(tmp_path / 'telemetria'))
+    monkeypatch.setattr(arquivo_bruto, 'ARQUIVAR', False)
+    mock.config.paginas_falha = set()
+    mock.config.semente = 42
+    return update_motherduck
+
+
+def consultar(tmp_path, sql, parametros=None):
+    """Primeira linha de uma consulta ao banco publicado"""
+    conn = duckdb.connect(str(tmp_path / 'reservas.duckdb'), read_only=True)
+    try:
+        return conn.execute(sql, parametros).fetchone()
+    finally:
+        conn.close()
+
+
+def contar_mesclagens(ingestao, monkeypatch):
+    """Lista onde cada chamada de mesclar_tabela deixa as suas contagens"""
+    contagens = []
+    mesclar_tabela = ingestao.mesclar_tabela
+
+    def mesclar_e_contar(*args, **kwargs):
+        contagens.append(mesclar_tabela(*args, **kwargs))
+        return contagens[-1]
+
+    monkeypatch.setattr(ingestao, 'mesclar_tabela', mesclar_e_contar)
+    return contagens
+
+
+def test_carga_completa_repetida_nao_altera_nada(ingestao, tmp_path, monkeypatch):
+    ingestao.update_motherduck()
+    total = consultar(tmp_path, "SELECT count(*) FROM reservas_abril")[0]
+
+    contagens = contar_mesclagens(ingestao, monkeypatch)
+    ingestao.update_motherduck()
+
+    assert len(contagens) == 2
+    for contagem in contagens:
+        assert contagem['inseridos'] == contagem['atualizados'] == contagem['excluidos'] == 0
+    assert consultar(tmp_path, "SELECT count(*) FROM reservas_abril")[0] == total
+
+
+def test_retoma_depois_de_falha_numa_pagina(ingestao, mock, tmp_path, monkeypatch, capsys):
+    mock.config.paginas_falha = {2}
+    with pytest.raises(RuntimeError, match="Falha na extração"):
+        ingestao.update_motherduck()
+    # Nada foi publicado nem o ajuste de página gravado (ele entra na chave do checkpoint)
+    assert consultar(tmp_path, "SELECT count(*) FROM duckdb_tables() WHERE table_name = 'reservas_abril'")[0] == 0
+    assert consultar(tmp_path, "SELECT count(*) FROM estado_ingestao WHERE chave LIKE 'ajuste:%'")[0] == 0
+
+    mock.config.paginas_falha = set()
+    capsys.readouterr()
+    ingestao.update_motherduck()
+    saida = capsys.readouterr().out
+    assert "Retomando reservas" in saida and "Retomando workflow" in saida
+    total = consultar(tmp_path, "SELECT count(*) FROM reservas_abril")[0]
+    assert total > 0
+
+    # Uma carga do zero chega aos mesmos dados
+    contagens = contar_mesclagens(ingestao, monkeypatch)
+    ingestao.update_motherduck()
+    assert all(contagem['inseridos'] == contagem['atualizados'] == contagem['excluidos'] == 0
+               for contagem in contagens)
+    assert consultar(tmp_path, "SELECT count(*) FROM reservas_abril")[0] == total
+
+
+def test_csv_mantem_colunas_da_api(ingestao, tmp_path):
+    ingestao.update_motherduck()
+    ingestao.sincronizar_incremental()
+    idlead, corretor, referencia_data = consultar(
+        tmp_path, "SELECT idlead, corretor, referencia_data FROM cv_leads ORDER BY idlead LIMIT 1"
+    )
+    com_corretor = consultar(tmp_path, "SELECT count(corretor) FROM cv_leads")[0]
+
+    relatorio = tmp_path / 'leads_report.csv'
+    with open(relatorio, 'w', newline='', encoding='utf-8') as f:
+        escritor = csv.writer(f)
+        escritor.writerow(['idlead', 'data_cad', 'situacao_nome', 'imobiliaria',
+                           'nome_situacao_anterior_lead', 'gestor', 'empreendimento_ultimo'])
+        escritor.writerow([idlead, '2024-05-01 10:00:00', 'Descartado', 'Lar Imóveis',
+                           'Em Atendimento', 'SDR (Comercial)', 'Vila Prati'])
+        escritor.writerow([999999, '2024-05-02 10:00:00', 'Em Atendimento', 'Lar Imóveis',
+                           'Aguardando Atendimento', 'SDR (Comercial)', 'Vila Prati'])
+    ingestao.carregar_csv_leads([str(relatorio)])
+
+    assert consultar(tmp_path, "SELECT situacao, corretor, referencia_data FROM cv_leads WHERE idlead = ?",
+                     [idlead]) == ('Descartado', corretor, referencia_data)
+    assert consultar(tmp_path, "SELECT count(corretor) FROM cv_leads")[0] == com_corretor
+    assert consultar(tmp_path, "SELECT situacao, corretor FROM cv_leads WHERE idlead = 999999") == (
+        'Em Atendimento', None
+    )
+
+
+def test_rollback_depois_da_segunda_carga(ingestao, mock, tmp_path):
+    from cubo import NIVEL_DETALHADO
+
+    sql_reservas = "SELECT count(*), sum(valor_contrato) FROM reservas_abril WHERE _excluido_em IS NULL"
+    sql_cubo = "SELECT sum(quantidade), sum(valor_total) FROM reservas_cubo WHERE nivel = ?"
+    ingestao.update_motherduck()
+    primeira = consultar(tmp_path, sql_reservas)
+    # A segunda carga traz outros dados para as mesmas reservas
+    mock.config.semente = 7
+    ingestao.update_motherduck()
+    assert consultar(tmp_path, sql_reservas) != primeira
+
+    ingestao.reverter_carga()
+
+    assert consultar(tmp_path, sql_reservas) == primeira
+    # Os resumos do dashboard saem do cubo, refeito sobre a geração restaurada
+    assert consultar(tmp_path, sql_cubo, [NIVEL_DETALHADO]) == pytest.approx(primeira)
+
+
+def test_replay_do_arquivo_publicado(ingestao, tmp_path, monkeypatch):
+    import arquivo_bruto
+
+    monkeypatch.setattr(arquivo_bruto, 'ARQUIVAR', True)
+    monkeypatch.setattr(arquivo_bruto, 'DIRETORIO_ARQUIVO', str(tmp_path / 'arquivo_bruto'))
+    ingestao.update_motherduck()
+    # O arquivo fica só na tabela do banco
+    assert arquivo_bruto.arquivos_locais() == []
+    total = consultar(tmp_path, "SELECT count(*) FROM reservas_abril")[0]
+    assert consultar(tmp_path, "SELECT count(*) FROM arquivo_bruto WHERE fonte = 'reservas'")[0] >= total
+
+    conn = duckdb.connect(str(tmp_path / 'reservas.duckdb'))
+    conn.execute("DELETE FROM reservas_abril WHERE idreserva % 2 = 0")
+    conn.close()
+    ingestao.reprocessar_arquivo(['reservas'])
+    assert consultar(tmp_path, "SELECT count(*) FROM reservas_abril")[0] == total
+
+
+def test_incremental_sem_alteracoes_mantem_a_versao(ingestao, tmp_path):
+    from estado_ingestao import CHAVE_VERSAO
+
+    sql_versao = "SELECT valor FROM estado_ingestao WHERE chave = ?"
+    ingestao.update_motherduck()
+    # A primeira sincronização traz os leads
+    ingestao.sincronizar_incremental()
+    versao = consultar(tmp_path, sql_versao, [CHAVE_VERSAO])[0]
+    cubo = consultar(tmp_path, "SELECT max(calculado_em) FROM reservas_cubo")[0]
+
+    ingestao.sincronizar_incremental()
+
+    assert consultar(tmp_path, sql_versao, [CHAVE_VERSAO])[0] == versao
+    assert consultar(tmp_path, "SELECT max(calculado_em) FROM reservas_cubo")[0] == cubo
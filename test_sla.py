@@ -0,0 +1,72 @@
+"""
+Testes da tabela de prazos (scripts/sla.py), semeada pelo nome da situação
+uma vez e depois mantida à mão, e das colunas de SLA calculadas no SQL.
+"""
+from datetime import datetime, timedelta
+
+import duckdb
+import pytest
+
+from sla import COLUNAS_SLA, DIAS, FORA_DO_PRAZO, LIMITE, TABELA_SLA, atualizar_situacao_sla, com_sla
+
+TABELA = 'reservas.main.reservas_abril'
+
+
+@pytest.fixture
+def conn():
+    conn = duckdb.connect()
+    conn.execute("ATTACH ':memory:' AS reservas")
+    conn.execute(f"CREATE TABLE {TABELA} (idreserva BIGINT, situacao VARCHAR, _excluido_em TIMESTAMP)")
+    conn.execute(f"""
+        INSERT INTO {TABELA} VALUES
+            (1, 'Reserva (7)', NULL), (2, 'Em Negociação (10)', NULL), (3, 'Distrato', NULL)
+    """)
+    yield conn
+    conn.close()
+
+
+def prazos(conn):
+    return dict(conn.execute(f"SELECT situacao, limite_dias FROM {TABELA_SLA}").fetchall())
+
+
+def test_semeia_o_prazo_pelo_nome(conn):
+    assert atualizar_situacao_sla(conn, TABELA) > 0
+    limites = prazos(conn)
+    assert limites['Reserva (7)'] == 7
+    assert limites['Em Negociação (10)'] == 10
+    assert limites['Distrato'] == 0
+    etapa = conn.execute(f"SELECT etapa FROM {TABELA_SLA} WHERE situacao = 'Em Negociação (10)'").fetchone()[0]
+    assert etapa == 'Negociação (5)'
+
+
+def test_edicao_manual_sobrevive_e_so_situacoes_novas_entram(conn):
+    atualizar_situacao_sla(conn, TABELA)
+    conn.execute(f"UPDATE {TABELA_SLA} SET limite_dias = 3 WHERE situacao = 'Reserva (7)'")
+    conn.execute(f"UPDATE {TABELA_SLA} SET limite_dias = 30 WHERE situacao = 'Distrato'")
+
+    assert atualizar_situacao_sla(conn, TABELA) == 0
+
+    conn.execute(f"INSERT INTO {TABELA} VALUES (4, 'Repasse (15)', NULL)")
+    assert atualizar_situacao_sla(conn, TABELA) == 1
+    limites = prazos(conn)
+    assert (limites['Reserva (7)'], limites['Distrato'], limites['Repasse (15)']) == (3, 30, 15)
+
+
+def test_colunas_de_sla_no_sql(conn):
+    agora = datetime.now()
+    conn.execute(f"ALTER TABLE {TABELA} ADD COLUMN data_ultima_alteracao_situacao TIMESTAMP")
+    conn.executemany(f"UPDATE {TABELA} SET data_ultima_alteracao_situacao = ? WHERE idreserva = ?", [
+        (agora - timedelta(days=7, hours=1), 1),
+        (agora - timedelta(days=9), 2),
+    ])
+    atualizar_situacao_sla(conn, TABELA)
+    linhas = conn.execute(f"""
+        SELECT idreserva, {', '.join(COLUNAS_SLA)} FROM {com_sla(TABELA)} ORDER BY idreserva
+    """).df().set_index('idreserva')
+
+    # Sete dias completos numa situação de prazo 7: venceu
+    assert linhas.loc[1, [LIMITE, DIAS, FORA_DO_PRAZO]].tolist() == [7, 7, True]
+    assert linhas.loc[2, [LIMITE, DIAS, FORA_DO_PRAZO]].tolist() == [10, 9, False]
+    # Sem data de alteração e sem prazo, nunca está fora do prazo
+    assert linhas.loc[3, LIMITE] == 0
+    assert not linhas.loc[3, FORA_DO_PRAZO]
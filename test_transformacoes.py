@@ -0,0 +1,54 @@
+"""
+Testes das transformações por página (scripts/transformacoes.py): filtro
+de janela e limpeza do valor do contrato no SQL.
+"""
+import json
+from datetime import date
+
+import duckdb
+
+from transformacoes import TRANSFORMACOES, filtrar_janela
+
+
+def transformar(registros):
+    """Aplica a transformação das reservas como o staging faz, página inteira de uma vez"""
+    linhas = duckdb.execute(
+        f"SELECT {TRANSFORMACOES['reservas']} FROM unnest(?::VARCHAR[]) AS t(r)",
+        [[json.dumps(registro, ensure_ascii=False) for registro in registros]]
+    ).fetchall()
+    return [json.loads(linha[0]) for linha in linhas]
+
+
+def test_janela_descarta_antigos_e_datas_invalidas():
+    dados = [
+        {'id': 1, 'referencia_data': '2025-03-10 10:00:00'},
+        {'id': 2, 'referencia_data': '2024-12-31 23:59:59'},
+        {'id': 3, 'referencia_data': 'ontem'},
+        {'id': 4},
+        {'id': 5, 'referencia_data': '2025-03-12 08:00:00'},
+    ]
+    assert [item['id'] for item in filtrar_janela(dados, date(2025, 1, 1))] == [1, 5]
+    assert [item['id'] for item in filtrar_janela(dados, date(2025, 1, 1), desde='2025-03-11')] == [5]
+    assert filtrar_janela([], date(2025, 1, 1)) == []
+
+
+def test_valor_do_contrato_vira_numero():
+    registros = transformar([
+        {'idreserva': 1, 'valor_contrato': 'R$ 1.234.567,89'},
+        {'idreserva': 2, 'valor_contrato': 250000},
+        {'idreserva': 3, 'valor_contrato': '  R$ 999,5 '},
+    ])
+    assert [registro['valor_contrato'] for registro in registros] == [1234567.89, 250000, 999.5]
+
+
+def test_valor_invalido_fica_null_e_o_resto_do_registro_nao_muda():
+    originais = [
+        {'idreserva': 1, 'valor_contrato': 'a combinar', 'obs': None, 'cliente': {'nome': "D'Ávila"}},
+        {'valor_contrato': None},
+        {'idreserva': 2, 'situacao': 'Reserva (7)'},
+    ]
+    registros = transformar(originais)
+    assert registros[0] == {'idreserva': 1, 'valor_contrato': None, 'obs': None, 'cliente': {'nome': "D'Ávila"}}
+    assert registros[1] == {'valor_contrato': None}
+    # Sem o campo, o registro passa intacto
+    assert registros[2] == originais[2]